@@ -0,0 +1,90 @@
+import os
+
+import click
+import numpy as np
+
+from raga_pose_estimation.openpose_json_loader import (
+    is_archive,
+    pack_keypoints,
+)
+
+
+@click.command()
+@click.option(
+    "-j",
+    "--input-json",
+    required=True,
+    help="Path to a directory of openpose json files, or a .tar, .tar.gz or "
+    ".zip archive of them",
+)
+@click.option(
+    "-o",
+    "--output",
+    default=None,
+    help="Path of the keypoint store to write. Defaults to the input path "
+    "with the extension .kps, e.g. output_json.kps.",
+)
+@click.option(
+    "--pose-3d",
+    is_flag=True,
+    default=False,
+    help="Include pose_keypoints_3d as well as pose_keypoints_2d.",
+)
+@click.option(
+    "--hands",
+    is_flag=True,
+    default=False,
+    help="Include hand_left_keypoints_2d and hand_right_keypoints_2d.",
+)
+@click.option(
+    "--face",
+    is_flag=True,
+    default=False,
+    help="Include face_keypoints_2d.",
+)
+@click.option(
+    "--dtype",
+    default="float32",
+    type=click.Choice(["float32", "float64"]),
+    help="Type of the stored values. float64 keeps the values exactly as "
+    "parsed from the json files.",
+)
+@click.option(
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of processes to use to parse the openpose json files.",
+)
+def pack_cli(input_json, output, pose_3d, hands, face, dtype, jobs):
+    """Packs a directory of openpose json files into a single keypoint store
+    file, which can be given to run_pose_estimation.py as --input-json."""
+    path_to_json = os.path.abspath(input_json)
+    if not os.path.isdir(path_to_json) and not is_archive(path_to_json):
+        click.echo(f"Invalid input_json path {path_to_json}.")
+        exit(1)
+
+    if output is None:
+        name = path_to_json
+        for extension in [".tar.gz", ".tgz", ".tar", ".zip"]:
+            if name.endswith(extension):
+                name = name[: -len(extension)]
+                break
+        output = f"{name}.kps"
+
+    blocks = ["pose_keypoints_2d"]
+    if pose_3d:
+        blocks.append("pose_keypoints_3d")
+    if hands:
+        blocks += ["hand_left_keypoints_2d", "hand_right_keypoints_2d"]
+    if face:
+        blocks.append("face_keypoints_2d")
+
+    click.echo(f"Packing {path_to_json}...")
+    store = pack_keypoints(
+        path_to_json, output, blocks, dtype=np.dtype(dtype), jobs=jobs
+    )
+    click.echo(f"Packed {len(store)} frames into {output}.")
+
+
+if __name__ == "__main__":
+    pack_cli()
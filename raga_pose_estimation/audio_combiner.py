@@ -2,6 +2,24 @@
 import os
 from pymediainfo import MediaInfo
 
+
+def has_audio(input_video_path):
+    """Check if video has audio.
+
+    Parameters
+    ----------
+    input_video_path : str
+        String signifying the path to the input video
+
+    Returns
+    -------
+    Booleen value for if audio found
+
+    """
+    fileInfo = MediaInfo.parse(input_video_path)
+    return any([track.track_type == 'Audio' for track in fileInfo.tracks])
+
+
 class Audio:
     def __init__(self, input_video_path, output_directory):
         self.output_directory = output_directory
@@ -20,10 +38,11 @@ class Audio:
         Booleen value for if audio found
 
         """
-        fileInfo = MediaInfo.parse(input_video_path)
-        return any([track.track_type == 'Audio' for track in fileInfo.tracks])
+        return has_audio(input_video_path)
 
-    def _extract_audio(self, input_video_path, output_directory):
+    def _extract_audio(
+        self, input_video_path, output_directory, start=None, duration=None
+    ):
         """Extracts audio from an input video
 
         Parameters
@@ -34,6 +53,13 @@ class Audio:
         output_directory: Str
             String signifying output directory path
 
+        start : float
+            Time in seconds at which to start the audio (default None, i.e.
+            from the beginning)
+
+        duration : float
+            Length in seconds of the audio (default None, i.e. to the end)
+
         Returns
         -------
         None
@@ -41,6 +67,12 @@ class Audio:
         """
         command = "ffmpeg -i "
         command += input_video_path
+        # Seek after opening the input, as the audio is copied rather than
+        # decoded
+        if start:
+            command += f" -ss {start}"
+        if duration is not None:
+            command += f" -t {duration}"
         command += " -vn -acodec copy "
         command += output_directory
         command += "/audio.aac"
@@ -76,7 +108,9 @@ class Audio:
         os.system(command)
         return None
 
-    def audio_combiner(self, input_video_path, output_directory):
+    def audio_combiner(
+        self, input_video_path, output_directory, start=None, duration=None
+    ):
         """Combines audio to output overlay video
 
         Parameters
@@ -87,13 +121,19 @@ class Audio:
         output_directory: Str
             String signifying output directory path
 
+        start, duration : float
+            Part of the audio to use, for an overlay video of part of the
+            input video (see _extract_audio)
+
         Returns
         -------
         None
 
         """
         if self._has_audio(input_video_path):
-            self._extract_audio(input_video_path, output_directory)
+            self._extract_audio(
+                input_video_path, output_directory, start, duration
+            )
             self._attach_audio(output_directory)
         else:
             print("No audio found in the input video.")
\ No newline at end of file
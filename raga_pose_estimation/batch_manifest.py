@@ -0,0 +1,156 @@
+import enum
+import hashlib
+import json
+import os
+
+from .keypoint_store import is_keypoint_store
+from .openpose_json_loader import (
+    is_archive,
+    json_directory_fingerprint,
+    list_json_files,
+)
+
+# Increase this to reprocess all trials if the outputs for the same inputs
+# change
+MANIFEST_VERSION = 1
+
+# Arguments to run_pose_estimation which don't change its outputs
+IGNORED_ARGUMENTS = {
+    "output_dir",
+    "jobs",
+    "cache",
+    "cache_dir",
+    "openpose_segments",
+}
+
+
+def load_manifest(manifest_path):
+    """Loads a batch manifest, which records the inputs and outputs of each
+    trial processed in a batch.
+
+    Parameters
+    ----------
+    manifest_path : str
+        Path to the manifest JSON file
+
+    Returns
+    -------
+    dict
+        The manifest, with a "trials" dict mapping each trial name to its
+        entry. Empty if the file doesn't exist.
+    """
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = None
+
+    if not manifest or manifest.get("version") != MANIFEST_VERSION:
+        manifest = {"version": MANIFEST_VERSION, "trials": {}}
+    return manifest
+
+
+def save_manifest(manifest_path, manifest):
+    """Saves a batch manifest, replacing the file in one step so it is never
+    left half written."""
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def trial_fingerprint(kwargs):
+    """Gets a fingerprint of a trial's inputs: the JSON files, the video and
+    the arguments passed to run_pose_estimation which affect its outputs.
+
+    Parameters
+    ----------
+    kwargs : dict
+        Keyword arguments for run_pose_estimation
+
+    Returns
+    -------
+    str
+        Hex digest identifying the inputs
+    """
+    inputs = {
+        "arguments": {
+            key: _jsonable(value)
+            for key, value in kwargs.items()
+            if key not in IGNORED_ARGUMENTS
+        },
+        "json": None,
+        "video": None,
+    }
+
+    input_json = kwargs.get("input_json")
+    if input_json and (
+        os.path.isdir(input_json)
+        or is_archive(input_json)
+        or is_keypoint_store(input_json)
+    ):
+        inputs["json"] = json_directory_fingerprint(
+            input_json, list_json_files(input_json)
+        )
+
+    input_video = kwargs.get("input_video")
+    if input_video and os.path.isfile(input_video):
+        st = os.stat(input_video)
+        inputs["video"] = [st.st_size, st.st_mtime_ns]
+
+    return hashlib.sha1(
+        json.dumps(inputs, sort_keys=True).encode()
+    ).hexdigest()
+
+
+def list_outputs(output_dir):
+    """Gets the files in a trial's output directory and their sizes."""
+    outputs = {}
+    for root, _, files in os.walk(output_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            outputs[os.path.relpath(path, output_dir)] = os.path.getsize(path)
+    return outputs
+
+
+def is_up_to_date(entry, fingerprint, output_dir):
+    """Whether a trial's manifest entry shows it was processed successfully
+    with the same inputs, and its outputs are still there.
+
+    Parameters
+    ----------
+    entry : dict
+        The trial's manifest entry, or None if it has none
+    fingerprint : str
+        Fingerprint of the trial's current inputs (see trial_fingerprint)
+    output_dir : str
+        The trial's output directory
+
+    Returns
+    -------
+    bool
+    """
+    if (
+        not entry
+        or entry.get("status") != "done"
+        or entry.get("fingerprint") != fingerprint
+    ):
+        return False
+
+    return all(
+        os.path.isfile(os.path.join(output_dir, name))
+        and os.path.getsize(os.path.join(output_dir, name)) == size
+        for name, size in entry.get("outputs", {}).items()
+    )
+
+
+def _jsonable(value):
+    """Converts argument values (e.g. tuples of OpenPoseParts) to values
+    which can be written as JSON."""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (list, tuple, range)):
+        return [_jsonable(v) for v in value]
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
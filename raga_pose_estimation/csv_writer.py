@@ -1,10 +1,39 @@
 import os
+import warnings
 
+# File extension for each output format
+OUTPUT_FORMATS = {
+    "csv": ".csv",
+    "parquet": ".parquet",
+    "feather": ".feather",
+    "hdf5": ".h5",
+}
 
-def write_csv(person_dfs, output_dir, trial_no=None, performers_names= None, flatten=False, smoothed = False):
-    """Creates CSVs in the given output directory. Each CSV contains
-    details for 1 person, with columns for x, y, c for each body parts and
-    rows representing each frame.
+# Extra extension for compressed CSVs, so pandas can infer the compression
+# when reading them back
+CSV_COMPRESSION_EXTENSIONS = {
+    "gzip": ".gz",
+    "bz2": ".bz2",
+    "zip": ".zip",
+    "xz": ".xz",
+    "zstd": ".zst",
+}
+
+
+def write_csv(
+    person_dfs,
+    output_dir,
+    trial_no=None,
+    performers_names=None,
+    flatten=False,
+    smoothed=False,
+    output_format="csv",
+    compression=None,
+    append=False,
+):
+    """Creates CSVs (or files in another format) in the given output
+    directory. Each file contains details for 1 person, with columns for
+    x, y, c for each body parts and rows representing each frame.
 
     Parameters
     ----------
@@ -15,7 +44,29 @@ def write_csv(person_dfs, output_dir, trial_no=None, performers_names= None, fla
     flatten : bool
         Whether to flatten the CSV multi-line headers to a single row
         (see README)
+    smoothed : bool
+        Whether the data has been smoothed, in which case the file names
+        start with smoothed_
+    output_format : str
+        One of the keys of OUTPUT_FORMATS (default csv). The columnar formats
+        (parquet, feather, hdf5) keep the (Body Part, Variable) columns and
+        full precision.
+    compression : str
+        Compression to use, which depends on the format: gzip, bz2, zip, xz
+        or zstd for csv, e.g. snappy, gzip, brotli or zstd for parquet, lz4
+        or zstd for feather and zlib, lzo, bzip2 or blosc for hdf5. Defaults
+        to None, which uses the format's default (no compression for csv
+        and hdf5).
+    append : bool
+        Whether to append the rows to the files if they already exist, e.g.
+        to write frames as they are processed. Only supported for
+        uncompressed csv files.
     """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format {output_format}")
+    if append and (output_format != "csv" or compression):
+        raise ValueError("Only uncompressed csv files can be appended to")
+
     performer_dict = performer_to_dict(performers_names, person_dfs)
 
     trial_no = trial_number(trial_no)
@@ -32,10 +83,68 @@ def write_csv(person_dfs, output_dir, trial_no=None, performers_names= None, fla
             smooth = "smoothed_"
         else:
             smooth = ""
-        output_name = f"{smooth}{trial_no}_{performer_dict[i]}.csv"
-        person_df.to_csv(
-            os.path.join(output_dir, output_name), float_format="%.3f"
+        output_name = (
+            f"{smooth}{trial_no}_{performer_dict[i]}"
+            f"{OUTPUT_FORMATS[output_format]}"
         )
+        output_path = os.path.join(output_dir, output_name)
+
+        if output_format == "csv":
+            if compression:
+                output_path += CSV_COMPRESSION_EXTENSIONS.get(compression, "")
+            if append and os.path.exists(output_path):
+                person_df.to_csv(
+                    output_path, float_format="%.3f", mode="a", header=False
+                )
+            else:
+                person_df.to_csv(
+                    output_path, float_format="%.3f", compression=compression
+                )
+        else:
+            write_columnar(person_df, output_path, output_format, compression)
+
+
+def write_columnar(person_df, output_path, output_format, compression=None):
+    """Writes a DataFrame to a parquet, feather or hdf5 file, keeping its
+    index and column names. These formats need the optional pyarrow (parquet
+    and feather) or tables (hdf5) packages.
+
+    Parameters
+    ----------
+    person_df : DataFrame
+        DataFrame as produced by reshape_dataframes.
+    output_path : str
+        Path of the file to write.
+    output_format : str
+        parquet, feather or hdf5
+    compression : str
+        Compression to use (see write_csv)
+    """
+    if output_format == "parquet":
+        kwargs = {"compression": compression} if compression else {}
+        person_df.to_parquet(output_path, **kwargs)
+    elif output_format == "feather":
+        # DataFrame.to_feather doesn't allow an index (frames may be
+        # missing) or multi-level columns, but pyarrow keeps them both
+        from pyarrow import feather
+
+        feather.write_feather(person_df, output_path, compression=compression)
+    elif output_format == "hdf5":
+        with warnings.catch_warnings():
+            # Column names such as "Body Part" aren't Python identifiers,
+            # which tables warns about but handles fine
+            warnings.filterwarnings(
+                "ignore", message="object name is not a valid Python"
+            )
+            person_df.to_hdf(
+                output_path,
+                key="keypoints",
+                mode="w",
+                complevel=9 if compression else None,
+                complib=compression,
+            )
+    else:
+        raise ValueError(f"Unknown output format {output_format}")
 
 
 def performer_to_dict(performers_names, person_dfs):
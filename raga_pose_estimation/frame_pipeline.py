@@ -0,0 +1,110 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run_frame_pipeline(frames, draw_frame, write_frame, draw_threads=None):
+    """Draws and writes frames in a three-stage pipeline: a decoder thread
+    reading the frames, a pool of threads drawing them, and an encoder thread
+    writing them in their original order. The queues between the stages are
+    bounded, so only a few frames are held in memory at once.
+
+    OpenCV releases the GIL while decoding, drawing and encoding, so the
+    stages run in parallel.
+
+    Parameters
+    ----------
+    frames : iterable of np.array
+        Frames to draw on, e.g. read from a video. Iterated over in the
+        decoder thread.
+    draw_frame : function
+        Called as draw_frame(frame_index, frame) in one of the drawing
+        threads, and returns the image to write
+    write_frame : function
+        Called with each image returned by draw_frame, in frame order, in the
+        encoder thread
+    draw_threads : int
+        Number of drawing threads. Defaults to None, i.e. the number of CPUs.
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    Exception
+        The first exception raised by any of the stages, after stopping the
+        others
+
+    """
+    draw_threads = draw_threads or os.cpu_count() or 1
+    decoded = queue.Queue(2 * draw_threads)
+    drawn = queue.Queue(2 * draw_threads)
+    stop = threading.Event()
+    errors = []
+
+    # Waiting on the queues times out regularly to check whether another
+    # stage has failed, so that no stage blocks forever
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return None
+
+    def fail(error):
+        errors.append(error)
+        stop.set()
+
+    def decode():
+        try:
+            for item in enumerate(frames):
+                if not put(decoded, item):
+                    return
+        except BaseException as e:
+            fail(e)
+        put(decoded, None)
+
+    def encode():
+        try:
+            while True:
+                future = get(drawn)
+                if future is None:
+                    return
+                write_frame(future.result())
+        except BaseException as e:
+            fail(e)
+
+    threads = [
+        threading.Thread(target=decode),
+        threading.Thread(target=encode),
+    ]
+    with ThreadPoolExecutor(draw_threads) as executor:
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = get(decoded)
+                if item is None:
+                    break
+                if not put(drawn, executor.submit(draw_frame, *item)):
+                    break
+            put(drawn, None)
+        except BaseException as e:
+            fail(e)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
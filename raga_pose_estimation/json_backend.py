@@ -0,0 +1,165 @@
+import json
+
+# Faster JSON packages are used if they are installed, in this order of
+# preference, falling back to the standard library's json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+BACKENDS = {
+    "orjson": orjson,
+    "simdjson": simdjson,
+    "ujson": ujson,
+    "json": json,
+}
+
+_backend = None
+_simdjson_parser = None
+
+
+def available_backends():
+    """Gets the JSON backends which are installed.
+
+    Returns
+    -------
+    list of str
+        Names of the installed backends, in order of preference
+
+    """
+    return [name for name, module in BACKENDS.items() if module is not None]
+
+
+def set_backend(name=None):
+    """Chooses the package used to decode JSON files.
+
+    Parameters
+    ----------
+    name : str
+        One of BACKENDS. Defaults to None, i.e. the first installed backend.
+
+    Returns
+    -------
+    str
+        Name of the backend chosen
+
+    Raises
+    ------
+    ValueError
+        If the backend isn't known or isn't installed
+
+    """
+    global _backend
+    if name is None:
+        name = available_backends()[0]
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown JSON backend {name}, must be one of "
+            f"{', '.join(BACKENDS)}"
+        )
+    if BACKENDS[name] is None:
+        raise ValueError(f"The {name} package is not installed.")
+    _backend = name
+    return name
+
+
+def get_backend():
+    """Gets the name of the backend used to decode JSON files (see
+    set_backend)."""
+    if _backend is None:
+        set_backend()
+    return _backend
+
+
+def loads(data):
+    """Decodes a JSON document with the current backend.
+
+    Parameters
+    ----------
+    data : bytes
+        Contents of a JSON file
+
+    Returns
+    -------
+    object
+        The decoded document, as returned by json.loads
+
+    """
+    backend = get_backend()
+    if backend == "simdjson":
+        return _get_simdjson_parser().parse(data, recursive=True)
+    return BACKENDS[backend].loads(data)
+
+
+def load(filepath):
+    """Reads and decodes a JSON file with the current backend.
+
+    Parameters
+    ----------
+    filepath : str
+        Path to the JSON file
+
+    Returns
+    -------
+    object
+        The decoded document, as returned by json.load
+
+    """
+    with open(filepath, "rb") as f:
+        return loads(f.read())
+
+
+def load_people(source, blocks=("pose_keypoints_2d",)):
+    """Gets the keypoints of the people in an OpenPose JSON file.
+
+    With simdjson only the given blocks of keypoints are decoded, leaving
+    out the face, hand and 3D keypoints OpenPose also writes. The other
+    backends decode the whole file.
+
+    Parameters
+    ----------
+    source : str or bytes
+        Path to the JSON file, or its contents
+    blocks : list of str
+        Keys of the blocks of keypoints needed for each person
+
+    Returns
+    -------
+    list of dict
+        Dictionary for each person, mapping the blocks in the file to lists
+        of values. Other keys may be included too.
+
+    """
+    if not isinstance(source, bytes):
+        with open(source, "rb") as f:
+            source = f.read()
+
+    if get_backend() != "simdjson":
+        return loads(source)["people"]
+
+    # Copy the blocks out of the document, which is only valid until the
+    # parser parses another
+    document = _get_simdjson_parser().parse(source)
+    return [
+        {block: person[block].as_list() for block in blocks if block in person}
+        for person in document["people"]
+    ]
+
+
+def _get_simdjson_parser():
+    """Gets a simdjson parser, reusing it so that its buffers are only
+    allocated once."""
+    global _simdjson_parser
+    if _simdjson_parser is None:
+        _simdjson_parser = simdjson.Parser()
+    return _simdjson_parser
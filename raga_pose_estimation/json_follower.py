@@ -0,0 +1,93 @@
+import os
+import time
+
+from .openpose_json_loader import list_json_files
+
+
+def follow_json_files(
+    path_to_json, is_finished=None, idle_timeout=None, poll_interval=0.5
+):
+    """Watches a directory which OpenPose is writing json files to, and
+    yields the new files as they are completed, in frame order.
+
+    The directory is polled every poll_interval seconds. A file is taken to
+    be complete once its size and modification time haven't changed since
+    the previous poll, so files OpenPose is part way through writing aren't
+    read. Files are only yielded once all the files before them have been,
+    so that frames are never skipped.
+
+    Parameters
+    ----------
+    path_to_json : str
+        Path to the directory of json files. It doesn't need to exist yet.
+    is_finished : function
+        Called with no arguments, returns True once OpenPose has finished
+        writing, after which the remaining files are yielded and the
+        generator stops. Defaults to None, i.e. only stop on idle_timeout.
+    idle_timeout : float
+        Stop if no files have been added or changed for this many seconds.
+        Defaults to None, i.e. only stop when is_finished returns True.
+    poll_interval : float
+        Seconds between polls of the directory
+
+    Yields
+    ------
+    list of str
+        Names of the next complete files (without the directory), in the
+        order returned by list_json_files
+
+    """
+    if is_finished is None and idle_timeout is None:
+        raise ValueError("Either is_finished or idle_timeout must be given.")
+
+    n_yielded = 0
+    previous_stats = {}
+    last_change = time.monotonic()
+    while True:
+        # Check whether OpenPose has finished before listing the files, so
+        # that every file it wrote is in the listing
+        finished = is_finished is not None and is_finished()
+
+        json_files = []
+        if os.path.isdir(path_to_json):
+            json_files = list_json_files(path_to_json)[n_yielded:]
+        stats = {}
+        for json_file in json_files:
+            try:
+                st = os.stat(os.path.join(path_to_json, json_file))
+            except FileNotFoundError:
+                continue
+            stats[json_file] = (st.st_size, st.st_mtime_ns)
+
+        if stats != previous_stats:
+            last_change = time.monotonic()
+        idle = (
+            idle_timeout is not None
+            and time.monotonic() - last_change >= idle_timeout
+        )
+
+        if finished or idle:
+            ready = json_files
+        else:
+            ready = []
+            for json_file in json_files:
+                stat = stats.get(json_file)
+                # Empty files have only just been created
+                if not stat or not stat[0]:
+                    break
+                if previous_stats.get(json_file) != stat:
+                    break
+                ready.append(json_file)
+
+        if ready:
+            n_yielded += len(ready)
+            yield ready
+        if finished or idle:
+            return
+
+        previous_stats = {
+            json_file: stats[json_file]
+            for json_file in json_files[len(ready) :]
+            if json_file in stats
+        }
+        time.sleep(poll_interval)
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+def get_x_position_order(keypoints):
+    """Get the permutation which orders people from left to right by the mean
+    x position of their keypoints.
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (..., people, parts, values) where the first value of
+        each keypoint is its x position, e.g. a single frame of shape
+        (people, parts, 3) or a whole recording of shape
+        (frames, people, parts, 3).
+
+    Returns
+    -------
+    np.array
+        Array of shape (..., people) of person indices, in order. People with
+        no keypoints (i.e. all NaN) are placed last.
+
+    """
+    x = keypoints[..., 0]
+    found = ~np.isnan(x)
+    count = found.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = np.where(found, x, 0).sum(axis=-1) / count
+
+    # A stable sort keeps people with equal positions in their original order
+    return np.argsort(mean_x, axis=-1, kind="stable")
+
+
+def sort_keypoints_by_x_position(keypoints):
+    """Sort people so that the left-most person has index 0, the next has
+    index 1, etc.
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (..., people, parts, values) as described in
+        get_x_position_order.
+
+    Returns
+    -------
+    np.array
+        Copy of keypoints with the people axis reordered.
+
+    """
+    order = get_x_position_order(keypoints)
+    leading_indices = np.indices(order.shape[:-1], sparse=True)
+    return keypoints[
+        tuple(i[..., np.newaxis] for i in leading_indices) + (order,)
+    ]
+
+
+def sort_dataframe_by_x_position(body_keypoints_df, n_values=3):
+    """Sort the people in a single frame DataFrame, as produced by
+    OpenPoseJsonParser.get_multiple_keypoints, so that the left-most person
+    has index 0, the next has index 1, etc.
+
+    Parameters
+    ----------
+    body_keypoints_df : DataFrame
+        DataFrame with a row per part and n_values columns per person (e.g.
+        x0, y0, confidence0, x1, y1, confidence1)
+    n_values : int
+        Number of columns per person, the first of which is x (default 3)
+
+    Returns
+    -------
+    DataFrame
+        Sorted DataFrame, with the same column names.
+
+    """
+    values = body_keypoints_df.to_numpy()
+    n_people = values.shape[1] // n_values
+    person_keypoints = np.transpose(
+        values.reshape(len(values), n_people, n_values), (1, 0, 2)
+    )
+    order = get_x_position_order(person_keypoints)
+    columns = (order[:, np.newaxis] * n_values + np.arange(n_values)).ravel()
+
+    sorted_body_keypoints_df = body_keypoints_df.iloc[:, columns]
+    sorted_body_keypoints_df.columns = body_keypoints_df.columns
+    return sorted_body_keypoints_df
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+
+import numpy as np
+
+# First bytes of every keypoint store
+MAGIC = b"RAGAKPS\0"
+
+# Increase this if the layout of the store changes
+STORE_VERSION = 1
+
+# Number of points and values per point of each block of keypoints OpenPose
+# can write for a person
+BLOCKS = {
+    "pose_keypoints_2d": (25, 3),
+    "pose_keypoints_3d": (25, 4),
+    "hand_left_keypoints_2d": (21, 3),
+    "hand_right_keypoints_2d": (21, 3),
+    "face_keypoints_2d": (70, 3),
+}
+
+# Arrays in the store are aligned to this many bytes
+ALIGNMENT = 64
+
+
+def is_keypoint_store(path):
+    """Whether path is a keypoint store written by write_keypoint_store.
+
+    Parameters
+    ----------
+    path : str
+        Path to check
+
+    Returns
+    -------
+    bool
+        True if path is a keypoint store
+
+    """
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_keypoint_store(
+    store_path, record_chunks, person_counts, names, blocks, dtype=np.float32
+):
+    """Writes keypoints to a single keypoint store file, which KeypointStore
+    can open with numpy.memmap (see openpose_json_loader.pack_keypoints).
+
+    The store holds a record for each person slot in each frame, holding
+    the values of the given blocks one after the other, so every record
+    has the same size and any frame can be found from its index. It also
+    holds the number of people in each frame, each frame's number and the
+    names of the JSON files the frames came from.
+
+    Parameters
+    ----------
+    store_path : str
+        Path of the store to write
+    record_chunks : list of np.array
+        Arrays of shape (frames, slots, record size) for consecutive chunks
+        of frames, holding the values of each block for each person slot in
+        each frame, with NaN where there is no value. Chunks with fewer
+        slots than the others are padded with NaN.
+    person_counts : np.array
+        Number of people detected in each frame
+    names : list of str
+        Names of the JSON file for each frame
+    blocks : list of str
+        Keys of BLOCKS held in each record, in order
+    dtype : np.dtype
+        Type of the stored values (default np.float32)
+
+    Returns
+    -------
+    None
+
+    """
+    layout = []
+    record_size = 0
+    for block in blocks:
+        n_points, n_values = BLOCKS[block]
+        layout.append([block, n_points, n_values, record_size])
+        record_size += n_points * n_values
+    n_slots = max((chunk.shape[1] for chunk in record_chunks), default=0)
+    header = json.dumps(
+        {
+            "version": STORE_VERSION,
+            "dtype": np.dtype(dtype).str,
+            "n_frames": len(names),
+            "n_slots": n_slots,
+            "record_size": record_size,
+            "blocks": layout,
+            "names": list(names),
+        }
+    ).encode()
+    frame_numbers = np.array(
+        [_frame_number(name, i) for i, name in enumerate(names)],
+        dtype=np.int64,
+    )
+
+    # Write to a temporary file first so an interrupted write can't leave a
+    # partial store behind
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(np.uint64(len(header)).tobytes())
+            f.write(header)
+            _write_aligned(f, np.asarray(person_counts, dtype=np.int32))
+            _write_aligned(f, frame_numbers)
+            _align(f)
+            for chunk in record_chunks:
+                records = np.full(
+                    (len(chunk), n_slots, record_size), np.nan, dtype=dtype
+                )
+                records[:, : chunk.shape[1]] = chunk
+                f.write(records.tobytes())
+        os.replace(tmp_path, store_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class KeypointStore:
+    """Keypoint store written by write_keypoint_store, opened with
+    numpy.memmap so that any range of frames can be read without reading
+    the rest.
+
+    Parameters
+    ----------
+    store_path : str
+        Path to the store
+
+    Attributes
+    ----------
+    names : list of str
+        Names of the JSON files the frames were read from, in order
+    person_counts : np.memmap
+        Number of people detected in each frame
+    frame_numbers : np.memmap
+        Frame number of each frame, from the JSON file names
+    records : np.memmap
+        Array of shape (frames, slots, record size) holding the values of
+        each block for each person slot in each frame
+    blocks : list of str
+        Keys of BLOCKS included in the store
+
+    """
+
+    def __init__(self, store_path):
+        with open(store_path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{store_path} is not a keypoint store")
+            header_size = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(header_size))
+        if header["version"] != STORE_VERSION:
+            raise ValueError(
+                f"{store_path} is a version {header['version']} keypoint "
+                f"store, not version {STORE_VERSION}"
+            )
+
+        n_frames = header["n_frames"]
+        offset = len(MAGIC) + 8 + header_size
+
+        def memmap(dtype, shape):
+            nonlocal offset
+            offset = _aligned(offset)
+            if not np.prod(shape):
+                return np.empty(shape, dtype=dtype)
+            array = np.memmap(
+                store_path, dtype=dtype, mode="r", offset=offset, shape=shape
+            )
+            offset += array.nbytes
+            return array
+
+        self.names = header["names"]
+        self.person_counts = memmap(np.int32, (n_frames,))
+        self.frame_numbers = memmap(np.int64, (n_frames,))
+        self.records = memmap(
+            np.dtype(header["dtype"]),
+            (n_frames, header["n_slots"], header["record_size"]),
+        )
+        self._layout = {
+            block: (n_points, n_values, start)
+            for block, n_points, n_values, start in header["blocks"]
+        }
+        self.blocks = list(self._layout)
+
+    def __len__(self):
+        return len(self.names)
+
+    def keypoints(self, block="pose_keypoints_2d", start=None, stop=None):
+        """Get a block of keypoints for a range of frames, without copying
+        them.
+
+        Parameters
+        ----------
+        block : str
+            One of blocks
+        start, stop : int
+            Range of frames, as for slicing. Defaults to all frames.
+
+        Returns
+        -------
+        np.array
+            Read-only array of shape (frames, slots, points, values), as
+            returned by openpose_json_loader.load_keypoints for
+            pose_keypoints_2d
+
+        """
+        if block not in self._layout:
+            raise KeyError(f"{block} is not in the keypoint store")
+        n_points, n_values, offset = self._layout[block]
+        records = self.records[start:stop, :, offset:]
+        return records[:, :, : n_points * n_values].reshape(
+            records.shape[:2] + (n_points, n_values)
+        )
+
+
+def _frame_number(name, default):
+    """Gets the frame number from an OpenPose JSON file name such as
+    video_000000000012_keypoints.json, or default if it hasn't got one."""
+    match = re.search(r"(\d+)_keypoints\.json$", name)
+    return int(match.group(1)) if match else default
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _align(f):
+    f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+
+
+def _write_aligned(f, array):
+    _align(f)
+    f.write(array.tobytes())
@@ -0,0 +1,619 @@
+import hashlib
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+
+from .json_backend import load_people
+from .keypoint_store import (
+    BLOCKS,
+    KeypointStore,
+    is_keypoint_store,
+    write_keypoint_store,
+)
+from .openpose_parts import OpenPoseParts
+
+# Increase this to invalidate existing caches if the cached data changes
+CACHE_VERSION = 1
+
+
+def is_archive(path):
+    """Whether path is a tar (optionally compressed) or zip archive, rather
+    than a directory, of OpenPose JSON files.
+
+    Parameters
+    ----------
+    path : str
+        Path to check
+
+    Returns
+    -------
+    bool
+        True if path is a tar or zip file
+
+    """
+    return os.path.isfile(path) and (
+        zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+    )
+
+
+def list_json_files(path_to_json):
+    """Get the names of the OpenPose JSON files in a directory, sorted so
+    that each file corresponds to the next frame of the video.
+
+    Parameters
+    ----------
+    path_to_json : str
+        Path to a directory of OpenPose JSON files, to a tar or zip archive
+        of them (see is_archive), or to a keypoint store packed from them
+        (see pack_keypoints)
+
+    Returns
+    -------
+    list of str
+        Sorted file names (without the directory), or member names for an
+        archive
+
+    """
+    if os.path.isfile(path_to_json):
+        if is_keypoint_store(path_to_json):
+            return KeypointStore(path_to_json).names
+        elif zipfile.is_zipfile(path_to_json):
+            with zipfile.ZipFile(path_to_json) as archive:
+                names = [
+                    info.filename
+                    for info in archive.infolist()
+                    if not info.is_dir()
+                ]
+        else:
+            with tarfile.open(path_to_json) as archive:
+                names = [
+                    member.name
+                    for member in archive.getmembers()
+                    if member.isfile()
+                ]
+        return sorted(name for name in names if name.endswith(".json"))
+
+    return sorted(f for f in os.listdir(path_to_json) if f.endswith(".json"))
+
+
+def iter_archive_members(path_to_archive, names):
+    """Reads members of a tar or zip archive one at a time, without
+    extracting them, so that each can be parsed before the next is read.
+    Tar archives are read in a single pass, so compressed ones are only
+    decompressed once, whatever order the members are in, and reading stops
+    as soon as all the members have been found.
+
+    Parameters
+    ----------
+    path_to_archive : str
+        Path to the archive
+    names : list of str
+        Names of the members to read, as returned by list_json_files
+
+    Yields
+    ------
+    index : int
+        Index in names of the member
+    contents : bytes
+        Contents of the member
+
+    Raises
+    ------
+    KeyError
+        If any of the members is not in the archive
+
+    """
+    if zipfile.is_zipfile(path_to_archive):
+        with zipfile.ZipFile(path_to_archive) as archive:
+            for i, name in enumerate(names):
+                yield i, archive.read(name)
+        return
+
+    indices = {name: i for i, name in enumerate(names)}
+    with tarfile.open(path_to_archive, "r|*") as archive:
+        for member in archive:
+            if member.isfile() and member.name in indices:
+                i = indices.pop(member.name)
+                yield i, archive.extractfile(member).read()
+                if not indices:
+                    break
+
+    if indices:
+        missing = next(iter(indices))
+        raise KeyError(f"{missing} not found in {path_to_archive}")
+
+
+def mask_missing_keypoints(keypoints):
+    """Replaces keypoints where x, y and confidence are all 0 (i.e. parts
+    OpenPose did not detect) with NaN, in place.
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array whose last axis holds the values for a single keypoint
+
+    Returns
+    -------
+    np.array
+        The same array, for convenience
+
+    """
+    keypoints[(keypoints == 0).all(axis=-1)] = np.nan
+    return keypoints
+
+
+def crop_keypoints(keypoints, person_counts, crop_rectangle):
+    """Moves keypoints detected on a whole video into the coordinates of a
+    rectangle cropped from it, as if OpenPose had been run on the cropped
+    video. Parts outside the rectangle become NaN, and people with no parts
+    inside it are removed, keeping the remaining people in order.
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (frames, people, parts, 3), as returned by
+        load_keypoints
+    person_counts : np.array
+        Number of people detected in each frame
+    crop_rectangle : tuple of int
+        Rectangle (w, h, x, y) with width w and height h and top-left
+        corner (x, y), in pixels from the top-left of the video
+
+    Returns
+    -------
+    keypoints : np.array
+        Cropped keypoints, with the people axis shrunk to the most people
+        left in a frame
+    person_counts : np.array
+        Number of people left in each frame
+
+    """
+    w, h, x, y = crop_rectangle
+    if w < 1 or h < 1:
+        raise ValueError("Crop width and height must be greater than 0")
+
+    if x < 0 or y < 0:
+        raise ValueError(
+            "Crop rectangle coordinates must be greater than or equal to 0"
+        )
+
+    keypoints = keypoints.copy()
+    keypoints[..., 0] -= x
+    keypoints[..., 1] -= y
+    with np.errstate(invalid="ignore"):
+        inside = (
+            (keypoints[..., 0] >= 0)
+            & (keypoints[..., 0] < w)
+            & (keypoints[..., 1] >= 0)
+            & (keypoints[..., 1] < h)
+        )
+    keypoints[~inside] = np.nan
+
+    # Move the people left in each frame to the front, in the same order
+    found = inside.any(axis=2)
+    order = np.argsort(~found, axis=1, kind="stable")
+    keypoints = np.take_along_axis(
+        keypoints, order[:, :, np.newaxis, np.newaxis], axis=1
+    )
+    person_counts = found.sum(axis=1).astype(np.int32)
+
+    return keypoints[:, : person_counts.max(initial=0)], person_counts
+
+
+def get_cache_path(path_to_json, cache_dir=None):
+    """Get the path of the file in which to cache the keypoints parsed from a
+    directory of JSON files.
+
+    Parameters
+    ----------
+    path_to_json : str
+        Path to a directory of OpenPose JSON files, or an archive of them
+    cache_dir : str
+        Directory in which to keep the cache. Defaults to None, which keeps
+        the cache next to path_to_json.
+
+    Returns
+    -------
+    str
+        Path of the cache file
+
+    """
+    path_to_json = os.path.abspath(path_to_json)
+    name = os.path.basename(path_to_json)
+    if cache_dir is None:
+        return os.path.join(
+            os.path.dirname(path_to_json), f".{name}_keypoints.npz"
+        )
+
+    # Several JSON directories may share a cache directory, so include a
+    # hash of the full path
+    path_hash = hashlib.sha1(path_to_json.encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{name}_{path_hash}_keypoints.npz")
+
+
+def json_directory_fingerprint(path_to_json, json_files, dtype=np.float32):
+    """Get a fingerprint of the given JSON files, based on their names, sizes
+    and modification times, which changes whenever OpenPose rewrites them.
+
+    For an archive, the fingerprint is based on the size and modification
+    time of the archive instead.
+
+    Parameters
+    ----------
+    path_to_json : str
+        Path to a directory of OpenPose JSON files, or an archive of them
+    json_files : list of str
+        Sorted names of the files in path_to_json
+    dtype : np.dtype
+        Type of the cached keypoints array
+
+    Returns
+    -------
+    str
+        Hex digest identifying the files
+
+    """
+    sha = hashlib.sha1(f"{CACHE_VERSION}:{np.dtype(dtype).str}".encode())
+    if os.path.isfile(path_to_json):
+        st = os.stat(path_to_json)
+        sha.update(f"\n{st.st_size}:{st.st_mtime_ns}".encode())
+        for name in json_files:
+            sha.update(f"\n{name}".encode())
+        return sha.hexdigest()
+
+    stats = {
+        entry.name: entry.stat()
+        for entry in os.scandir(path_to_json)
+        if entry.name.endswith(".json")
+    }
+    for name in json_files:
+        st = stats[name]
+        sha.update(f"\n{name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return sha.hexdigest()
+
+
+def load_keypoints(
+    path_to_json,
+    number_of_people=None,
+    json_files=None,
+    dtype=np.float32,
+    jobs=1,
+    cache_path=None,
+):
+    """Loads a whole directory of OpenPose JSON files (one per frame) into a
+    single array.
+
+    Parameters
+    ----------
+    path_to_json : str
+        Path to a directory of OpenPose JSON files, or a tar or zip archive
+        of them (see is_archive), whose members are read without extracting
+        them, or a keypoint store packed from them (see pack_keypoints),
+        from which only the frames in json_files are read
+    number_of_people : int
+        Maximum number of people to load from each frame, in the order
+        OpenPose lists them. Defaults to None, which loads everyone.
+    json_files : list of str
+        Sorted names of the files in path_to_json to load. Defaults to None,
+        which loads all JSON files in the directory.
+    dtype : np.dtype
+        Type of the returned keypoints array (default np.float32)
+    jobs : int
+        Number of processes to parse the files with. The files are split into
+        contiguous chunks, one per process, and the results joined back
+        together in frame order. For an archive, each process reads its own
+        chunk of members from it. Default is 1, which parses in this process.
+    cache_path : str
+        Path to a .npz file in which to cache the parsed keypoints (see
+        get_cache_path). If the cache matches the fingerprint of the JSON
+        files it is loaded instead of parsing them; otherwise the files are
+        parsed and the cache rewritten. Default is None, which does not cache.
+
+    Returns
+    -------
+    keypoints : np.array
+        Array of shape (frames, people, parts, 3) holding x, y, confidence
+        for each part (in OpenPoseParts order) of each person in each frame.
+        Undetected parts and people are NaN.
+    person_counts : np.array
+        Number of people (up to number_of_people) detected in each frame.
+
+    """
+    if is_keypoint_store(path_to_json):
+        # The store is already as quick to load as a cache
+        return _load_store(path_to_json, number_of_people, json_files, dtype)
+
+    if json_files is None:
+        json_files = list_json_files(path_to_json)
+
+    if cache_path:
+        fingerprint = json_directory_fingerprint(
+            path_to_json, json_files, dtype
+        )
+        cached = _read_cache(cache_path, fingerprint)
+        if cached is None:
+            # Cache every person so that the cache can be shared between
+            # runs with different numbers of people
+            cached = load_keypoints(
+                path_to_json, None, json_files, dtype=dtype, jobs=jobs
+            )
+            _write_cache(cache_path, fingerprint, *cached)
+        else:
+            print(f"Using cached keypoints from {cache_path}.")
+
+        keypoints, person_counts = cached
+        if number_of_people is not None:
+            person_counts = np.minimum(person_counts, number_of_people)
+            keypoints = keypoints[:, : person_counts.max(initial=0)]
+        return keypoints, person_counts
+
+    if os.path.isfile(path_to_json):
+        # Pass the member names rather than their contents, so that each
+        # process reads its own members from the archive
+        path_to_archive, filepaths = path_to_json, json_files
+    else:
+        path_to_archive = None
+        filepaths = [os.path.join(path_to_json, f) for f in json_files]
+
+    if jobs > 1 and len(filepaths) > 1:
+        chunks = [
+            filepaths[chunk[0] : chunk[-1] + 1]
+            for chunk in np.array_split(
+                np.arange(len(filepaths)), min(jobs, len(filepaths))
+            )
+        ]
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            results = list(
+                executor.map(
+                    _load_frames,
+                    chunks,
+                    repeat(number_of_people),
+                    repeat(dtype),
+                    repeat(path_to_archive),
+                )
+            )
+        keypoints, person_counts = _join_frames(results)
+    else:
+        keypoints, person_counts = _load_frames(
+            filepaths, number_of_people, dtype, path_to_archive
+        )
+
+    return keypoints, person_counts
+
+
+def pack_keypoints(
+    path_to_json,
+    store_path,
+    blocks=("pose_keypoints_2d",),
+    dtype=np.float32,
+    jobs=1,
+):
+    """Packs a directory (or archive) of OpenPose JSON files into a single
+    keypoint store file (see keypoint_store.write_keypoint_store), which
+    load_keypoints and keypoint_store.KeypointStore can read any frames of
+    without reading the rest.
+
+    Parameters
+    ----------
+    path_to_json : str
+        Path to a directory of OpenPose JSON files, or an archive of them
+    store_path : str
+        Path of the store to write
+    blocks : list of str
+        Keys of keypoint_store.BLOCKS to include, e.g. pose_keypoints_3d or
+        hand_left_keypoints_2d. Defaults to just pose_keypoints_2d.
+    dtype : np.dtype
+        Type of the stored values (default np.float32)
+    jobs : int
+        Number of processes to parse the files with (see load_keypoints)
+
+    Returns
+    -------
+    keypoint_store.KeypointStore
+        The new store
+
+    """
+    unknown = [block for block in blocks if block not in BLOCKS]
+    if unknown:
+        raise ValueError(f"Unknown keypoint blocks {unknown}")
+    if is_keypoint_store(path_to_json):
+        raise ValueError(f"{path_to_json} is already a keypoint store")
+
+    json_files = list_json_files(path_to_json)
+    if os.path.isfile(path_to_json):
+        # Pass the member names rather than their contents, so that each
+        # process reads its own members from the archive
+        path_to_archive, filepaths = path_to_json, json_files
+    else:
+        path_to_archive = None
+        filepaths = [os.path.join(path_to_json, f) for f in json_files]
+
+    if jobs > 1 and len(filepaths) > 1:
+        chunks = [
+            filepaths[chunk[0] : chunk[-1] + 1]
+            for chunk in np.array_split(
+                np.arange(len(filepaths)), min(jobs, len(filepaths))
+            )
+        ]
+        with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+            results = list(
+                executor.map(
+                    _load_records,
+                    chunks,
+                    repeat(blocks),
+                    repeat(dtype),
+                    repeat(path_to_archive),
+                )
+            )
+    else:
+        results = [_load_records(filepaths, blocks, dtype, path_to_archive)]
+
+    write_keypoint_store(
+        store_path,
+        [records for records, _ in results],
+        np.concatenate([counts for _, counts in results]),
+        json_files,
+        blocks,
+        dtype,
+    )
+    return KeypointStore(store_path)
+
+
+def _load_store(store_path, number_of_people, json_files, dtype):
+    """Loads the given frames from a keypoint store into arrays as described
+    in load_keypoints."""
+    store = KeypointStore(store_path)
+    frames = slice(None)
+    if json_files is not None and list(json_files) != store.names:
+        indices = {name: i for i, name in enumerate(store.names)}
+        frames = [indices[name] for name in json_files]
+
+    person_counts = np.array(store.person_counts[frames])
+    if number_of_people is not None:
+        person_counts = np.minimum(person_counts, number_of_people)
+    keypoints = store.keypoints()[:, : person_counts.max(initial=0)]
+    return keypoints[frames].astype(dtype), person_counts
+
+
+def _load_records(filepaths, blocks, dtype, path_to_archive=None):
+    """Loads the given JSON files (paths, or names of members of
+    path_to_archive) into an array of keypoint store records of shape
+    (frames, people, record size), and the number of people in each
+    frame."""
+    record_size = sum(np.prod(BLOCKS[block]) for block in blocks)
+    frames = [None] * len(filepaths)
+    for i, source in _iter_sources(filepaths, path_to_archive):
+        frames[i] = load_people(source, blocks)
+
+    person_counts = np.array([len(people) for people in frames], np.int32)
+    records = np.full(
+        (len(frames), person_counts.max(initial=0), record_size),
+        np.nan,
+        dtype=dtype,
+    )
+    for i, people in enumerate(frames):
+        for p, person in enumerate(people):
+            start = 0
+            for block in blocks:
+                n_points, n_values = BLOCKS[block]
+                end = start + n_points * n_values
+                # OpenPose writes an empty list for blocks it didn't run
+                values = person.get(block)
+                if values and len(values) == end - start:
+                    records[i, p, start:end] = values
+                start = end
+
+    # Parts which weren't detected are all 0, as in mask_missing_keypoints
+    start = 0
+    for block in blocks:
+        n_points, n_values = BLOCKS[block]
+        end = start + n_points * n_values
+        values = records[:, :, start:end]
+        missing = (
+            values.reshape(values.shape[:2] + (n_points, n_values)) == 0
+        ).all(axis=-1)
+        values[np.repeat(missing, n_values, axis=-1)] = np.nan
+        start = end
+
+    return records, person_counts
+
+
+def _iter_sources(filepaths, path_to_archive=None):
+    """Yields the index of each of the given JSON files, and its path, or
+    its contents if the files are members of path_to_archive (as read by
+    iter_archive_members)."""
+    if path_to_archive is None:
+        return enumerate(filepaths)
+    return iter_archive_members(path_to_archive, filepaths)
+
+
+def _load_frames(filepaths, number_of_people, dtype, path_to_archive=None):
+    """Loads the given JSON files (paths, or names of members of
+    path_to_archive, which are parsed as they are read) into arrays as
+    described in load_keypoints."""
+    n_parts = len(OpenPoseParts)
+    n_slots = number_of_people if number_of_people is not None else 1
+    keypoints = np.full(
+        (len(filepaths), n_slots, n_parts, 3), np.nan, dtype=dtype
+    )
+    person_counts = np.zeros(len(filepaths), dtype=np.int32)
+
+    for i, source in _iter_sources(filepaths, path_to_archive):
+        people = load_people(source)[:number_of_people]
+
+        # Grow the people axis if this frame has more people than we've
+        # allowed for so far (only happens when number_of_people is None)
+        if len(people) > keypoints.shape[1]:
+            keypoints = _pad_people(keypoints, len(people))
+
+        person_counts[i] = len(people)
+        for p, person in enumerate(people):
+            keypoints[i, p] = np.reshape(
+                person["pose_keypoints_2d"], (n_parts, 3)
+            )
+
+    # Drop people slots which are never filled
+    keypoints = keypoints[:, : person_counts.max(initial=0)]
+
+    return mask_missing_keypoints(keypoints), person_counts
+
+
+def _join_frames(results):
+    """Joins a list of (keypoints, person_counts) pairs for consecutive
+    chunks of frames into a single pair."""
+    n_slots = max(keypoints.shape[1] for keypoints, _ in results)
+    keypoints = np.concatenate(
+        [_pad_people(keypoints, n_slots) for keypoints, _ in results]
+    )
+    person_counts = np.concatenate([counts for _, counts in results])
+    return keypoints, person_counts
+
+
+def _pad_people(keypoints, n_slots):
+    """Pads the people axis of the keypoints array with NaN up to n_slots."""
+    if keypoints.shape[1] >= n_slots:
+        return keypoints
+    extra = np.full(
+        (keypoints.shape[0], n_slots - keypoints.shape[1])
+        + keypoints.shape[2:],
+        np.nan,
+        dtype=keypoints.dtype,
+    )
+    return np.concatenate([keypoints, extra], axis=1)
+
+
+def _read_cache(cache_path, fingerprint):
+    """Reads (keypoints, person_counts) from the cache file, or returns None
+    if it doesn't exist or doesn't match the fingerprint."""
+    try:
+        with np.load(cache_path) as cache:
+            if str(cache["fingerprint"]) != fingerprint:
+                return None
+            return cache["keypoints"], cache["person_counts"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _write_cache(cache_path, fingerprint, keypoints, person_counts):
+    """Writes keypoints and person_counts to the cache file."""
+    # Write to a temporary file first so an interrupted write can't leave a
+    # partial cache behind
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                fingerprint=np.array(fingerprint),
+                keypoints=keypoints,
+                person_counts=person_counts,
+            )
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"Unable to write keypoints cache {cache_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -1,7 +1,12 @@
-import json
 import numpy as np
 import pandas as pd
 
+from . import json_backend
+from .keypoint_sorter import (
+    get_x_position_order,
+    sort_dataframe_by_x_position,
+    sort_keypoints_by_x_position,
+)
 from .openpose_parts import OpenPoseParts
 
 
@@ -29,8 +34,7 @@ class OpenPoseJsonParser:
 
     def __init__(self, filepath):
         print(filepath.split("/")[-1])
-        with open(filepath) as f:
-            self.all_data = json.load(f)
+        self.all_data = json_backend.load(filepath)
         print("{} persons are detected".format(len(self.all_data["people"])))
 
     def get_person_count(self):
@@ -78,7 +82,45 @@ class OpenPoseJsonParser:
         df.columns = self.COLUMN_NAMES
         return df
 
-    def sort_persons_by_x_position(self, body_keypoints_df):
+    @classmethod
+    def dataframe_from_keypoints(cls, person_keypoints, parts=None):
+        """Creates a DataFrame in the format returned by get_multiple_keypoints
+        from an array of keypoints, such as a frame of the array returned by
+        openpose_json_loader.load_keypoints.
+
+        Parameters
+        ----------
+        person_keypoints : np.array
+            Array of shape (people, parts, 3) holding x, y, confidence for
+            each part of each person
+
+        parts : array of OpenPoseParts
+            Parts held in person_keypoints, in order. Defaults to None, which
+            means all parts.
+
+        Returns
+        -------
+        DataFrame
+            DataFrame containing the keypoints, labelled with e.g. x0, y0,
+            confidence0, x1, y1, confidence1
+
+        """
+        row_names = [p.value for p in parts] if parts else cls.ROW_NAMES
+        column_names = [
+            c + str(i)
+            for i in range(len(person_keypoints))
+            for c in cls.COLUMN_NAMES
+        ]
+        return pd.DataFrame(
+            np.transpose(person_keypoints, (1, 0, 2)).reshape(
+                len(row_names), -1
+            ),
+            index=row_names,
+            columns=column_names,
+        )
+
+    @staticmethod
+    def sort_persons_by_x_position(body_keypoints_df):
         """Sort the data so that the left-most person has index 0, the next has index 1, etc.
 
         Parameters
@@ -90,54 +132,80 @@ class OpenPoseJsonParser:
         sorted_body_keypoints_df
             Sorted DataFrame.
         """
-        sorted_body_keypoints_df = pd.DataFrame()
+        return sort_dataframe_by_x_position(
+            body_keypoints_df, len(OpenPoseJsonParser.COLUMN_NAMES)
+        )
 
-        # Find permutation to sort x values in ascending order
-        idx = np.argsort(body_keypoints_df.mean(axis=0).iloc[0::3])
+    @staticmethod
+    def replace_low_confidence_keypoints(
+        body_keypoints_df, confidence_threshold, previous_body_keypoints_df
+    ):
+        """Replaces keypoints whose confidence is below the threshold with the
+        keypoints from the previous frame, if those have a higher confidence.
 
-        # Test whether permutation equals just the numbering (1, 2, 3, ...), i.e. whether x values are already sorted.
-        if list(range(len(idx))) == list(idx):
-            sorted_body_keypoints_df = sorted_body_keypoints_df.join(
-                body_keypoints_df, how="right"
-            )
-        # Otherwise, sort them
-        else:
-            for i in range(len(idx)):
-                cname = "confidence" + str(i)
-                cname_old = "confidence" + str(idx[i])
-                xname = "x" + str(i)
-                xname_old = "x" + str(idx[i])
-                yname = "y" + str(i)
-                yname_old = "y" + str(idx[i])
-
-                sorted_body_keypoints_df = sorted_body_keypoints_df.join(
-                    body_keypoints_df[[xname_old]], how="right", rsuffix="new"
-                )
-                sorted_body_keypoints_df = sorted_body_keypoints_df.join(
-                    body_keypoints_df[[yname_old]], how="right", rsuffix="new"
-                )
-                sorted_body_keypoints_df = sorted_body_keypoints_df.join(
-                    body_keypoints_df[[cname_old]], how="right", rsuffix="new"
-                )
+        The parts found in the previous frame are compared in turn, for each
+        person in turn, with the same person in the previous frame. The
+        people are sorted by sort_persons_by_x_position before each
+        comparison, so a replaced keypoint which moves a person past another
+        changes who the following parts are compared with.
 
-                sorted_body_keypoints_df.rename(
-                    columns={sorted_body_keypoints_df.columns[i * 3]: xname},
-                    inplace=True,
-                )
-                sorted_body_keypoints_df.rename(
-                    columns={
-                        sorted_body_keypoints_df.columns[i * 3 + 1]: yname
-                    },
-                    inplace=True,
-                )
-                sorted_body_keypoints_df.rename(
-                    columns={
-                        sorted_body_keypoints_df.columns[i * 3 + 2]: cname
-                    },
-                    inplace=True,
-                )
+        Parameters
+        ----------
+        body_keypoints_df : DataFrame
+            DataFrame of the current frame, as created by
+            get_multiple_keypoints
+
+        confidence_threshold: float threshold in [0, 1] for confidence
+
+        previous_body_keypoints_df: data frame of previous frame in video, if existent.
+            Default is None.
 
-        return sorted_body_keypoints_df
+        Returns
+        -------
+        DataFrame
+            DataFrame with low confidence keypoints replaced. The people are
+            in the order of the last comparison, so may need sorting again.
+
+        """
+        if (
+            previous_body_keypoints_df is None
+            or previous_body_keypoints_df.empty
+        ):
+            return body_keypoints_df
+
+        # Arrays of shape (people, parts, values), matching parts by name
+        # (parts missing from the previous frame are never compared)
+        n_values = len(OpenPoseJsonParser.COLUMN_NAMES)
+        n_parts = len(body_keypoints_df)
+        current = np.transpose(
+            body_keypoints_df.to_numpy(dtype=float).reshape(
+                n_parts, -1, n_values
+            ),
+            (1, 0, 2),
+        )
+        previous_values = previous_body_keypoints_df.reindex(
+            body_keypoints_df.index
+        ).to_numpy(dtype=float)
+        n_people = min(len(current), previous_values.shape[1] // n_values)
+        previous = np.full(current.shape, np.nan)
+        previous[:n_people] = np.transpose(
+            previous_values[:, : n_people * n_values].reshape(
+                n_parts, n_people, n_values
+            ),
+            (1, 0, 2),
+        )
+        compared_parts = np.flatnonzero(
+            body_keypoints_df.index.isin(previous_body_keypoints_df.index)
+        )
+
+        current = _replace_keypoints_in_order(
+            current, previous, compared_parts, confidence_threshold
+        )
+        return pd.DataFrame(
+            np.transpose(current, (1, 0, 2)).reshape(n_parts, -1),
+            index=body_keypoints_df.index,
+            columns=body_keypoints_df.columns,
+        )
 
     def get_multiple_keypoints(
         self,
@@ -213,48 +281,383 @@ class OpenPoseJsonParser:
         body_keypoints_df.columns = column_names
         body_keypoints_df.index = self.ROW_NAMES
 
-        # Check whether previous frame had higher confidence points and replace
-        if (
-            not previous_body_keypoints_df is None
-            and not previous_body_keypoints_df.empty
-        ):
-            for row in body_keypoints_df.itertuples():
-
-                for p in range(int(len(body_keypoints_df.columns) / 3)):
-                    cname = "confidence" + str(p)
-                    xname = "x" + str(p)
-                    yname = "y" + str(p)
-
-                    if row.Index in previous_body_keypoints_df.index:
-
-                        body_keypoints_df = self.sort_persons_by_x_position(
-                            body_keypoints_df
-                        )
-
-                        if (
-                            body_keypoints_df.loc[row.Index, cname]
-                            < confidence_threshold
-                            and body_keypoints_df.loc[row.Index, cname]
-                            < previous_body_keypoints_df.loc[row.Index, cname]
-                        ):
-                            body_keypoints_df.loc[
-                                row.Index, xname
-                            ] = previous_body_keypoints_df.loc[
-                                row.Index, xname
-                            ]
-                            body_keypoints_df.loc[
-                                row.Index, yname
-                            ] = previous_body_keypoints_df.loc[
-                                row.Index, yname
-                            ]
-                            body_keypoints_df.loc[
-                                row.Index, cname
-                            ] = previous_body_keypoints_df.loc[
-                                row.Index, cname
-                            ]
+        body_keypoints_df = self.replace_low_confidence_keypoints(
+            body_keypoints_df, confidence_threshold, previous_body_keypoints_df
+        )
 
         if parts:
             part_names = [x.value for x in parts]
             body_keypoints_df = body_keypoints_df.loc[part_names]
 
         return body_keypoints_df
+
+
+def _replace_keypoints_in_order(
+    keypoints, previous, compared_parts, confidence_threshold
+):
+    """Replaces the keypoints of a single frame whose confidence is below
+    the threshold with the keypoints from the previous frame, if those have
+    a higher confidence, as described in
+    OpenPoseJsonParser.replace_low_confidence_keypoints.
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (people, parts, 3) holding x, y, confidence
+    previous : np.array
+        Keypoints of the previous frame, of the same shape
+    compared_parts : list of int
+        Indices of the parts to compare, in the order they are compared
+    confidence_threshold : float
+        Threshold in [0, 1] for confidence
+
+    Returns
+    -------
+    np.array
+        Copy of keypoints with low confidence keypoints replaced, with the
+        people in the order of the last comparison
+
+    """
+    keypoints = keypoints.copy()
+    if len(compared_parts) == 0 or len(keypoints) == 0:
+        return keypoints
+
+    needs_sort = True
+    for part in compared_parts:
+        if needs_sort:
+            keypoints = sort_keypoints_by_x_position(keypoints)
+            needs_sort = False
+        # The order of the people can only change once a keypoint of this
+        # part is replaced
+        confidence = keypoints[:, part, 2]
+        if not (
+            (confidence < confidence_threshold)
+            & (confidence < previous[:, part, 2])
+        ).any():
+            continue
+        for person in range(len(keypoints)):
+            if needs_sort:
+                keypoints = sort_keypoints_by_x_position(keypoints)
+                needs_sort = False
+            confidence = keypoints[person, part, 2]
+            if (
+                confidence < confidence_threshold
+                and confidence < previous[person, part, 2]
+            ):
+                keypoints[person, part] = previous[person, part]
+                needs_sort = True
+    return keypoints
+
+
+def apply_confidence_threshold(
+    keypoints,
+    person_counts,
+    number_of_people,
+    confidence_threshold,
+    part_indices=None,
+    previous=None,
+):
+    """Replaces keypoints whose confidence is below the threshold with the
+    keypoints from the previous frame, if those have a higher confidence,
+    keeps the given parts and orders the people in each frame from left to
+    right, across a whole recording at once.
+
+    Gives the same keypoints as OpenPoseJsonParser.get_multiple_keypoints
+    followed by sort_persons_by_x_position for each frame. The previous
+    frame is the last frame (after replacement and sorting) in which
+    number_of_people people were detected; frames with fewer people are
+    compared with it but are never used for comparison themselves.
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (frames, people, parts, 3) holding x, y, confidence,
+        as returned by openpose_json_loader.load_keypoints, with every part
+        and the people in each frame in the order of the json file.
+    person_counts : np.array
+        Number of people detected in each frame
+    number_of_people : int
+        Number of people expected in each frame
+    confidence_threshold : float
+        Threshold in [0, 1] for confidence
+    part_indices : list of int
+        Indices of the parts to keep. Defaults to None, i.e. every part.
+    previous : np.array
+        Keypoints returned for the last frame before keypoints in which
+        number_of_people people were detected, of shape
+        (people, len(part_indices), 3). Defaults to None, i.e. the frames
+        up to the first with number_of_people people are only sorted.
+
+    Returns
+    -------
+    np.array
+        Array of shape (frames, people, len(part_indices), 3) with low
+        confidence keypoints replaced and the people sorted by x position
+
+    """
+    if part_indices is None:
+        part_indices = np.arange(keypoints.shape[2])
+    part_indices = np.asarray(part_indices)
+
+    result = sort_keypoints_by_x_position(keypoints[:, :, part_indices])
+    full_frames = np.flatnonzero(person_counts == number_of_people)
+    start = 0
+    if previous is None:
+        if len(full_frames) == 0:
+            return result
+        previous = result[full_frames[0]]
+        start = full_frames[0] + 1
+        full_frames = full_frames[1:]
+    first_previous = previous
+
+    # The people are sorted by x position over every part before any
+    # keypoints are replaced
+    sorted_keypoints = sort_keypoints_by_x_position(keypoints)
+
+    # The frames where everyone was detected are replaced all at once, each
+    # compared with the one before after replacement, in blocks. From the
+    # first frame where that could differ from replacing each part in turn
+    # (see _replace_keypoints_in_order), the frame is replaced in turn and
+    # the next block starts after it.
+    block_size = 256
+    i = 0
+    while i < len(full_frames):
+        frames = full_frames[i : i + block_size]
+        carried = _carry_forward_keypoints(
+            np.concatenate(
+                [
+                    previous[np.newaxis],
+                    sorted_keypoints[frames][:, :, part_indices],
+                ]
+            ),
+            confidence_threshold,
+        )
+        reordered = _replacement_reorders(
+            sorted_keypoints[frames],
+            carried[:-1],
+            part_indices,
+            confidence_threshold,
+        )
+        n_done = np.argmax(reordered) if reordered.any() else len(frames)
+        result[frames[:n_done]] = carried[1 : n_done + 1]
+        if n_done < len(frames):
+            result[frames[n_done]] = _replace_frame_in_order(
+                keypoints[frames[n_done]],
+                number_of_people,
+                carried[n_done],
+                part_indices,
+                confidence_threshold,
+            )
+            n_done += 1
+            block_size = max(16, 2 * n_done)
+        else:
+            block_size *= 2
+        previous = result[frames[n_done - 1]]
+        i += n_done
+
+    # Compare the other frames with the last frame where everyone was
+    # detected
+    other_frames = np.flatnonzero(person_counts != number_of_people)
+    other_frames = other_frames[other_frames >= start]
+    previous_frames = np.concatenate(
+        [first_previous[np.newaxis], result[full_frames]]
+    )[np.searchsorted(full_frames, other_frames)]
+    selected = sorted_keypoints[other_frames][:, :, part_indices]
+    replace = (selected[..., 2] < confidence_threshold) & (
+        selected[..., 2] < previous_frames[..., 2]
+    )
+    selected[replace] = previous_frames[replace]
+    result[other_frames] = selected
+    reordered = _replacement_reorders(
+        sorted_keypoints[other_frames],
+        previous_frames,
+        part_indices,
+        confidence_threshold,
+    )
+    for frame, frame_previous in zip(
+        other_frames[reordered], previous_frames[reordered]
+    ):
+        result[frame] = _replace_frame_in_order(
+            keypoints[frame],
+            person_counts[frame],
+            frame_previous,
+            part_indices,
+            confidence_threshold,
+        )
+
+    return result
+
+
+def _replace_frame_in_order(
+    keypoints, person_count, previous, part_indices, confidence_threshold
+):
+    """Replaces the low confidence keypoints of a single frame with
+    _replace_keypoints_in_order, then keeps the given parts and sorts the
+    people, giving the keypoints apply_confidence_threshold returns for the
+    frame.
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (people, parts, 3) with every part
+    person_count : int
+        Number of people detected in the frame, the rest of keypoints
+        being NaN
+    previous : np.array
+        Keypoints returned for the previous frame, of shape
+        (people, len(part_indices), 3)
+    part_indices : np.array
+        Indices of the parts to keep
+    confidence_threshold : float
+        Threshold in [0, 1] for confidence
+
+    Returns
+    -------
+    np.array
+        Array of shape (people, len(part_indices), 3)
+
+    """
+    previous_parts = np.full(keypoints.shape, np.nan)
+    previous_parts[:, part_indices] = previous
+    keypoints = keypoints.copy()
+    keypoints[:person_count] = _replace_keypoints_in_order(
+        keypoints[:person_count],
+        previous_parts[:person_count],
+        np.sort(part_indices),
+        confidence_threshold,
+    )
+    return sort_keypoints_by_x_position(keypoints[:, part_indices])
+
+
+def _replacement_reorders(
+    keypoints, previous, part_indices, confidence_threshold
+):
+    """Whether replacing the low confidence keypoints of each frame all at
+    once could differ from apply_confidence_threshold, because the people
+    might be re-sorted after replacing one of them (see
+    _replace_keypoints_in_order) or once the parts are kept.
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (frames, people, parts, 3) with every part and the
+        people sorted by x position
+    previous : np.array
+        Keypoints to compare each frame with, of shape
+        (frames, people, len(part_indices), 3)
+    part_indices : np.array
+        Indices of the parts to keep
+    confidence_threshold : float
+        Threshold in [0, 1] for confidence
+
+    Returns
+    -------
+    np.array
+        Boolean array with an entry for each frame
+
+    """
+    selected = keypoints[:, :, part_indices]
+    replace = (selected[..., 2] < confidence_threshold) & (
+        selected[..., 2] < previous[..., 2]
+    )
+    selected[replace] = previous[replace]
+    order = get_x_position_order(selected)
+    reordered = (order != np.arange(order.shape[-1])).any(axis=-1)
+
+    # Mean x of each person after each replacement, in the order they are
+    # replaced: by part, then person
+    part_order = np.argsort(part_indices, kind="stable")
+    frames, parts, people = np.nonzero(
+        np.transpose(replace[:, :, part_order], (0, 2, 1))
+    )
+    if len(frames) == 0:
+        return reordered
+    parts = part_order[parts]
+    shifts = np.zeros((len(frames), keypoints.shape[1]))
+    shifts[np.arange(len(frames)), people] = (
+        previous[frames, people, parts, 0]
+        - keypoints[frames, people, part_indices[parts], 0]
+    )
+    shifts = np.cumsum(shifts, axis=0)
+    # Only add up the shifts within each frame
+    frame_starts = np.maximum.accumulate(
+        np.where(np.diff(frames, prepend=-1) != 0, np.arange(len(frames)), 0)
+    )
+    shifts -= np.concatenate([np.zeros((1, shifts.shape[1])), shifts])[
+        frame_starts
+    ]
+    x = keypoints[..., 0]
+    found = ~np.isnan(x)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = (np.where(found, x, 0).sum(axis=-1)[frames] + shifts) / (
+            found.sum(axis=-1)[frames]
+        )
+
+    # The order stays the same while each person is to the left of the
+    # next, or the next has no keypoints. Ties, and near ties which might be
+    # rounded either way, are replaced in turn to be sure.
+    left, right = mean_x[:, :-1], mean_x[:, 1:]
+    in_order = np.isnan(right) | (right > left + 1e-9 * (np.abs(left) + 1))
+    reordered[frames[~in_order.all(axis=-1)]] = True
+    return reordered
+
+
+def _carry_forward_keypoints(keypoints, confidence_threshold):
+    """Replaces low confidence keypoints in frames which all have the same
+    people, each frame being compared with the previous one after
+    replacement (see apply_confidence_threshold).
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (frames, people, parts, 3). The first frame is kept
+        as it is.
+    confidence_threshold : float
+        Threshold in [0, 1] for confidence
+
+    Returns
+    -------
+    np.array
+        Copy of keypoints with low confidence keypoints replaced
+
+    """
+    # Each frame's values are carried forward to the next. A keypoint is kept
+    # if its confidence is at least the threshold, if it is NaN (which never
+    # compares lower), or if it is at least the confidence of every keypoint
+    # since the last one of those. Everything else is replaced by the last
+    # kept keypoint.
+    n_full = len(keypoints)
+    full_keypoints = keypoints.reshape(n_full, -1, 3).copy()
+    conf = full_keypoints[..., 2]
+    frame_indices = np.arange(n_full, dtype=np.int32)[:, np.newaxis]
+    high = conf >= confidence_threshold
+    low = conf < confidence_threshold
+    resets = ~low
+    resets[0] = True
+    kept = resets.copy()
+
+    # Low keypoints after a high one are always replaced, so only those after
+    # a NaN (or at the start) need comparing with each other
+    last_high = np.maximum.accumulate(
+        np.where(high, frame_indices, -1), axis=0
+    )
+    last_other_reset = np.maximum.accumulate(
+        np.where(resets & ~high, frame_indices, -1), axis=0
+    )
+    to_compare = (low & (last_other_reset > last_high)) | (resets & ~high)
+    if to_compare.any():
+        frames, columns = np.nonzero(to_compare)
+        # Running maximum of the confidence since the last reset, for each
+        # column (np.nonzero returns the values in frame order)
+        segments = last_other_reset[frames, columns] * conf.shape[1] + columns
+        values = conf[frames, columns]
+        running_max = pd.Series(values).groupby(segments).cummax().to_numpy()
+        kept[frames, columns] |= values == running_max
+
+    # Index of the last kept frame for each replaced keypoint
+    source = np.maximum.accumulate(np.where(kept, frame_indices, 0), axis=0)
+    frames, columns = np.nonzero(~kept)
+    full_keypoints[frames, columns] = full_keypoints[
+        source[frames, columns], columns
+    ]
+    return full_keypoints.reshape(keypoints.shape)
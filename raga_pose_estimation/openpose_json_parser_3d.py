@@ -2,6 +2,7 @@ import json
 import numpy as np
 import pandas as pd
 
+from .keypoint_sorter import sort_dataframe_by_x_position
 from .openpose_parts import OpenPoseParts
 
 
@@ -96,65 +97,9 @@ class OpenPoseJsonParser:
         sorted_body_keypoints_df
             Sorted DataFrame.
         """
-        sorted_body_keypoints_df = pd.DataFrame()
-
-        # Find permutation to sort x values in ascending order
-        idx = np.argsort(body_keypoints_df.mean(axis=0).iloc[0::4])
-
-        # Test whether permutation equals just the numbering (1, 2, 3, ...), i.e. whether x values are already sorted.
-        if list(range(len(idx))) == list(idx):
-            sorted_body_keypoints_df = sorted_body_keypoints_df.join(
-                body_keypoints_df, how="right"
-            )
-        # Otherwise, sort them
-        else:
-            for i in range(len(idx)):
-                cname = "confidence" + str(i)
-                cname_old = "confidence" + str(idx[i])
-                xname = "x" + str(i)
-                xname_old = "x" + str(idx[i])
-                yname = "y" + str(i)
-                yname_old = "y" + str(idx[i])
-                zname = "z" + str(i)
-                zname_old = "z" + str(idx[i])
-
-                sorted_body_keypoints_df = sorted_body_keypoints_df.join(
-                    body_keypoints_df[[xname_old]], how="right", rsuffix="new"
-                )
-                sorted_body_keypoints_df = sorted_body_keypoints_df.join(
-                    body_keypoints_df[[yname_old]], how="right", rsuffix="new"
-                )
-                sorted_body_keypoints_df = sorted_body_keypoints_df.join(
-                    body_keypoints_df[[zname_old]], how="right", rsuffix="new"
-                )
-                sorted_body_keypoints_df = sorted_body_keypoints_df.join(
-                    body_keypoints_df[[cname_old]], how="right", rsuffix="new"
-                )
-
-                sorted_body_keypoints_df.rename(
-                    columns={sorted_body_keypoints_df.columns[i * 4]: xname},
-                    inplace=True,
-                )
-                sorted_body_keypoints_df.rename(
-                    columns={
-                        sorted_body_keypoints_df.columns[i * 4 + 1]: yname
-                    },
-                    inplace=True,
-                )
-                sorted_body_keypoints_df.rename(
-                    columns={
-                        sorted_body_keypoints_df.columns[i * 4 + 2]: zname
-                    },
-                    inplace=True,
-                )
-                sorted_body_keypoints_df.rename(
-                    columns={
-                        sorted_body_keypoints_df.columns[i * 4 + 3]: cname
-                    },
-                    inplace=True,
-                )
-
-        return sorted_body_keypoints_df
+        return sort_dataframe_by_x_position(
+            body_keypoints_df, len(OpenPoseJsonParser.COLUMN_NAMES)
+        )
 
     def get_multiple_keypoints(
         self,
@@ -0,0 +1,188 @@
+import os
+import shutil
+import subprocess
+
+import cv2
+import numpy as np
+
+from .openpose_json_loader import list_json_files
+
+
+def get_segments(n_frames, n_segments):
+    """Splits the frames of a video into consecutive segments of roughly
+    equal length.
+
+    Parameters
+    ----------
+    n_frames : int
+        Number of frames in the video
+    n_segments : int
+        Number of segments to split it into. Fewer segments are returned if
+        there are fewer frames than segments.
+
+    Returns
+    -------
+    list of (int, int)
+        First and last frame (inclusive) of each segment. The last frame of
+        the last segment is None, so that it runs to the end of the video
+        even if n_frames is an underestimate.
+
+    """
+    starts = [
+        int(chunk[0])
+        for chunk in np.array_split(
+            np.arange(n_frames), max(1, min(n_segments, n_frames))
+        )
+        if len(chunk)
+    ] or [0]
+    lasts = [start - 1 for start in starts[1:]] + [None]
+    return list(zip(starts, lasts))
+
+
+def openpose_command(
+    openpose_dir, input_video, path_to_json, openpose_args=None, frames=None
+):
+    """Builds the shell command to run openpose over a video.
+
+    Parameters
+    ----------
+    openpose_dir : str
+        Path to the directory in which openpose is installed
+    input_video : str
+        Path to the video
+    path_to_json : str
+        Directory to write the openpose json files to
+    openpose_args : str
+        Additional arguments to pass to openpose
+    frames : (int, int)
+        First and last frame to process, as returned by get_segments.
+        Defaults to None, i.e. the whole video.
+
+    Returns
+    -------
+    str
+        Command to run
+
+    """
+    cmd = (
+        f"cd {openpose_dir} && "
+        "./build/examples/openpose/openpose.bin "
+        f"--video {input_video} "
+        f"--write_json {path_to_json} --display 0 --render-pose 0"
+    )
+    if frames is not None:
+        first, last = frames
+        cmd = f"{cmd} --frame_first {first}"
+        if last is not None:
+            cmd = f"{cmd} --frame_last {last}"
+    if openpose_args:
+        cmd = f"{cmd} {openpose_args}"
+    return cmd
+
+
+def run_openpose_segments(
+    openpose_dir, input_video, path_to_json, openpose_args=None, n_segments=2
+):
+    """Runs openpose over a video as several processes at once, each over
+    its own segment of the video (using --frame_first and --frame_last) and
+    writing to its own directory, then merges their json files into
+    path_to_json as if openpose had been run over the whole video.
+
+    Parameters
+    ----------
+    openpose_dir : str
+        Path to the directory in which openpose is installed
+    input_video : str
+        Path to the video
+    path_to_json : str
+        Directory to write the merged openpose json files to
+    openpose_args : str
+        Additional arguments to pass to each openpose process
+    n_segments : int
+        Number of segments, i.e. openpose processes, to run
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    RuntimeError
+        If any of the openpose processes fails
+
+    """
+    cap = cv2.VideoCapture(input_video)
+    n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    segments = get_segments(n_frames, n_segments)
+    segments_dir = f"{path_to_json}_segments"
+    segment_dirs = [
+        os.path.join(segments_dir, f"{i:03d}") for i in range(len(segments))
+    ]
+
+    processes = [
+        subprocess.Popen(
+            openpose_command(
+                openpose_dir, input_video, segment_dir, openpose_args, frames
+            ),
+            shell=True,
+        )
+        for segment_dir, frames in zip(segment_dirs, segments)
+    ]
+    failed = [
+        frames
+        for process, frames in zip(processes, segments)
+        if process.wait()
+    ]
+    if failed:
+        raise RuntimeError(f"openpose failed on frames {failed}")
+
+    # Check each segment (apart from the last, which runs to the end of the
+    # video) has the number of frames expected
+    for segment_dir, (first, last) in zip(segment_dirs, segments):
+        n_files = len(list_json_files(segment_dir))
+        if last is not None and n_files != last - first + 1:
+            print(
+                f"Warning: expected {last - first + 1} json files for frames "
+                f"{first} to {last}, but openpose wrote {n_files}."
+            )
+
+    name = os.path.splitext(os.path.basename(input_video))[0]
+    merge_json_segments(segment_dirs, path_to_json, name)
+    shutil.rmtree(segments_dir)
+
+
+def merge_json_segments(segment_dirs, path_to_json, name):
+    """Moves the json files written by openpose for consecutive segments of
+    a video into a single directory, numbering them by their frame in the
+    whole video, as openpose names them.
+
+    Parameters
+    ----------
+    segment_dirs : list of str
+        Directories of json files for each segment, in order
+    path_to_json : str
+        Directory to move the json files to
+    name : str
+        Name of the video, used to name the files
+        <name>_<frame>_keypoints.json
+
+    Returns
+    -------
+    int
+        Number of frames
+
+    """
+    os.makedirs(path_to_json, exist_ok=True)
+    frame = 0
+    for segment_dir in segment_dirs:
+        for json_file in list_json_files(segment_dir):
+            os.replace(
+                os.path.join(segment_dir, json_file),
+                os.path.join(
+                    path_to_json, f"{name}_{frame:012d}_keypoints.json"
+                ),
+            )
+            frame += 1
+    return frame
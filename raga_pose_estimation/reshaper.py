@@ -1,5 +1,10 @@
+import numpy as np
 import pandas as pd
 
+from .openpose_parts import OpenPoseParts
+
+VARIABLE_NAMES = ["x", "y", "c"]
+
 
 def reshape_dataframes(dataframes):
     """Combines the dataframes per frame into a dataframe per person
@@ -48,3 +53,60 @@ def reshape_dataframes(dataframes):
         all_person_dfs.append(all_dfs)
 
     return all_person_dfs
+
+
+def reshape_keypoints(keypoints, parts=None, variable_names=VARIABLE_NAMES):
+    """Creates a dataframe per person across all frames directly from an
+    array of keypoints, such as the array returned by
+    openpose_json_loader.load_keypoints. The returned dataframes are the same
+    as those returned by reshape_dataframes for the equivalent per frame
+    dataframes, without building them.
+
+    If the keypoints contain multiple people, call
+    keypoint_sorter.sort_keypoints_by_x_position before this method
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (frames, people, parts, values)
+    parts : array of OpenPoseParts
+        Parts held in keypoints, in order. Defaults to None, which means all
+        parts.
+    variable_names : list of str
+        Names of the values for each keypoint (default x, y, c)
+
+    Returns
+    -------
+    list of DataFrame
+        DataFrame for each person, with a row for each frame and columns for
+        each variable of each body part
+    """
+    part_names = [p.value for p in (parts if parts else OpenPoseParts)]
+
+    # reshape_dataframes orders the body parts by name; work out the
+    # permutation and the columns once for all people
+    part_order = np.argsort(part_names, kind="stable")
+    columns = pd.MultiIndex.from_product(
+        [[part_names[i] for i in part_order], variable_names],
+        names=["Body Part", "Variable"],
+    )
+
+    n_frames = keypoints.shape[0]
+    all_person_dfs = []
+    for i in range(keypoints.shape[1]):
+        # Take the parts in column order, giving a contiguous
+        # (frames, parts * values) array
+        values = keypoints[:, i, part_order].reshape(n_frames, -1)
+
+        # Like reshape_dataframes, leave out frames without any values for
+        # this person
+        found = ~np.isnan(values).all(axis=1)
+        index = np.flatnonzero(found)
+        if len(index) < n_frames:
+            values = values[found]
+
+        all_person_dfs.append(
+            pd.DataFrame(values, index=index, columns=columns, copy=False)
+        )
+
+    return all_person_dfs
@@ -1,8 +1,12 @@
 import pandas as pd
 
+from . import reshaper
+
 # Jin modification
 # add one dimension: (x, y, c) -> (x, y, z, c)
 
+VARIABLE_NAMES = ["x", "y", "z", "c"]
+
 
 def reshape_dataframes(dataframes):
     """Combines the dataframes per frame into a dataframe per person
@@ -52,3 +56,19 @@ def reshape_dataframes(dataframes):
         all_person_dfs.append(all_dfs)
 
     return all_person_dfs
+
+
+def reshape_keypoints(keypoints, parts=None):
+    """Creates a dataframe per person across all frames directly from an
+    array of keypoints, as reshaper.reshape_keypoints but with columns for
+    x, y, z, c for each body part.
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (frames, people, parts, 4)
+    parts : array of OpenPoseParts
+        Parts held in keypoints, in order. Defaults to None, which means all
+        parts.
+    """
+    return reshaper.reshape_keypoints(keypoints, parts, VARIABLE_NAMES)
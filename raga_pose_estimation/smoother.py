@@ -46,21 +46,118 @@ class Smoother:
         """
         smoothed_dfs = []
         for person_df in person_dfs:
-            # Create copy so we don't modify original
-            smoothed_df = person_df.copy()
-            # Split into parts so we can split into chunks where each part
-            # appears/disappears, and smooth over each chunk separately
-            for part in smoothed_df.columns.levels[0]:
-                part_df = smoothed_df[part]
-                nan_indices = np.where(part_df["x"].isna())[0]
-                smoothed_df[part] = part_df.apply(
-                    lambda x: self._chunk_and_smooth_col(x, nan_indices)
+            # Work on a copy of the values so we don't modify the original
+            values = person_df.to_numpy(dtype=float, copy=True)
+
+            # Smooth the x, y, c columns of each part together, in chunks
+            # between the frames where the part disappears
+            for part in person_df.columns.unique(level=0):
+                part_columns = person_df.columns.get_locs([part])
+                values[:, part_columns] = self._smooth_part(
+                    values[:, part_columns]
                 )
 
-            smoothed_dfs.append(smoothed_df)
+            smoothed_dfs.append(
+                pd.DataFrame(
+                    values, index=person_df.index, columns=person_df.columns
+                )
+            )
 
         return smoothed_dfs
 
+    def _smooth_part(self, part_values):
+        """Smooth the columns of a single part, splitting them into runs of
+        frames where the part was found (i.e. x is not NaN). Gives the same
+        results as calling _chunk_and_smooth_col on each column (up to
+        rounding), but filters all the columns and runs together.
+
+        Parameters
+        ----------
+        part_values: np.array
+            Array of shape (frames, variables), with x as the first variable
+
+        Returns
+        -------
+        np.array
+            Smoothed array of the same shape
+        """
+        found = ~np.isnan(part_values[:, 0])
+
+        # The runs are found from x alone, so if another variable has NaNs
+        # elsewhere fall back to smoothing the columns one by one
+        if (np.isnan(part_values).any(axis=1) != ~found).any():
+            nan_indices = np.where(~found)[0]
+            return np.column_stack(
+                [
+                    self._chunk_and_smooth_col(pd.Series(col), nan_indices)
+                    for col in part_values.T
+                ]
+            )
+
+        # Run-length encode the frames where the part was found
+        edges = np.diff(np.concatenate(([0], found.view(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        lengths = np.flatnonzero(edges == -1) - starts
+
+        smoothed_values = part_values.copy()
+        window = self.smoothing_window
+        half_window = window // 2
+
+        # Runs at least as long as the window are all smoothed with the full
+        # window. Away from the ends of a run the filter only uses values in
+        # the run, so filter the whole part at once and keep those values.
+        long_runs = lengths >= window
+        if long_runs.any():
+            filtered_values = signal.savgol_filter(
+                np.where(found[:, np.newaxis], part_values, 0),
+                window,
+                self.polyorder,
+                axis=0,
+                mode="constant",
+            )
+            middle_starts = starts[long_runs] + half_window
+            middle_stops = middle_starts + lengths[long_runs] - 2 * half_window
+            run_middles = np.zeros(len(found) + 1, dtype=int)
+            run_middles[middle_starts] += 1
+            run_middles[middle_stops] -= 1
+            run_middles = np.cumsum(run_middles[:-1]) > 0
+            smoothed_values[run_middles] = filtered_values[run_middles]
+
+            # The ends of each run are fitted to the first and last window
+            # of the run, so filter those windows together
+            if half_window:
+                first_windows = starts[long_runs, np.newaxis] + np.arange(
+                    window
+                )
+                last_windows = (
+                    first_windows + lengths[long_runs, np.newaxis] - window
+                )
+                fitted_values = signal.savgol_filter(
+                    part_values[np.concatenate([first_windows, last_windows])],
+                    window,
+                    self.polyorder,
+                    axis=1,
+                )
+                n_runs = len(first_windows)
+                smoothed_values[first_windows[:, :half_window]] = (
+                    fitted_values[:n_runs, :half_window]
+                )
+                smoothed_values[last_windows[:, -half_window:]] = (
+                    fitted_values[n_runs:, -half_window:]
+                )
+
+        # Shorter runs are smoothed with a smaller window rather than not at
+        # all, so filter the runs of each length together
+        short_lengths = lengths[(lengths > self.polyorder) & ~long_runs]
+        for length in np.unique(short_lengths):
+            short_window = length - 1 if length % 2 == 0 else length
+            indices = starts[lengths == length, np.newaxis] + np.arange(length)
+            smoothed_values[indices] = signal.savgol_filter(
+                part_values[indices], short_window, self.polyorder, axis=1
+            )
+
+        return smoothed_values
+
     def _chunk_and_smooth_col(self, col, nan_indices):
         smoothed_arrays = []
 
@@ -94,3 +191,180 @@ class Smoother:
             return signal.savgol_filter(
                 col, self.smoothing_window, self.polyorder
             )
+
+
+class StreamingSmoother:
+    """Smoother for keypoints which arrive a frame at a time, e.g. from a
+    live performance. Gives the same results as Smoother (up to rounding)
+    but only keeps the last 2 * smoothing_window - 1 frames in memory.
+
+    Each smoothed frame is returned smoothing_window - 1 frames after it is
+    pushed (see latency), which is as long as it takes to know how the
+    part's current run of frames starts and ends.
+
+    Parameters
+    ----------
+    smoothing window: int
+        length of smoothing window, has to be odd (see Smoother)
+
+    polyorder: int
+       order of the polynomial used in fitting function, has to be smaller
+       than the smoothing window (see Smoother)
+
+    Attributes
+    ----------
+    smoothing window: int
+        length of smoothing window
+
+    polyorder: int
+       order of the polynomial used in smoothing function
+
+    latency: int
+        number of frames between pushing a frame and it being returned
+
+    """
+
+    def __init__(self, smoothing_window, polyorder):
+        if smoothing_window % 2 == 0:
+            raise ValueError("smoothing_window must be odd.")
+        if polyorder >= smoothing_window:
+            raise ValueError("polyorder must be less than smoothing_window.")
+
+        self.smoothing_window = smoothing_window
+        self.polyorder = polyorder
+        self.latency = smoothing_window - 1
+
+        # Coefficients to evaluate the polynomial fitted to a window of
+        # each length at each position, padded with zeros to the full window
+        self._coeffs = np.zeros(
+            (smoothing_window + 1, smoothing_window, smoothing_window)
+        )
+        for window in range(polyorder + 1, smoothing_window + 1):
+            for pos in range(window):
+                self._coeffs[window, pos, :window] = signal.savgol_coeffs(
+                    window, polyorder, pos=pos, use="dot"
+                )
+
+        self.reset()
+
+    def reset(self):
+        """Forget all the frames pushed so far, ready for a new recording."""
+        self._buffer = None
+        self._frame_shape = None
+        self._pushed = 0
+
+    def push(self, frames):
+        """Add frames to the smoother and get any frames which are ready.
+
+        Parameters
+        ----------
+        frames: np.array
+            Array of shape (frames, ..., variables), e.g. (frames, parts, 3)
+            or (frames, people, parts, 3), with x as the first variable and
+            NaN where a part wasn't found
+
+        Returns
+        -------
+        np.array
+            Smoothed frames, of the same shape as frames but with fewer or
+            more frames. The first frame returned is the first frame pushed,
+            and the frame pushed latency frames earlier is returned last.
+        """
+        frames = np.asarray(frames, dtype=float)
+        if self._buffer is None:
+            self._frame_shape = frames.shape[1:]
+            size = 2 * self.smoothing_window - 1
+            n_keypoints = int(np.prod(self._frame_shape[:-1]))
+            # Frames before the start of the recording count as not found
+            self._buffer = np.full(
+                (size, n_keypoints, self._frame_shape[-1]), np.nan
+            )
+
+        smoothed_frames = []
+        for frame in frames.reshape(len(frames), *self._buffer.shape[1:]):
+            self._buffer[self._pushed % len(self._buffer)] = frame
+            self._pushed += 1
+            if self._pushed > self.latency:
+                smoothed_frames.append(self._smooth_frame())
+
+        return self._stack(smoothed_frames)
+
+    def flush(self):
+        """Get the remaining frames at the end of the recording, and reset
+        the smoother.
+
+        Returns
+        -------
+        np.array
+            Smoothed frames, as returned by push
+        """
+        smoothed_frames = []
+        if self._buffer is not None:
+            # Frames after the end of the recording count as not found
+            for i in range(self.latency):
+                self._buffer[self._pushed % len(self._buffer)] = np.nan
+                self._pushed += 1
+                if self._pushed > self.latency:
+                    smoothed_frames.append(self._smooth_frame())
+
+        smoothed_frames = self._stack(smoothed_frames)
+        self.reset()
+        return smoothed_frames
+
+    def _stack(self, smoothed_frames):
+        if self._frame_shape is None:
+            return np.empty((0,))
+        return np.array(smoothed_frames).reshape(-1, *self._frame_shape)
+
+    def _smooth_frame(self):
+        """Smooth the frame latency frames before the last one pushed, using
+        the latency frames either side of it in the buffer."""
+        size = len(self._buffer)
+        centre = self.latency
+
+        # Buffer in frame order, with the frame to smooth at the centre
+        view = self._buffer[(self._pushed + np.arange(size)) % size]
+        found = ~np.isnan(view[:, :, 0])
+        positions = np.arange(size)[:, np.newaxis]
+
+        # Start and end of the run of frames containing the centre frame,
+        # within the view. If the run goes beyond the view it is at least a
+        # window long, so its true start and end don't matter.
+        start = np.where(~found[:centre], positions[:centre], -1).max(0) + 1
+        end = np.where(
+            ~found[centre + 1 :], positions[centre + 1 :], size
+        ).min(0)
+        length = end - start
+
+        # Use a smaller window if the run is smaller than the window, as
+        # Smoother does
+        window = np.minimum(length, self.smoothing_window)
+        window -= 1 - window % 2
+        half_window = window // 2
+        smoothable = found[centre] & (length > self.polyorder)
+        if (smoothable & (window <= self.polyorder)).any():
+            raise ValueError("polyorder must be less than window_length.")
+
+        # Fit the window at the start or end of the run, or else the window
+        # centred on this frame
+        fit_start = np.where(
+            centre - start < half_window,
+            start,
+            np.where(
+                end - centre <= half_window,
+                end - window,
+                centre - half_window,
+            ),
+        )
+        coeffs = self._coeffs[window, centre - fit_start]
+        fit_values = np.nan_to_num(
+            view[
+                fit_start[:, np.newaxis] + np.arange(self.smoothing_window),
+                np.arange(view.shape[1])[:, np.newaxis],
+            ]
+        )
+        smoothed = np.einsum("kw,kwv->kv", coeffs, fit_values)
+
+        # Leave frames which can't be smoothed as they are
+        smoothed[~smoothable] = view[centre][~smoothable]
+        return smoothed
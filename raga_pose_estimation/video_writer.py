@@ -0,0 +1,150 @@
+import shutil
+import subprocess
+
+import numpy as np
+
+
+def ffmpeg_available(ffmpeg_path="ffmpeg"):
+    """Checks whether the ffmpeg executable can be found.
+
+    Parameters
+    ----------
+    ffmpeg_path : str
+        Name or path of the ffmpeg executable
+
+    Returns
+    -------
+    bool
+        True if ffmpeg can be run
+
+    """
+    return shutil.which(ffmpeg_path) is not None
+
+
+class FFmpegVideoWriter:
+    """Writes frames to a video by piping them to an ffmpeg process, with the
+    same write/release interface as cv2.VideoWriter.
+
+    The frames are encoded with libx264 (so the video plays in browsers and
+    most players), and if audio_source is given its audio track is copied
+    into the same file by the same ffmpeg process, so no temporary audio file
+    or second pass is needed.
+
+    Parameters
+    ----------
+    filename : str
+        Path of the video to write
+    fps : float
+        Frame rate of the video
+    size : (int, int)
+        Width and height of the frames
+    audio_source : str
+        Path to a video (or audio file) whose first audio track should be
+        added to the video. Defaults to None, i.e. no audio. If the file has
+        no audio track the video is written without audio.
+    audio_start : float
+        Time in seconds in audio_source at which to start the audio, e.g.
+        for a video of part of audio_source (default 0)
+    audio_duration : float
+        Length in seconds of the audio to add. Defaults to None, i.e. the
+        rest of audio_source.
+    ffmpeg_path : str
+        Name or path of the ffmpeg executable
+
+    """
+
+    def __init__(
+        self,
+        filename,
+        fps,
+        size,
+        audio_source=None,
+        ffmpeg_path="ffmpeg",
+        audio_start=0,
+        audio_duration=None,
+    ):
+        self.filename = filename
+        self.size = tuple(size)
+        width, height = self.size
+
+        command = [
+            ffmpeg_path,
+            "-y",
+            "-loglevel",
+            "error",
+            "-f",
+            "rawvideo",
+            "-pix_fmt",
+            "bgr24",
+            "-s",
+            f"{width}x{height}",
+            "-r",
+            str(fps),
+            "-i",
+            "-",
+        ]
+        if audio_source:
+            if audio_start:
+                command += ["-ss", str(audio_start)]
+            if audio_duration is not None:
+                command += ["-t", str(audio_duration)]
+            command += ["-i", audio_source]
+        command += ["-map", "0:v"]
+        if audio_source:
+            command += ["-map", "1:a:0?", "-c:a", "aac"]
+        if width % 2 or height % 2:
+            # yuv420p needs an even width and height
+            command += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2"]
+        command += ["-c:v", "libx264", "-pix_fmt", "yuv420p", filename]
+
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    def write(self, img):
+        """Writes a frame to the video.
+
+        Parameters
+        ----------
+        img : np.array
+            Image in OpenCV format (BGR), of the size given to the writer
+
+        Returns
+        -------
+        None
+
+        """
+        if img.shape != (self.size[1], self.size[0], 3):
+            raise ValueError(
+                f"Frame of shape {img.shape} doesn't match the video size "
+                f"{self.size[0]}x{self.size[1]}"
+            )
+
+        try:
+            self._process.stdin.write(
+                np.ascontiguousarray(img, dtype=np.uint8).data
+            )
+        except BrokenPipeError:
+            raise RuntimeError(
+                f"ffmpeg exited with code {self._process.wait()} while "
+                f"writing {self.filename}"
+            )
+
+    def release(self):
+        """Finishes writing the video and waits for ffmpeg to exit.
+
+        Returns
+        -------
+        None
+
+        """
+        if self._process.stdin.closed:
+            return
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = self._process.wait()
+        if returncode:
+            raise RuntimeError(
+                f"ffmpeg exited with code {returncode} while writing "
+                f"{self.filename}"
+            )
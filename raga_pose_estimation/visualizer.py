@@ -1,7 +1,11 @@
 import os
+import queue
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from .frame_pipeline import run_frame_pipeline
 from .openpose_parts import OpenPoseParts
+from .video_writer import FFmpegVideoWriter
 
 def what_fps(input_video_path):
     cap = cv2.VideoCapture(input_video_path)
@@ -93,20 +97,11 @@ class Visualizer:
         None
 
         """
-        for person_df in person_dfs:
-            row = person_df.iloc[frame_index]
-
-            for part in row.index.levels[0]:
-                if not np.isnan(row[part]).any():
-                    pos = (int(row[part]["x"]), int(row[part]["y"]))
-
-                    color = Visualizer.MID_COLOR
-                    if part.startswith("R"):
-                        color = Visualizer.R_COLOR
-                    elif part.startswith("L"):
-                        color = Visualizer.L_COLOR
-
-                    img = cv2.circle(img, pos, 3, color, -1)
+        frame_dfs = [
+            person_df.iloc[frame_index : frame_index + 1]
+            for person_df in person_dfs
+        ]
+        SkeletonArrays(frame_dfs).draw_points(img, 0)
 
     def draw_lines(self, img, person_dfs, frame_index, paths):
         """Draws lines joining body parts on to the given image arrays.
@@ -131,26 +126,11 @@ class Visualizer:
         None
 
         """
-        for person_df in person_dfs:
-            row = person_df.iloc[frame_index]
-            for line in paths:
-                pts = np.zeros(shape=(len(line), 2), dtype=np.int32)
-                count = 0
-
-                for part in line:
-                    if part.value in row.index.levels[0]:
-                        if not np.isnan(row[part.value]).any():
-                            pt = np.int32(row[part.value].values)
-                            pts[count] = pt[:2]
-                            count += 1
-
-                # Filter out zero points, then reshape before drawing
-                pts = pts[pts > 0]
-                pts = pts.reshape((-1, 1, 2))
-
-                cv2.polylines(
-                    img, [pts], False, Visualizer.LINE_COLOR, thickness=2,
-                )
+        frame_dfs = [
+            person_df.iloc[frame_index : frame_index + 1]
+            for person_df in person_dfs
+        ]
+        SkeletonArrays(frame_dfs, paths).draw_lines(img, 0)
 
     def get_paths_from_dataframe(person_df):
         paths = []
@@ -173,7 +153,10 @@ class Visualizer:
         height,
         input_video_path,
         create_overlay=False,
-        video_to_overlay=None
+        video_to_overlay=None,
+        encoder="opencv",
+        audio_source=None,
+        draw_threads=None,
     ):
         """Creates a video visualising the provided array of body keypoints.
         The lines to draw will be determined by the parts in the first
@@ -196,12 +179,110 @@ class Visualizer:
         video_to_overlay : str
             Path to video to overlay. Must be provided if create_overlay is
             True
+        encoder : str
+            "opencv" (default) to encode the video with cv2.VideoWriter, or
+            "ffmpeg" to pipe the frames to ffmpeg (see FFmpegVideoWriter)
+        audio_source : str
+            Path to a video whose audio to add to the video, in which case
+            the file is named <file_basename>_<blank|overlay>_with_sound.mp4.
+            Only supported by the ffmpeg encoder.
+        draw_threads : int
+            Number of threads drawing the frames while others decode and
+            encode them (see run_frame_pipeline). Defaults to None, i.e. the
+            number of CPUs.
 
         Returns
         -------
-        None
+        str
+            Path of the video created
+
+        """
+        return self.create_videos_from_dataframes(
+            file_basename,
+            person_dfs,
+            width,
+            height,
+            input_video_path,
+            create_blank=not create_overlay,
+            create_overlay=create_overlay,
+            video_to_overlay=video_to_overlay,
+            encoder=encoder,
+            audio_source=audio_source,
+            draw_threads=draw_threads,
+        )[0]
+
+    def create_videos_from_dataframes(
+        self,
+        file_basename,
+        person_dfs,
+        width,
+        height,
+        input_video_path,
+        create_blank=True,
+        create_overlay=False,
+        video_to_overlay=None,
+        encoder="opencv",
+        audio_source=None,
+        draw_threads=None,
+        scale=1,
+        every=1,
+        reuse_buffers=True,
+        crop_rectangle=None,
+        start_frame=0,
+    ):
+        """Creates the video on a blank background and/or the overlay video
+        in a single pass over the frames. When creating both, the keypoints
+        of each frame are drawn once and copied on to the blank background
+        and the frame of the overlaid video. Otherwise as
+        create_video_from_dataframes.
+
+        Parameters
+        ----------
+        create_blank : bool
+            Whether to create the visualisation on a blank background
+            (default True)
+        audio_source : str
+            Path to a video whose audio to add to the overlay video, or to
+            the video on a blank background if create_overlay is False.
+            Only supported by the ffmpeg encoder.
+        scale : float
+            Factor by which to scale the videos, e.g. 0.25 for a quick
+            preview at a quarter of the width and height. The frames of the
+            overlaid video are scaled down before drawing on them.
+        every : int
+            Only draw every nth frame, e.g. 10 for a quick preview. The frame
+            rate is reduced to match, so the videos have the same duration.
+        reuse_buffers : bool
+            Whether to reuse the frames of the video on a blank background
+            once they have been written, clearing only the area drawn on
+            (see CanvasPool), rather than allocating a new frame each time
+            (default True)
+        crop_rectangle : tuple of int
+            Rectangle (w, h, x, y) to crop from the frames of the overlaid
+            video before drawing on them, for keypoints which have been
+            cropped to the same rectangle (see crop_keypoints). Defaults to
+            None, i.e. no cropping.
+        start_frame : int
+            Frame of video_to_overlay (and of the audio_source) matching the
+            first row of the DataFrames, for DataFrames covering only part
+            of the video. The overlaid video is seeked to it rather than
+            decoded from the start. Defaults to 0.
+
+        See create_video_from_dataframes for the other parameters.
+
+        Returns
+        -------
+        list of str
+            Paths of the videos created, the video on a blank background
+            first
 
         """
+        if encoder not in ("opencv", "ffmpeg"):
+            raise ValueError(f"Unknown encoder {encoder}")
+
+        if audio_source and encoder != "ffmpeg":
+            raise ValueError("audio_source needs the ffmpeg encoder")
+
         cap = None
         if create_overlay:
             if not video_to_overlay:
@@ -214,38 +295,363 @@ class Visualizer:
                 raise ValueError("video_to_overlay is not a valid file")
 
             cap = cv2.VideoCapture(video_to_overlay)
+            if start_frame:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
 
         paths = Visualizer.get_paths_from_dataframe(person_dfs[0])
 
-        fourcc = cv2.VideoWriter_fourcc("m", "p", "4", "v")
-        name = "overlay" if create_overlay else "blank"
-        filename = os.path.join(
-            self.output_directory, "%s_%s.mp4" % (file_basename, name)
-        )
-
-        fps = what_fps(input_video_path)
+        # Work out what to draw for every frame up front, so drawing each
+        # frame only needs to slice arrays
+        person_dfs = [person_df.iloc[::every] for person_df in person_dfs]
+        skeletons = SkeletonArrays(person_dfs, paths, scale)
 
-        out = cv2.VideoWriter(filename, fourcc, fps, (width, height))
+        input_fps = what_fps(input_video_path)
+        fps = input_fps / every
+        width = max(1, int(round(width * scale)))
+        height = max(1, int(round(height * scale)))
 
-        # Draw the data from the DataFrame
-        for i in range(len(person_dfs[0].index)):
+        names = []
+        if create_blank:
+            names.append("blank")
+        if create_overlay:
+            names.append("overlay")
+
+        filenames = []
+        writers = []
+        for name in names:
+            # The audio goes in the last video, i.e. the overlay video if
+            # there is one
+            video_audio_source = None
+            if audio_source and name == names[-1]:
+                video_audio_source = audio_source
+                name += "_with_sound"
+            audio_kwargs = {}
+            if video_audio_source and start_frame:
+                audio_kwargs = dict(
+                    audio_start=start_frame / input_fps,
+                    audio_duration=len(person_dfs[0]) * every / input_fps,
+                )
+            filename = os.path.join(
+                self.output_directory, "%s_%s.mp4" % (file_basename, name)
+            )
+
+            if encoder == "ffmpeg":
+                out = FFmpegVideoWriter(
+                    filename,
+                    fps,
+                    (width, height),
+                    audio_source=video_audio_source,
+                    **audio_kwargs,
+                )
+            else:
+                fourcc = cv2.VideoWriter_fourcc("m", "p", "4", "v")
+                out = cv2.VideoWriter(filename, fourcc, fps, (width, height))
+
+            filenames.append(filename)
+            writers.append(out)
+
+        def read_frames():
+            for i in range(len(person_dfs[0].index)):
+                if create_overlay:
+                    # Skip the frames left out without decoding them
+                    for j in range(every - 1 if i else 0):
+                        cap.grab()
+                    ret, frame = cap.read()
+                    if not ret:
+                        raise ValueError(
+                            "Not enough frames in overlay video to "
+                            "match data frame"
+                        )
+                    yield frame
+                else:
+                    yield None
+
+        # Blank frames are reused once they have been written, and only the
+        # area drawn on is cleared, rather than allocating a new frame each
+        # time. The pool only grows to the number of frames in the pipeline.
+        canvases = CanvasPool((height, width, 3), 1)
+
+        def draw_frame(i, frame):
+            imgs = []
+            if create_blank:
+                imgs.append(canvases.get())
             if create_overlay:
-                ret, frame = cap.read()
-                if not ret:
-                    raise ValueError(
-                        "Not enough frames in overlay video to "
-                        "match data frame"
+                if crop_rectangle:
+                    w, h, x, y = crop_rectangle
+                    frame = np.ascontiguousarray(frame[y : y + h, x : x + w])
+                    if frame.shape[:2] != (h, w):
+                        raise ValueError(
+                            "crop_rectangle is outside video_to_overlay"
+                        )
+                if scale != 1:
+                    frame = cv2.resize(
+                        frame, (width, height), interpolation=cv2.INTER_AREA
                     )
-                img = frame
-            else:
-                img = np.ones((height, width, 3), np.uint8)
-
-            self.draw_lines(img, person_dfs, i, paths)
-            self.draw_points(img, person_dfs, i)
-
-            out.write(img)
+                imgs.append(frame)
+
+            # The keypoints are drawn on to each image from the same arrays,
+            # which is quicker than drawing them on to a separate layer and
+            # copying that on to each image
+            boxes = [
+                _union_boxes(
+                    skeletons.draw_lines(img, i),
+                    skeletons.draw_points(img, i),
+                )
+                for img in imgs
+            ]
+            return imgs, boxes[0]
+
+        # Draw the data from the DataFrame, decoding, drawing and encoding
+        # the frames in parallel, with each video encoded in its own thread
+        with ThreadPoolExecutor(len(writers)) as encoders:
+
+            def write_frames(drawn):
+                imgs, blank_box = drawn
+                for future in [
+                    encoders.submit(out.write, img)
+                    for out, img in zip(writers, imgs)
+                ]:
+                    future.result()
+                if create_blank and reuse_buffers:
+                    canvases.put(imgs[0], blank_box)
+
+            run_frame_pipeline(
+                read_frames(), draw_frame, write_frames, draw_threads
+            )
 
         if create_overlay:
             cap.release()
 
-        out.release()
+        for out in writers:
+            out.release()
+
+        return filenames
+
+
+class SkeletonArrays:
+    """Positions of the keypoints of each person in each frame, as arrays
+    ready for drawing with OpenCV, so drawing a frame doesn't need to index
+    the DataFrames.
+
+    Parameters
+    ----------
+    person_dfs : list of DataFrame
+        DataFrames as created by reshape_dataframes, all with the same parts
+        and number of frames
+    paths : array of arrays of OpenPoseParts
+        Paths of lines to draw, as for Visualizer.draw_lines. Parts which
+        aren't in the DataFrames are left out. Defaults to None, i.e. no
+        lines.
+    scale : float
+        Factor by which to scale the positions, to draw on an image scaled
+        by the same factor. Defaults to 1.
+
+    Attributes
+    ----------
+    parts : list of str
+        Names of the parts, in the order they are drawn
+    points : np.array
+        Integer pixel positions of shape (frames, people, parts, 2)
+    valid : np.array
+        Boolean array of shape (frames, people, parts), False where a part
+        wasn't found (i.e. any of its values is NaN)
+    colors : list of tuple
+        Color of each part
+    path_indices : list of np.array
+        Indices into parts of each path
+
+    """
+
+    def __init__(self, person_dfs, paths=None, scale=1):
+        self.parts = list(
+            person_dfs[0].columns.remove_unused_levels().levels[0]
+        )
+
+        values = np.stack(
+            [
+                np.stack(
+                    [
+                        person_df[part].to_numpy(dtype=float)
+                        for part in self.parts
+                    ],
+                    axis=1,
+                )
+                for person_df in person_dfs
+            ],
+            axis=1,
+        )
+        self.valid = ~np.isnan(values).any(axis=3)
+        # Truncate the x, y positions to pixels, as int() does
+        self.points = np.where(
+            self.valid[..., np.newaxis], values[..., :2] * scale, 0
+        ).astype(np.int32)
+
+        self.colors = []
+        for part in self.parts:
+            color = Visualizer.MID_COLOR
+            if part.startswith("R"):
+                color = Visualizer.R_COLOR
+            elif part.startswith("L"):
+                color = Visualizer.L_COLOR
+            self.colors.append(color)
+
+        self.path_indices = [
+            np.array(
+                [
+                    self.parts.index(part.value)
+                    for part in path
+                    if part.value in self.parts
+                ],
+                dtype=int,
+            )
+            for path in paths or []
+        ]
+
+    def draw_points(self, img, frame_index):
+        """Draws the keypoints of a frame on to the given image.
+
+        Parameters
+        ----------
+        img : np.array
+            Image array in OpenCV format
+
+        frame_index: int
+            index of frame to draw
+
+        Returns
+        -------
+        tuple of int
+            Bounding box (x0, y0, x1, y1) of the area drawn on, or None if
+            nothing was drawn
+
+        """
+        for points, valid in zip(
+            self.points[frame_index], self.valid[frame_index]
+        ):
+            for i in np.flatnonzero(valid):
+                pos = tuple(points[i].tolist())
+                cv2.circle(img, pos, 3, self.colors[i], -1)
+
+        return _bounding_box(
+            self.points[frame_index][self.valid[frame_index]], 3, img.shape
+        )
+
+    def draw_lines(self, img, frame_index):
+        """Draws the lines joining the keypoints of a frame on to the given
+        image.
+
+        Parameters
+        ----------
+        img : np.array
+            Image array in OpenCV format
+
+        frame_index: int
+            index of frame to draw
+
+        Returns
+        -------
+        tuple of int
+            Bounding box (x0, y0, x1, y1) of the area drawn on, or None if
+            nothing was drawn
+
+        """
+        drawn_pts = [np.empty((0, 2), np.int32)]
+        for points, valid in zip(
+            self.points[frame_index], self.valid[frame_index]
+        ):
+            for indices in self.path_indices:
+                pts = points[indices[valid[indices]]]
+
+                # Filter out zero points (dropping the whole point, so a
+                # point on the edge of the image can't leave a lone
+                # coordinate), then reshape before drawing
+                pts = pts[(pts > 0).all(axis=1)]
+                pts = pts.reshape((-1, 1, 2))
+
+                cv2.polylines(
+                    img, [pts], False, Visualizer.LINE_COLOR, thickness=2,
+                )
+                drawn_pts.append(pts[:, 0])
+
+        return _bounding_box(np.concatenate(drawn_pts), 2, img.shape)
+
+
+class CanvasPool:
+    """Pool of blank images, which can be drawn on, written to a video and
+    then returned to the pool to be reused. Only the area drawn on is
+    cleared when an image is reused, rather than allocating and filling a
+    whole new image for each frame. Safe to use from several threads.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the images, e.g. (height, width, 3)
+    value : int
+        Value of each pixel of a blank image
+
+    """
+
+    def __init__(self, shape, value=0):
+        self.shape = shape
+        self.value = value
+        self._free = queue.SimpleQueue()
+
+    def get(self):
+        """Gets a blank image from the pool, or a new one if none are free.
+
+        Returns
+        -------
+        np.array
+            Blank image
+        """
+        try:
+            img, box = self._free.get_nowait()
+        except queue.Empty:
+            return np.full(self.shape, self.value, np.uint8)
+
+        if box:
+            x0, y0, x1, y1 = box
+            img[y0:y1, x0:x1] = self.value
+        return img
+
+    def put(self, img, box):
+        """Returns an image to the pool once it is no longer needed.
+
+        Parameters
+        ----------
+        img : np.array
+            Image from get
+        box : tuple of int
+            Bounding box (x0, y0, x1, y1) of the area drawn on since the
+            image was got, or None if it wasn't drawn on
+
+        Returns
+        -------
+        None
+        """
+        self._free.put((img, box))
+
+
+def _bounding_box(pts, margin, shape):
+    """Bounding box (x0, y0, x1, y1) of an array of (x, y) points, expanded
+    by margin and clipped to an image of the given shape. x1 and y1 are
+    exclusive, so the box is img[y0:y1, x0:x1]. Returns None if there are no
+    points or the box is outside the image."""
+    if len(pts) == 0:
+        return None
+    x0, y0 = np.maximum(pts.min(axis=0) - margin, 0).tolist()
+    x1, y1 = np.minimum(
+        pts.max(axis=0) + margin + 1, [shape[1], shape[0]]
+    ).tolist()
+    if x0 >= x1 or y0 >= y1:
+        return None
+    return (x0, y0, x1, y1)
+
+
+def _union_boxes(*boxes):
+    """Smallest box containing all the given boxes (ignoring None)."""
+    boxes = [box for box in boxes if box]
+    if not boxes:
+        return None
+    x0s, y0s, x1s, y1s = zip(*boxes)
+    return (min(x0s), min(y0s), max(x1s), max(y1s))
@@ -2,6 +2,7 @@ import os
 import cv2
 import numpy as np
 from .openpose_parts import OpenPoseParts
+from .visualizer import CanvasPool, _bounding_box, _union_boxes
 
 
 ### could add signal light when creating the video ####
@@ -88,9 +89,12 @@ class Visualizer:
 
         Returns
         -------
-        None
+        tuple of int
+            Bounding box (x0, y0, x1, y1) of the area drawn on, or None if
+            nothing was drawn
 
         """
+        drawn_pts = [np.empty((0, 2), np.int32)]
         for person_df in person_dfs:
             row = person_df.iloc[frame_index]
 
@@ -105,6 +109,9 @@ class Visualizer:
                         color = Visualizer.L_COLOR
 
                     img = cv2.circle(img, pos, 5, color, -1)
+                    drawn_pts.append(np.array([pos]))
+
+        return _bounding_box(np.concatenate(drawn_pts), 5, img.shape)
 
     def draw_lines(self, img, person_dfs, frame_index, paths):
         """Draws lines joining body parts on to the given image arrays.
@@ -126,9 +133,12 @@ class Visualizer:
 
         Returns
         -------
-        None
+        tuple of int
+            Bounding box (x0, y0, x1, y1) of the area drawn on, or None if
+            nothing was drawn
 
         """
+        drawn_pts = [np.empty((0, 2), np.int32)]
         for person_df in person_dfs:
             row = person_df.iloc[frame_index]
             for line in paths:
@@ -151,6 +161,9 @@ class Visualizer:
                 cv2.polylines(
                     img, [pts], False, Visualizer.LINE_COLOR, thickness=4,
                 )
+                drawn_pts.append(pts[:, 0])
+
+        return _bounding_box(np.concatenate(drawn_pts), 3, img.shape)
 
     def get_paths_from_dataframe(person_df):
         paths = []
@@ -177,6 +190,7 @@ class Visualizer:
         video_to_overlay=None,
         intervals=None,
         accumulate=False,
+        reuse_buffers=True,
     ):
         """Creates a video visualising the provided array of body keypoints.
         The lines to draw will be determined by the parts in the first
@@ -208,6 +222,11 @@ class Visualizer:
         accumulate: bool
             If true, retain the previous skeletons
             (default False)
+        reuse_buffers: bool
+            If true, draw each frame on the background of the last one,
+            clearing only the area drawn on (see CanvasPool), rather than on
+            a new frame
+            (default True)
 
 
         Returns
@@ -246,6 +265,8 @@ class Visualizer:
         if (not create_overlay) and accumulate:
             img_acc = np.zeros((height, width, 3), np.uint8)
 
+        canvases = CanvasPool((height, width, 3))
+
         for i in range(len(person_dfs[0].index)):
             # if i > 10000:
             #     continue
@@ -262,26 +283,42 @@ class Visualizer:
 
                 img = frame
             else:
-                img = np.zeros((height, width, 3), np.uint8)
+                img = canvases.get()
 
             if (not create_overlay) and accumulate:
-                self.draw_points(img, person_dfs, i)
-                img_acc = cv2.add(img_acc, img)
+                box = self.draw_points(img, person_dfs, i)
+                # The rest of img is blank, so only the area drawn on
+                # needs adding
+                if reuse_buffers and box:
+                    x0, y0, x1, y1 = box
+                    img_acc[y0:y1, x0:x1] = cv2.add(
+                        img_acc[y0:y1, x0:x1], img[y0:y1, x0:x1]
+                    )
+                elif not reuse_buffers:
+                    img_acc = cv2.add(img_acc, img)
             else:
-                self.draw_points(img, person_dfs, i)
-                self.draw_lines(img, person_dfs, i, paths)
+                box = _union_boxes(
+                    self.draw_points(img, person_dfs, i),
+                    self.draw_lines(img, person_dfs, i, paths),
+                )
 
             if intervals is not None:
                 if i in rest_list:
                     cv2.circle(img, (50, 50), 15, (0, 0, 255), -1)
                 else:
                     cv2.circle(img, (50, 50), 15, (0, 255, 0), -1)
+                box = _union_boxes(
+                    box, _bounding_box(np.array([[50, 50]]), 15, img.shape)
+                )
 
             if (not create_overlay) and accumulate:
                 out.write(img_acc)
             else:
                 out.write(img)
 
+            if (not create_overlay) and reuse_buffers:
+                canvases.put(img, box)
+
         if create_overlay:
             cap.release()
 
@@ -1,20 +1,54 @@
 import os
 import glob
+import importlib.util
+import shutil
+import subprocess
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from collections import deque
+from functools import partial
 import click
 import cv2
+import numpy as np
+import pandas as pd
 from sys import exit
 
-from raga_pose_estimation.csv_writer import write_csv
-from raga_pose_estimation.openpose_json_parser import OpenPoseJsonParser
+from raga_pose_estimation.json_follower import follow_json_files
+from raga_pose_estimation.batch_manifest import (
+    is_up_to_date,
+    list_outputs,
+    load_manifest,
+    save_manifest,
+    trial_fingerprint,
+)
+from raga_pose_estimation.csv_writer import OUTPUT_FORMATS, write_csv
+from raga_pose_estimation.keypoint_store import is_keypoint_store
+from raga_pose_estimation.openpose_json_loader import (
+    crop_keypoints,
+    get_cache_path,
+    is_archive,
+    list_json_files,
+    load_keypoints,
+)
+from raga_pose_estimation.openpose_segments import (
+    openpose_command,
+    run_openpose_segments,
+)
+from raga_pose_estimation.openpose_json_parser import (
+    apply_confidence_threshold,
+)
 from raga_pose_estimation.openpose_parts import (
     OpenPosePartGroups,
     OpenPoseParts,
 )
-from raga_pose_estimation.reshaper import reshape_dataframes
-from raga_pose_estimation.smoother import Smoother
+from raga_pose_estimation.reshaper import reshape_keypoints
+from raga_pose_estimation.smoother import Smoother, StreamingSmoother
 from raga_pose_estimation.video_utils import crop_video
-from raga_pose_estimation.visualizer import Visualizer
-from raga_pose_estimation.audio_combiner import Audio
+from raga_pose_estimation.visualizer import Visualizer, what_fps
+from raga_pose_estimation.audio_combiner import Audio, has_audio
+from raga_pose_estimation.video_writer import ffmpeg_available
 
 
 @click.command()
@@ -28,7 +62,9 @@ from raga_pose_estimation.audio_combiner import Audio
     "-j",
     "--input-json",
     default=None,
-    help="Path to a directory of previously generated openpose json files",
+    help="Path to a directory of previously generated openpose json files, "
+    "a .tar, .tar.gz or .zip archive of them, or a keypoint store packed "
+    "from them with pack_keypoints.py",
 )
 @click.option(
     "-bf",
@@ -54,6 +90,15 @@ from raga_pose_estimation.audio_combiner import Audio
     "rectangle and (x,y) is the top-left of the rectangle, as measured in "
     "pixels from the top-left corner.",
 )
+@click.option(
+    "--crop-mode",
+    default="video",
+    type=click.Choice(["video", "keypoints"]),
+    help="How to crop to --crop-rectangle. video crops the video with "
+    "ffmpeg before running openpose. keypoints runs openpose on the whole "
+    "video and crops the keypoints (and the overlay video's frames) "
+    "instead, without writing a cropped video.",
+)
 @click.option(
     "-n",
     "--number-of-people",
@@ -72,6 +117,58 @@ from raga_pose_estimation.audio_combiner import Audio
     "https://github.com/CMU-Perceptual-Computing-Lab/openpose/blob/master/include/openpose/flags.hpp"
     " for a full list of options.",
 )
+@click.option(
+    "--openpose-segments",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Split the video into this many segments and run an openpose "
+    "process on each at once, merging their json files afterwards. Use "
+    "--openpose-args to spread them over several GPUs if available.",
+)
+@click.option(
+    "--follow",
+    is_flag=True,
+    default=False,
+    help="Post-process the json files while openpose is writing them, "
+    "appending each frame to the CSV files as soon as it is ready. With "
+    "--input-json, follows a directory another openpose process is "
+    "writing to.",
+)
+@click.option(
+    "--follow-timeout",
+    default=10.0,
+    type=click.FloatRange(min=0),
+    help="With --follow and --input-json, stop once no new json files have "
+    "been written for this many seconds.",
+)
+@click.option(
+    "--start-frame",
+    type=click.IntRange(min=0),
+    help="First frame to process. Only the json files for the frames from "
+    "--start-frame to --end-frame (and the frames either side needed to "
+    "process them as for the whole video) are read, and only those frames "
+    "are written to the CSVs and videos.",
+)
+@click.option(
+    "--end-frame",
+    type=click.IntRange(min=1),
+    help="Frame to stop processing at (not included). Defaults to the end "
+    "of the video.",
+)
+@click.option(
+    "--start",
+    "start_time",
+    type=click.FloatRange(min=0),
+    help="Time in seconds to start processing at, as for --start-frame "
+    "using the frame rate of the input video.",
+)
+@click.option(
+    "--end",
+    "end_time",
+    type=click.FloatRange(min=0),
+    help="Time in seconds to stop processing at, as for --end-frame "
+    "using the frame rate of the input video.",
+)
 @click.option(
     "-m",
     "--create-model-video",
@@ -104,17 +201,21 @@ from raga_pose_estimation.audio_combiner import Audio
 @click.option(
     "-c",
     "--confidence-threshold",
-    default=0.0,
+    default=[0.0],
+    type=float,
+    multiple=True,
     help="Confidence threshold. Items with a confidence lower than "
-    "the threshold will be replaced by values from a previous frame.",
+    "the threshold will be replaced by values from a previous frame. "
+    "Give more than once to sweep over several values (see README).",
 )
 @click.option(
     "-s",
     "--smoothing-parameters",
-    default=(None, None),
+    default=[],
     type=(int, int),
+    multiple=True,
     help="Window and polynomial order for smoother. See README for "
-    "details.",
+    "details. Give more than once to sweep over several values.",
 )
 @click.option(
     "-b",
@@ -163,15 +264,93 @@ from raga_pose_estimation.audio_combiner import Audio
     help="Performer's names from left to right",
     multiple=True
 )
+@click.option(
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of processes to use to parse the openpose json files.",
+)
+@click.option(
+    "--cache",
+    is_flag=True,
+    default=False,
+    help="Cache the keypoints parsed from the openpose json files, so "
+    "later runs on the same files don't need to parse them again.",
+)
+@click.option(
+    "--cache-dir",
+    default=None,
+    help="Directory in which to cache parsed keypoints (implies --cache). "
+    "Defaults to the directory containing the openpose json files.",
+)
+@click.option(
+    "--batch-jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Number of trials in --batch-folder, or combinations of parameters "
+    "in a sweep, to process at once. With more than one, the output of each "
+    "trial in a batch is written to a log file.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="When processing --batch-folder, skip trials which the batch "
+    "manifest shows are up to date, and reprocess those whose inputs or "
+    "parameters have changed or which failed.",
+)
+@click.option(
+    "--output-format",
+    default="csv",
+    type=click.Choice(list(OUTPUT_FORMATS)),
+    help="Format of the output files. parquet and feather need pyarrow, "
+    "and hdf5 needs tables (see README).",
+)
+@click.option(
+    "--compression",
+    default=None,
+    help="Compression for the output files, e.g. gzip for csv or zstd for "
+    "parquet and feather. Defaults to the format's default.",
+)
+@click.option(
+    "--encoder",
+    default="opencv",
+    type=click.Choice(["opencv", "ffmpeg"]),
+    help="How to encode the model and overlay videos. ffmpeg pipes the "
+    "frames to ffmpeg, which also adds the audio to the overlay video in "
+    "the same pass.",
+)
+@click.option(
+    "--preview-scale",
+    default=1.0,
+    type=click.FloatRange(min=0, max=1, min_open=True),
+    help="Scale the model and overlay videos by this factor, e.g. 0.25 for "
+    "a quick preview.",
+)
+@click.option(
+    "--preview-every",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Only draw every nth frame of the model and overlay videos, e.g. "
+    "10 for a quick preview.",
+)
 
 def openpose_cli(
     output_dir,
     openpose_dir,
     openpose_args,
+    openpose_segments,
+    follow,
+    follow_timeout,
+    start_frame,
+    end_frame,
+    start_time,
+    end_time,
     input_video,
     input_json,
     batch_folder,
     crop_rectangle,
+    crop_mode,
     number_of_people,
     create_model_video,
     create_overlay_video,
@@ -183,7 +362,17 @@ def openpose_cli(
     bodypartsgroup,
     flatten,
     trial_name,
-    performer_names
+    performer_names,
+    jobs,
+    cache,
+    cache_dir,
+    batch_jobs,
+    resume,
+    output_format,
+    compression,
+    encoder,
+    preview_scale,
+    preview_every,
 ):
     """Runs openpose on the video, does post-processing, and outputs CSV
     files. See cli docs for parameter details."""
@@ -201,8 +390,64 @@ def openpose_cli(
     elif bodypartsgroup == "lower":
         body_parts_list = OpenPosePartGroups.LOWER_BODY_PARTS
 
-    if smoothing_parameters == (None, None):
-        smoothing_parameters = None
+    # Several confidence thresholds or smoothing parameters mean a sweep over
+    # every combination of them
+    confidence_thresholds = list(confidence_threshold)
+    smoothing_parameters_list = list(smoothing_parameters) or [None]
+    if len(confidence_thresholds) * len(smoothing_parameters_list) > 1:
+        if input_json is None or batch_folder is not None:
+            click.echo(
+                "Sweeping over several confidence thresholds or smoothing "
+                "parameters needs --input-json (and not --batch-folder)."
+            )
+            exit(1)
+        if create_model_video or create_overlay_video or crop_rectangle:
+            click.echo(
+                "Videos can't be created or cropped when sweeping over "
+                "several confidence thresholds or smoothing parameters."
+            )
+            exit(1)
+        if follow:
+            click.echo(
+                "--follow can't be used when sweeping over several "
+                "confidence thresholds or smoothing parameters."
+            )
+            exit(1)
+        if any(
+            t is not None
+            for t in [start_frame, end_frame, start_time, end_time]
+        ):
+            click.echo(
+                "A range of frames can't be given when sweeping over several "
+                "confidence thresholds or smoothing parameters."
+            )
+            exit(1)
+
+        run_sweep(
+            output_dir,
+            input_json,
+            confidence_thresholds,
+            smoothing_parameters_list,
+            number_of_people,
+            body_parts_list,
+            flatten,
+            trial_name,
+            performer_names,
+            jobs,
+            cache,
+            cache_dir,
+            output_format,
+            compression,
+            batch_jobs,
+        )
+        return
+
+    confidence_threshold = confidence_thresholds[0]
+    smoothing_parameters = smoothing_parameters_list[0]
+
+    if follow and batch_folder is not None:
+        click.echo("--follow can't be used with --batch-folder.")
+        exit(1)
 
     if batch_folder != None:
         multiple_videos(output_dir,
@@ -219,7 +464,23 @@ def openpose_cli(
             smoothing_parameters,
             body_parts_list,
             flatten,
-            performer_names)
+            performer_names,
+            jobs,
+            cache,
+            cache_dir,
+            output_format,
+            compression,
+            batch_jobs,
+            resume,
+            encoder,
+            preview_scale,
+            preview_every,
+            crop_mode,
+            openpose_segments,
+            start_frame,
+            end_frame,
+            start_time,
+            end_time)
     else:
         run_pose_estimation(
                 output_dir,
@@ -238,7 +499,23 @@ def openpose_cli(
                 body_parts_list,
                 flatten,
                 trial_name,
-                performer_names
+                performer_names,
+                jobs,
+                cache,
+                cache_dir,
+                output_format,
+                compression,
+                encoder,
+                preview_scale,
+                preview_every,
+                crop_mode,
+                openpose_segments,
+                follow,
+                follow_timeout,
+                start_frame,
+                end_frame,
+                start_time,
+                end_time,
             )
 
 
@@ -260,7 +537,23 @@ def run_pose_estimation(
     body_parts=None,
     flatten=False,
     trial_name=None,
-    performer_names=None
+    performer_names=None,
+    jobs=1,
+    cache=False,
+    cache_dir=None,
+    output_format="csv",
+    compression=None,
+    encoder="opencv",
+    preview_scale=1,
+    preview_every=1,
+    crop_mode="video",
+    openpose_segments=1,
+    follow=False,
+    follow_timeout=10,
+    start_frame=None,
+    end_frame=None,
+    start_time=None,
+    end_time=None,
 ):
     """Runs openpose on the video, does post-processing, and outputs CSV files.
     Non-click version to work from jupyter notebooks.
@@ -287,7 +580,8 @@ def run_pose_estimation(
         pixels from the top-left corner.
     input_json : str
         Path to a directory of previously generated
-        openpose json files.
+        openpose json files, a tar or zip archive of
+        them, or a keypoint store packed from them.
     number_of_people : int
         Number of people for which to output results.
     create_model_video : bool
@@ -315,6 +609,68 @@ def run_pose_estimation(
     flatten : type
         Export CSV in flattened format, i.e. with a
         single header row (see README).
+    trial_name : str
+        Name of the trial, appended to output_dir and
+        included in the CSV file names.
+    performer_names : list of str
+        Names of the performers from left to right, used
+        in the CSV file names.
+    jobs : int
+        Number of processes to use to parse the openpose
+        json files.
+    cache : bool
+        Whether to cache the keypoints parsed from the
+        openpose json files for later runs.
+    cache_dir : str
+        Directory in which to cache parsed keypoints
+        (implies cache). If None, the cache is kept next
+        to the json directory.
+    output_format : str
+        Format of the output files: csv (default),
+        parquet, feather or hdf5.
+    compression : str
+        Compression for the output files. If None, the
+        format's default is used (see write_csv).
+    encoder : str
+        How to encode the videos: opencv (default), or
+        ffmpeg to pipe the frames to ffmpeg, adding the
+        audio to the overlay video in the same pass.
+    preview_scale : float
+        Factor by which to scale the videos, e.g. 0.25
+        for a quick preview.
+    preview_every : int
+        Only draw every nth frame of the videos, e.g. 10
+        for a quick preview.
+    crop_mode : str
+        How to crop to crop_rectangle: video (default)
+        crops the video with ffmpeg before running
+        openpose, and keypoints runs openpose on the
+        whole video and crops the keypoints and the
+        frames of the overlay video instead.
+    openpose_segments : int
+        Number of segments of the video to run openpose
+        processes on at once. Defaults to 1.
+    follow : bool
+        Whether to post-process the json files while
+        openpose is writing them, appending each frame to
+        the CSV files as soon as it is ready.
+    follow_timeout : float
+        With follow and input_json, seconds without new
+        json files after which to stop.
+    start_frame : int
+        First frame to process. If start_frame or
+        end_frame is given, only the json files for those
+        frames (and the frames either side needed to
+        process them as for the whole video) are read,
+        and only those frames are written to the CSV
+        files and videos.
+    end_frame : int
+        Frame to stop processing at (not included).
+        Defaults to the end of the video.
+    start_time, end_time : float
+        Alternatives to start_frame and end_frame in
+        seconds, converted to frames using the frame rate
+        of input_video.
     """
     # Check output directory
     output_dir = output_dir + str(trial_name)
@@ -337,7 +693,53 @@ def run_pose_estimation(
         )
         exit(1)
 
-    if input_video is None and crop_rectangle:
+    check_output_format(output_format)
+
+    if (
+        encoder == "ffmpeg"
+        and (create_model_video or create_overlay_video)
+        and not ffmpeg_available()
+    ):
+        print("ffmpeg must be installed to use the ffmpeg encoder.")
+        exit(1)
+
+    if follow and (
+        create_model_video
+        or create_overlay_video
+        or output_format != "csv"
+        or compression
+        or openpose_segments > 1
+    ):
+        print(
+            "Following the json files only writes uncompressed CSV files, "
+            "and can't be used with videos or openpose_segments."
+        )
+        exit(1)
+
+    frame_range = any(
+        t is not None for t in [start_frame, end_frame, start_time, end_time]
+    )
+    if frame_range and follow:
+        print("A range of frames can't be given when following json files.")
+        exit(1)
+
+    if start_time is not None or end_time is not None:
+        if start_frame is not None or end_frame is not None:
+            print("Give either start and end frames or times, not both.")
+            exit(1)
+        if input_video is None:
+            print(
+                "You must provide an input video in order to give start and "
+                "end times."
+            )
+            exit(1)
+        fps = what_fps(input_video)
+        if start_time is not None:
+            start_frame = int(round(start_time * fps))
+        if end_time is not None:
+            end_frame = int(round(end_time * fps))
+
+    if input_video is None and crop_rectangle and crop_mode == "video":
         print("You must provide an input video in order to crop the video.")
         exit(1)
 
@@ -366,22 +768,53 @@ def run_pose_estimation(
         print("You must provide 4 integer coordinates to crop_rectangle.")
         exit(1)
 
+    # Cropping the keypoints needs the rectangle to be inside the frame, as
+    # cropping the video does
+    keypoint_crop_rectangle = None
+    if crop_rectangle and crop_mode == "keypoints":
+        keypoint_crop_rectangle = crop_rectangle
+        if input_video is not None:
+            w, h, x, y = crop_rectangle
+            cap = cv2.VideoCapture(input_video)
+            video_width = int(cap.get(3))
+            video_height = int(cap.get(4))
+            cap.release()
+            if x + w > video_width or y + h > video_height:
+                print(
+                    f"Crop rectangle {crop_rectangle} is outside the "
+                    f"{video_width}x{video_height} video {input_video}."
+                )
+                exit(1)
+
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
 
     # Run openpose if necessary
+    openpose = None
     if input_json:
         path_to_json = os.path.abspath(input_json)
-        if not os.path.exists(path_to_json):
+        if not os.path.exists(path_to_json) and not follow:
             print(f"Invalid input_json path {path_to_json}.")
             exit(1)
+        elif os.path.isfile(path_to_json) and (
+            follow
+            or not (
+                is_archive(path_to_json) or is_keypoint_store(path_to_json)
+            )
+        ):
+            print(
+                f"Invalid input_json path {path_to_json}: must be a "
+                "directory, or a tar or zip archive or keypoint store "
+                "(without --follow)."
+            )
+            exit(1)
         else:
             print(f"Processing JSON from {path_to_json}...")
     else:
         input_video = os.path.realpath(input_video)
 
         # Crop the video before processing
-        if crop_rectangle:
+        if crop_rectangle and crop_mode == "video":
             print(f"Cropping video {input_video}...")
             try:
                 input_video = crop_video(
@@ -404,75 +837,109 @@ def run_pose_estimation(
 
         # Calling out to the binary seems to be quicker than the python wrapper
         path_to_json = os.path.join(output_dir, "json")
-        cmd = (
-            f"cd {openpose_dir} && "
-            "./build/examples/openpose/openpose.bin "
-            f"--video {input_video} "
-            f"--write_json {path_to_json} --display 0 --render-pose 0"
-        )
-        if openpose_args:
-            cmd = f"{cmd} {openpose_args}"
-
-        try:
-            # If running in Colab, need to use ipython's system call
-            ip = get_ipython()
-            result = ip.system_piped(cmd)
-        except NameError:
-            # Otherwise (if get_ipython doesn't exist) we can just use os.system
-            result = os.system(cmd)
-
-        if result:
-            print(f"Unable to run openpose from {openpose_dir}.")
-            exit(1)
-
-    # Get list of json files
-    json_files = [
-        pos_json
-        for pos_json in os.listdir(path_to_json)
-        if pos_json.endswith(".json")
-    ]
+        if openpose_segments > 1:
+            try:
+                run_openpose_segments(
+                    openpose_dir,
+                    input_video,
+                    path_to_json,
+                    openpose_args,
+                    openpose_segments,
+                )
+            except RuntimeError as e:
+                print(f"Unable to run openpose from {openpose_dir}: {e}")
+                exit(1)
+        elif follow:
+            # Run openpose in the background while following its output
+            openpose = subprocess.Popen(
+                openpose_command(
+                    openpose_dir, input_video, path_to_json, openpose_args
+                ),
+                shell=True,
+            )
+        else:
+            cmd = openpose_command(
+                openpose_dir, input_video, path_to_json, openpose_args
+            )
 
-    if len(json_files) == 0:
-        print(f"No json files found in {path_to_json}.")
-        exit(1)
+            try:
+                # If running in Colab, need to use ipython's system call
+                ip = get_ipython()
+                result = ip.system_piped(cmd)
+            except NameError:
+                # Otherwise (if get_ipython doesn't exist) we can just use os.system
+                result = os.system(cmd)
 
-    # Get array for dataframes
-    body_keypoints_dfs = []
+            if result:
+                print(f"Unable to run openpose from {openpose_dir}.")
+                exit(1)
 
-    # Loop through all json files in output directory
-    # Each file is a frame in the video
-    json_files.sort()
-    previous_body_keypoints_df = None
+    if follow:
+        is_finished = None
+        if openpose:
+            is_finished = lambda: openpose.poll() is not None
+        follow_keypoints(
+            path_to_json,
+            output_dir,
+            number_of_people,
+            body_parts,
+            confidence_threshold,
+            smoothing_parameters,
+            trial_name,
+            performer_names,
+            flatten,
+            keypoint_crop_rectangle,
+            is_finished=is_finished,
+            idle_timeout=None if openpose else follow_timeout,
+        )
+        if openpose and openpose.returncode:
+            print(f"Unable to run openpose from {openpose_dir}.")
+            exit(1)
+        print("Done.")
+        return
 
-    for file in json_files:
-        parser = OpenPoseJsonParser(os.path.join(path_to_json, file))
-        body_keypoints_df = parser.get_multiple_keypoints(
-            list(range(number_of_people)),
+    if frame_range:
+        (
+            person_dfs,
+            smoothed_person_dfs,
+            start_frame,
+            end_frame,
+        ) = post_process_frame_range(
+            path_to_json,
+            start_frame,
+            end_frame,
+            number_of_people,
             body_parts,
             confidence_threshold,
-            previous_body_keypoints_df,
+            smoothing_parameters,
+            jobs,
+            cache,
+            cache_dir,
+            keypoint_crop_rectangle,
         )
-        body_keypoints_df = parser.sort_persons_by_x_position(
-            body_keypoints_df
+    else:
+        start_frame = 0
+        keypoints, person_counts = load_json_keypoints(
+            path_to_json,
+            number_of_people,
+            jobs,
+            cache,
+            cache_dir,
+            keypoint_crop_rectangle,
+        )
+        person_dfs, smoothed_person_dfs = post_process_keypoints(
+            keypoints,
+            person_counts,
+            number_of_people,
+            body_parts,
+            confidence_threshold,
+            smoothing_parameters,
         )
-        body_keypoints_df.reset_index()
-        body_keypoints_dfs.append(body_keypoints_df)
-
-        
-        people_found = int(body_keypoints_df.shape[1]/3)
-        if number_of_people == people_found:
-
-            previous_body_keypoints_df = body_keypoints_df
-
-    person_dfs = reshape_dataframes(body_keypoints_dfs)
-
-    if smoothing_parameters:
-        print("Smoothing output...")
-        smoother = Smoother(*smoothing_parameters)
-        smoothed_person_dfs = smoother.smooth(person_dfs)
 
     if create_model_video or create_overlay_video:
-        if not width or not height:
+        if keypoint_crop_rectangle and (not width or not height):
+            width, height = keypoint_crop_rectangle[:2]
+        elif not width or not height:
             cap = cv2.VideoCapture(input_video)
             width = int(cap.get(3))
             height = int(cap.get(4))
@@ -481,37 +948,832 @@ def run_pose_estimation(
         visualizer = Visualizer(output_directory=output_dir)
         audio = Audio(input_video_path = input_video, output_directory=output_dir)
 
+        # ffmpeg adds the audio while encoding the overlay video
+        audio_source = None
+        if create_overlay_video and encoder == "ffmpeg":
+            if has_audio(input_video):
+                audio_source = input_video
+            else:
+                print("No audio found in the input video.")
+
+        # Both videos are drawn in a single pass over the frames
         if create_model_video:
             print("Creating model video...")
-            visualizer.create_video_from_dataframes(
-                "video", person_dfs, width, height, input_video_path=input_video
-            )
-            
-
         if create_overlay_video:
             print("Creating overlay video...")
-            visualizer.create_video_from_dataframes(
-                "video",
-                person_dfs,
-                width,
-                height,
-                input_video_path=input_video,
-                create_overlay=create_overlay_video,
-                video_to_overlay=input_video,
-            )
+        visualizer.create_videos_from_dataframes(
+            "video",
+            person_dfs,
+            width,
+            height,
+            input_video_path=input_video,
+            create_blank=create_model_video,
+            create_overlay=create_overlay_video,
+            video_to_overlay=input_video,
+            encoder=encoder,
+            audio_source=audio_source,
+            scale=preview_scale,
+            every=preview_every,
+            crop_rectangle=keypoint_crop_rectangle,
+            start_frame=start_frame,
+        )
 
+        if create_overlay_video and encoder != "ffmpeg":
             print("Adding audio...")
+            audio_range = {}
+            if frame_range:
+                fps = what_fps(input_video)
+                audio_range = dict(
+                    start=start_frame / fps,
+                    duration=(end_frame - start_frame) / fps,
+                )
             try:
-                audio.audio_combiner(input_video_path=input_video, output_directory = output_dir)
+                audio.audio_combiner(
+                    input_video_path=input_video,
+                    output_directory=output_dir,
+                    **audio_range,
+                )
             except Exception:
                 pass
 
     print(f"Saving CSVs to {output_dir}...")
-    write_csv(person_dfs, output_dir, trial_name, performer_names, flatten=flatten, smoothed = False)
+    write_csv(
+        person_dfs,
+        output_dir,
+        trial_name,
+        performer_names,
+        flatten=flatten,
+        smoothed=False,
+        output_format=output_format,
+        compression=compression,
+    )
     if smoothed_person_dfs:
-        write_csv(smoothed_person_dfs, output_dir, trial_name, performer_names, flatten=flatten, smoothed = True)
+        write_csv(
+            smoothed_person_dfs,
+            output_dir,
+            trial_name,
+            performer_names,
+            flatten=flatten,
+            smoothed=True,
+            output_format=output_format,
+            compression=compression,
+        )
     print("Done.")
 
+
+def check_output_format(output_format):
+    """Exits if the package needed to write output_format isn't installed."""
+    required_module = {
+        "parquet": "pyarrow",
+        "feather": "pyarrow",
+        "hdf5": "tables",
+    }.get(output_format)
+    if required_module and importlib.util.find_spec(required_module) is None:
+        print(
+            f"The {required_module} package must be installed to output "
+            f"{output_format} files."
+        )
+        exit(1)
+
+
+def run_sweep(
+    output_dir,
+    input_json,
+    confidence_thresholds,
+    smoothing_parameters_list,
+    number_of_people=1,
+    body_parts=None,
+    flatten=False,
+    trial_name=None,
+    performer_names=None,
+    jobs=1,
+    cache=False,
+    cache_dir=None,
+    output_format="csv",
+    compression=None,
+    batch_jobs=1,
+):
+    """Post-processes a directory of openpose json files with every
+    combination of the given confidence thresholds and smoothing
+    parameters. The json files are only loaded once, and each combination's
+    files are output to its own directory, named as by multi_name with the
+    trial name appended.
+
+    Parameters
+    ----------
+    output_dir : str
+        Start of the path of each combination's output directory.
+    input_json : str
+        Path to a directory of openpose json files.
+    confidence_thresholds : list of float
+        Confidence thresholds to apply.
+    smoothing_parameters_list : list of (int, int)
+        Smoothing parameters to apply. None in the list means no smoothing.
+    batch_jobs : int
+        Number of combinations to process at once, each in its own process.
+
+    Other parameters are as for run_pose_estimation.
+    """
+    check_output_format(output_format)
+
+    path_to_json = os.path.abspath(input_json)
+    if not (
+        os.path.isdir(path_to_json)
+        or is_archive(path_to_json)
+        or is_keypoint_store(path_to_json)
+    ):
+        print(f"Invalid input_json path {path_to_json}.")
+        exit(1)
+
+    variants = [
+        (
+            os.path.abspath(
+                multi_name(output_dir, confidence_threshold, smoothing)
+                + str(trial_name)
+            ),
+            confidence_threshold,
+            smoothing,
+        )
+        for confidence_threshold in confidence_thresholds
+        for smoothing in smoothing_parameters_list
+    ]
+    variant_dirs = [variant_dir for variant_dir, _, _ in variants]
+    if len(set(variant_dirs)) < len(variant_dirs):
+        print(
+            "Some combinations of parameters would be output to the same "
+            "directory (only the first 3 characters of the confidence "
+            "threshold are used in the name)."
+        )
+        exit(1)
+    for variant_dir in variant_dirs:
+        if os.path.isdir(variant_dir) and os.listdir(variant_dir):
+            print(
+                f"Directory {variant_dir} exists and is not empty, so files "
+                "would be overridden."
+            )
+            exit(1)
+
+    print(f"Processing JSON from {path_to_json}...")
+    keypoints, person_counts = load_json_keypoints(
+        path_to_json, number_of_people, jobs, cache, cache_dir
+    )
+
+    print(
+        f"Processing {len(variants)} combinations of parameters, "
+        f"{batch_jobs} at a time..."
+    )
+    run_variant = partial(
+        _run_sweep_variant,
+        number_of_people=number_of_people,
+        body_parts=body_parts,
+        trial_name=trial_name,
+        performer_names=performer_names,
+        flatten=flatten,
+        output_format=output_format,
+        compression=compression,
+    )
+    if batch_jobs > 1:
+        # Give each worker the keypoints once, rather than with every
+        # combination
+        with ProcessPoolExecutor(
+            max_workers=batch_jobs,
+            initializer=_init_sweep_worker,
+            initargs=(keypoints, person_counts),
+        ) as executor:
+            futures = [
+                executor.submit(run_variant, *variant) for variant in variants
+            ]
+            for future in futures:
+                print(f"Saved files to {future.result()}.")
+    else:
+        _init_sweep_worker(keypoints, person_counts)
+        for variant in variants:
+            print(f"Saved files to {run_variant(*variant)}.")
+    print("Done.")
+
+
+# Keypoints shared by the combinations of parameters in run_sweep
+_sweep_keypoints = None
+
+
+def _init_sweep_worker(keypoints, person_counts):
+    global _sweep_keypoints
+    _sweep_keypoints = (keypoints, person_counts)
+
+
+def _run_sweep_variant(
+    variant_dir,
+    confidence_threshold,
+    smoothing_parameters,
+    number_of_people,
+    body_parts,
+    trial_name,
+    performer_names,
+    **write_kwargs,
+):
+    """Post-processes the shared keypoints with one combination of
+    parameters in run_sweep, and outputs the files to variant_dir."""
+    keypoints, person_counts = _sweep_keypoints
+    person_dfs, smoothed_person_dfs = post_process_keypoints(
+        keypoints,
+        person_counts,
+        number_of_people,
+        body_parts,
+        confidence_threshold,
+        smoothing_parameters,
+    )
+
+    os.makedirs(variant_dir, exist_ok=True)
+    write_csv(
+        person_dfs,
+        variant_dir,
+        trial_name,
+        performer_names,
+        smoothed=False,
+        **write_kwargs,
+    )
+    if smoothed_person_dfs:
+        write_csv(
+            smoothed_person_dfs,
+            variant_dir,
+            trial_name,
+            performer_names,
+            smoothed=True,
+            **write_kwargs,
+        )
+    return variant_dir
+
+
+def load_json_keypoints(
+    path_to_json,
+    number_of_people,
+    jobs=1,
+    cache=False,
+    cache_dir=None,
+    crop_rectangle=None,
+    frames=None,
+):
+    """Loads the keypoints from a directory of openpose json files, with the
+    people in each frame in the order of the json file. Exits if there are
+    no json files.
+
+    Parameters
+    ----------
+    path_to_json : str
+        Path to a directory of openpose json files.
+    number_of_people : int
+        Number of people to load from each frame.
+    jobs, cache, cache_dir
+        See run_pose_estimation.
+    crop_rectangle : tuple(int)
+        Rectangle (w, h, x, y) to crop the keypoints to, see
+        openpose_json_loader.crop_keypoints. If None, the keypoints
+        aren't cropped.
+    frames : slice
+        Range of frames to load (see get_frame_window). If None, all the
+        frames are loaded.
+
+    Returns
+    -------
+    keypoints : np.array
+        Array of shape (frames, people, parts, 3), see
+        openpose_json_loader.load_keypoints.
+    person_counts : np.array
+        Number of people detected in each frame.
+    """
+    # Get list of json files
+    json_files = list_json_files(path_to_json)
+
+    if len(json_files) == 0:
+        print(f"No json files found in {path_to_json}.")
+        exit(1)
+
+    # Load all json files in one go: each file is a frame in the video.
+    # Keep full precision so the CSV values are unaffected.
+    cache_path = None
+    if cache or cache_dir:
+        cache_path = get_cache_path(path_to_json, cache_dir)
+    elif frames is not None:
+        # The cache holds every frame, so is sliced after loading instead
+        json_files = json_files[frames]
+    keypoints, person_counts = load_keypoints(
+        path_to_json,
+        None if crop_rectangle else number_of_people,
+        json_files,
+        dtype=np.float64,
+        jobs=jobs,
+        cache_path=cache_path,
+    )
+    if cache_path and frames is not None:
+        keypoints = keypoints[frames]
+        person_counts = person_counts[frames]
+
+    return select_keypoints(
+        keypoints, person_counts, number_of_people, crop_rectangle
+    )
+
+
+def select_keypoints(
+    keypoints, person_counts, number_of_people, crop_rectangle=None
+):
+    """Crops keypoints loaded by openpose_json_loader.load_keypoints and
+    keeps the given people. Exits if the keypoints can't be cropped.
+
+    Parameters
+    ----------
+    keypoints : np.array
+        Array of shape (frames, people, parts, 3), with up to
+        number_of_people people, or everyone if crop_rectangle is given.
+    person_counts : np.array
+        Number of people detected in each frame.
+    number_of_people, crop_rectangle
+        See load_json_keypoints.
+
+    Returns
+    -------
+    keypoints, person_counts
+        See load_json_keypoints.
+    """
+    # Leave out the people outside the cropped rectangle before choosing
+    # which people to keep
+    if crop_rectangle:
+        try:
+            keypoints, person_counts = crop_keypoints(
+                keypoints, person_counts, crop_rectangle
+            )
+        except ValueError as e:
+            print(
+                f"Unable to crop keypoints with coords {crop_rectangle}. "
+                f"Error was: {e}"
+            )
+            exit(1)
+        person_counts = np.minimum(person_counts, number_of_people)
+        keypoints = keypoints[:, : person_counts.max(initial=0)]
+
+    return keypoints, person_counts
+
+
+def get_part_indices(body_parts):
+    """Gets the indices in OpenPoseParts of body_parts, or None if
+    body_parts is None (i.e. every part)."""
+    if not body_parts:
+        return None
+    return [list(OpenPoseParts).index(p) for p in body_parts]
+
+
+def post_process_keypoints(
+    keypoints,
+    person_counts,
+    number_of_people,
+    body_parts,
+    confidence_threshold,
+    smoothing_parameters,
+    n_people=None,
+):
+    """Applies the confidence threshold, keeps the given body parts, orders
+    the people in each frame from left to right and smooths keypoints loaded
+    by load_json_keypoints, without modifying them.
+
+    Parameters
+    ----------
+    n_people : int
+        Number of people to output. Defaults to None, i.e. the number
+        detected in the first frame of keypoints.
+
+    Returns
+    -------
+    person_dfs : list of DataFrame
+        DataFrame for each person, as produced by reshape_keypoints, after
+        applying the confidence threshold.
+    smoothed_person_dfs : list of DataFrame
+        person_dfs after smoothing, or None if smoothing_parameters is None.
+    """
+    keypoints = apply_confidence_threshold(
+        keypoints,
+        person_counts,
+        number_of_people,
+        confidence_threshold,
+        get_part_indices(body_parts),
+    )
+
+    # Output a DataFrame for each person detected in the first frame
+    if n_people is None:
+        n_people = person_counts[0]
+    person_dfs = reshape_keypoints(keypoints[:, :n_people], body_parts)
+
+    smoothed_person_dfs = None
+    if smoothing_parameters:
+        print("Smoothing output...")
+        smoother = Smoother(*smoothing_parameters)
+        smoothed_person_dfs = smoother.smooth(person_dfs)
+
+    return person_dfs, smoothed_person_dfs
+
+
+def get_frame_window(n_frames, start_frame=None, end_frame=None, margin=0):
+    """Gets the range of frames to load to process the frames from
+    start_frame to end_frame, including margin frames either side of them
+    where there are any. Exits if there are no frames in the range.
+
+    Parameters
+    ----------
+    n_frames : int
+        Number of frames in the video, i.e. json files.
+    start_frame : int
+        First frame to process. Defaults to None, i.e. 0.
+    end_frame : int
+        Frame to stop processing at (not included). Defaults to None, i.e.
+        n_frames. Frames past the end of the video are left out.
+    margin : int
+        Number of extra frames to load either side of the range.
+
+    Returns
+    -------
+    frames : slice
+        Range of frames to load
+    start_frame, end_frame : int
+        Range of frames to process, with the defaults filled in
+    """
+    if start_frame is None:
+        start_frame = 0
+    if end_frame is None or end_frame > n_frames:
+        end_frame = n_frames
+    if start_frame >= end_frame:
+        print(
+            f"There are no frames from {start_frame} to {end_frame} in the "
+            f"{n_frames} frames of the video."
+        )
+        exit(1)
+    frames = slice(
+        max(0, start_frame - margin), min(n_frames, end_frame + margin)
+    )
+    return frames, start_frame, end_frame
+
+
+def post_process_frame_range(
+    path_to_json,
+    start_frame,
+    end_frame,
+    number_of_people,
+    body_parts,
+    confidence_threshold,
+    smoothing_parameters,
+    jobs=1,
+    cache=False,
+    cache_dir=None,
+    crop_rectangle=None,
+):
+    """Loads and post-processes only the frames from start_frame to
+    end_frame, as load_json_keypoints and post_process_keypoints would for
+    the whole video.
+
+    Enough frames either side of the range are loaded for the range to
+    come out exactly as it would for the whole video, see
+    _frame_window_is_exact.
+
+    Parameters
+    ----------
+    path_to_json : str
+        Path to a directory of openpose json files.
+    start_frame, end_frame : int
+        Range of frames to process, see get_frame_window.
+    number_of_people, body_parts, confidence_threshold,
+    smoothing_parameters, jobs, cache, cache_dir, crop_rectangle
+        See load_json_keypoints and post_process_keypoints.
+
+    Returns
+    -------
+    person_dfs, smoothed_person_dfs : list of DataFrame
+        See post_process_keypoints, with the rows numbered by their frame in
+        the video.
+    start_frame, end_frame : int
+        Range of frames processed, see get_frame_window.
+    """
+    n_frames = len(list_json_files(path_to_json))
+    smoothing_rows = smoothing_parameters[0] - 1 if smoothing_parameters else 0
+    margin = max(smoothing_rows, 1)
+    frames, start_frame, end_frame = get_frame_window(
+        n_frames, start_frame, end_frame, margin
+    )
+
+    # Output the people detected in the first frame of the video, as when
+    # processing the whole video
+    n_people = None
+    if frames.start > 0:
+        _, first_person_counts = load_json_keypoints(
+            path_to_json,
+            number_of_people,
+            jobs,
+            cache,
+            cache_dir,
+            crop_rectangle,
+            frames=slice(0, 1),
+        )
+        n_people = first_person_counts[0]
+
+    while True:
+        keypoints, person_counts = load_json_keypoints(
+            path_to_json,
+            number_of_people,
+            jobs,
+            cache,
+            cache_dir,
+            crop_rectangle,
+            frames=frames,
+        )
+        person_dfs, smoothed_person_dfs = post_process_keypoints(
+            keypoints,
+            person_counts,
+            number_of_people,
+            body_parts,
+            confidence_threshold,
+            smoothing_parameters,
+            n_people,
+        )
+        for person_df in person_dfs + (smoothed_person_dfs or []):
+            person_df.index = person_df.index + frames.start
+
+        if _frame_window_is_exact(
+            keypoints,
+            person_counts,
+            person_dfs,
+            frames,
+            start_frame,
+            end_frame,
+            n_frames,
+            number_of_people,
+            confidence_threshold,
+            smoothing_rows,
+            get_part_indices(body_parts),
+        ):
+            break
+        margin *= 2
+        frames, _, _ = get_frame_window(
+            n_frames, start_frame, end_frame, margin
+        )
+
+    person_dfs = select_frames(person_dfs, start_frame, end_frame)
+    if smoothed_person_dfs:
+        smoothed_person_dfs = select_frames(
+            smoothed_person_dfs, start_frame, end_frame
+        )
+    return person_dfs, smoothed_person_dfs, start_frame, end_frame
+
+
+def _frame_window_is_exact(
+    keypoints,
+    person_counts,
+    person_dfs,
+    frames,
+    start_frame,
+    end_frame,
+    n_frames,
+    number_of_people,
+    confidence_threshold,
+    smoothing_rows,
+    part_indices=None,
+):
+    """Whether enough frames either side of the range from start_frame to
+    end_frame were loaded for it to be post-processed exactly as for the
+    whole video (see post_process_frame_range).
+
+    The smoother works on the rows of each person's DataFrame, which leave
+    out the frames the person wasn't detected in, so each person needs
+    smoothing_rows rows either side of the range. The confidence threshold
+    carries keypoints forward from earlier frames, so before the first of
+    those rows each keypoint must have been kept rather than replaced in a
+    frame where everyone was detected, after which the frames before it make
+    no difference. As the people are re-sorted after replacement, a part
+    which may still be carried from before the window could be any person's
+    after that frame. Only the keypoints of the parts in part_indices (by
+    default every part) are replaced.
+    """
+    first_needed = start_frame
+    for person_df in person_dfs:
+        before = person_df.index[person_df.index < start_frame]
+        after = person_df.index[person_df.index >= end_frame]
+        if frames.stop < n_frames and len(after) < smoothing_rows:
+            return False
+        if len(before) < smoothing_rows:
+            if frames.start > 0:
+                return False
+        elif smoothing_rows:
+            first_needed = min(first_needed, before[-smoothing_rows])
+
+    if frames.start == 0 or confidence_threshold <= 0:
+        return True
+    lookback = slice(0, first_needed - frames.start + 1)
+    full_frames = person_counts[lookback] == number_of_people
+    conf = keypoints[lookback][full_frames][..., 2]
+    if part_indices is not None:
+        conf = conf[:, :, part_indices]
+    kept = ~(conf < confidence_threshold)
+    carried = np.ones(kept.shape[1:], dtype=bool)
+    for frame_kept in kept:
+        carried &= ~frame_kept
+        if not carried.any():
+            return True
+        carried[:] = carried.any(axis=0)
+    return False
+
+
+def select_frames(person_dfs, start_frame, end_frame):
+    """Selects the rows from start_frame to end_frame (not included) of
+    DataFrames whose rows are numbered by frame.
+
+    Parameters
+    ----------
+    person_dfs : list of DataFrame
+        DataFrames as returned by post_process_frame_range.
+    start_frame, end_frame : int
+        Range of frames to select.
+
+    Returns
+    -------
+    list of DataFrame
+        The selected rows of each DataFrame
+    """
+    return [
+        person_df[
+            (person_df.index >= start_frame) & (person_df.index < end_frame)
+        ]
+        for person_df in person_dfs
+    ]
+
+
+def follow_keypoints(
+    path_to_json,
+    output_dir,
+    number_of_people,
+    body_parts,
+    confidence_threshold,
+    smoothing_parameters,
+    trial_name=None,
+    performer_names=None,
+    flatten=False,
+    crop_rectangle=None,
+    is_finished=None,
+    idle_timeout=None,
+    poll_interval=0.5,
+):
+    """Post-processes openpose json files as openpose writes them, appending
+    the rows for each frame to the CSV files as soon as they are ready.
+    Gives the same CSV files as load_json_keypoints, post_process_keypoints
+    and write_csv once the last frame has been written, except that the
+    smoothed frames may differ by rounding. Exits if there are no json
+    files.
+
+    Parameters
+    ----------
+    path_to_json : str
+        Path to the directory openpose is writing json files to.
+    output_dir : str
+        Directory in which to write the CSV files.
+    number_of_people, body_parts, confidence_threshold,
+    smoothing_parameters, trial_name, performer_names, flatten
+        See run_pose_estimation.
+    crop_rectangle : tuple(int)
+        Rectangle (w, h, x, y) to crop the keypoints to, see
+        load_json_keypoints.
+    is_finished, idle_timeout, poll_interval
+        When to stop following the json files and how often to check for
+        new ones, see json_follower.follow_json_files.
+
+    Returns
+    -------
+    int
+        Number of frames processed
+    """
+    n_frames = 0
+    n_people = None
+    # Last frame (after applying the threshold) in which everyone was
+    # detected, which the next frames are compared with
+    previous = None
+    part_indices = get_part_indices(body_parts)
+    smoothers = None
+    write_args = (output_dir, trial_name, performer_names)
+
+    for json_files in follow_json_files(
+        path_to_json, is_finished, idle_timeout, poll_interval
+    ):
+        keypoints, person_counts = load_keypoints(
+            path_to_json,
+            None if crop_rectangle else number_of_people,
+            json_files,
+            dtype=np.float64,
+        )
+        keypoints, person_counts = select_keypoints(
+            keypoints, person_counts, number_of_people, crop_rectangle
+        )
+
+        # Give every person a slot in every frame, so the frames line up
+        # with previous
+        keypoints = np.concatenate(
+            [
+                keypoints,
+                np.full(
+                    (len(keypoints), number_of_people - keypoints.shape[1])
+                    + keypoints.shape[2:],
+                    np.nan,
+                ),
+            ],
+            axis=1,
+        )
+
+        # Carry the confidence threshold on from the frames already
+        # processed
+        keypoints = apply_confidence_threshold(
+            keypoints,
+            person_counts,
+            number_of_people,
+            confidence_threshold,
+            part_indices,
+            previous,
+        )
+        full_frames = np.flatnonzero(person_counts == number_of_people)
+        if len(full_frames):
+            previous = keypoints[full_frames[-1]]
+
+        # Output a DataFrame for each person detected in the first frame
+        if n_people is None:
+            n_people = person_counts[0]
+            print(f"Writing CSVs to {output_dir} as frames are detected...")
+        person_dfs = reshape_keypoints(keypoints[:, :n_people], body_parts)
+        for person_df in person_dfs:
+            person_df.index += n_frames
+        n_frames += len(keypoints)
+
+        if smoothing_parameters:
+            if smoothers is None:
+                smoothers = [
+                    (StreamingSmoother(*smoothing_parameters), deque())
+                    for _ in person_dfs
+                ]
+                columns = [person_df.columns for person_df in person_dfs]
+            smoothed_person_dfs = [
+                _push_rows(smoother, index, person_df)
+                for (smoother, index), person_df in zip(smoothers, person_dfs)
+            ]
+            write_csv(
+                smoothed_person_dfs,
+                *write_args,
+                smoothed=True,
+                flatten=flatten,
+                append=True,
+            )
+        write_csv(person_dfs, *write_args, flatten=flatten, append=True)
+
+    if n_frames == 0:
+        print(f"No json files found in {path_to_json}.")
+        exit(1)
+
+    if smoothers:
+        smoothed_person_dfs = [
+            _push_rows(
+                smoother,
+                index,
+                pd.DataFrame(columns=person_columns),
+                flush=True,
+            )
+            for (smoother, index), person_columns in zip(smoothers, columns)
+        ]
+        write_csv(
+            smoothed_person_dfs,
+            *write_args,
+            smoothed=True,
+            flatten=flatten,
+            append=True,
+        )
+
+    return n_frames
+
+
+def _push_rows(smoother, index, person_df, flush=False):
+    """Pushes the rows of a person's DataFrame to their StreamingSmoother,
+    and returns the smoothed rows which are ready as a DataFrame. index
+    holds the frame numbers of the rows pushed but not yet returned.
+
+    As Smoother smooths the rows of the DataFrame, frames in which the
+    person wasn't detected (which have no row) don't split the runs of
+    frames which are smoothed."""
+    values = person_df.to_numpy(dtype=float)
+    smoothed = smoother.push(
+        values.reshape(len(values), values.shape[1] // 3, 3)
+    )
+    if flush:
+        smoothed = np.concatenate([smoothed, smoother.flush()])
+    index.extend(person_df.index)
+    return pd.DataFrame(
+        smoothed.reshape(len(smoothed), values.shape[1]),
+        index=[index.popleft() for _ in range(len(smoothed))],
+        columns=person_df.columns,
+    )
+
+
+# Message for trials skipped by run_batch because they are up to date
+UP_TO_DATE = "up to date"
+
+
 def multiple_videos(output_dir,
                 openpose_dir,
                 openpose_args,
@@ -526,38 +1788,306 @@ def multiple_videos(output_dir,
                 smoothing_parameters,
                 body_parts_list,
                 flatten,
-                performer_names):
+                performer_names,
+                jobs=1,
+                cache=False,
+                cache_dir=None,
+                output_format="csv",
+                compression=None,
+                batch_jobs=1,
+                resume=False,
+                encoder="opencv",
+                preview_scale=1,
+                preview_every=1,
+                crop_mode="video",
+                openpose_segments=1,
+                start_frame=None,
+                end_frame=None,
+                start_time=None,
+                end_time=None):
     contents = os.listdir(batch_folder)
     # If single run
     if not any(".json" in file for file in contents):
         contents = [x for x in contents if not x.startswith('.')]
-        for input_folder in contents:
-            multi_input_json = batch_folder + input_folder + "/output_json/"
+        multi_output_dir = multi_name(output_dir,
+            confidence_threshold,
+            smoothing_parameters)
+        trials = []
+        for input_folder in sorted(contents):
+            multi_input_json = find_input_json(batch_folder, input_folder)
             multi_trial_name = input_folder
-            multi_output_dir = multi_name(output_dir,
-                confidence_threshold,
-                smoothing_parameters)
             multi_input_video = find_input_video(batch_folder, input_folder)
 
-            run_pose_estimation(
-                multi_output_dir,
-                openpose_dir,
-                openpose_args,
-                multi_input_video,
-                multi_input_json,
-                crop_rectangle,
-                number_of_people,
-                create_model_video,
-                create_overlay_video,
-                width,
-                height,
-                confidence_threshold,
-                smoothing_parameters,
-                body_parts_list,
-                flatten,
-                multi_trial_name,
-                performer_names
+            kwargs = dict(
+                output_dir=multi_output_dir,
+                openpose_dir=openpose_dir,
+                openpose_args=openpose_args,
+                input_video=multi_input_video,
+                input_json=multi_input_json,
+                crop_rectangle=crop_rectangle,
+                number_of_people=number_of_people,
+                create_model_video=create_model_video,
+                create_overlay_video=create_overlay_video,
+                width=width,
+                height=height,
+                confidence_threshold=confidence_threshold,
+                smoothing_parameters=smoothing_parameters,
+                body_parts=body_parts_list,
+                flatten=flatten,
+                trial_name=multi_trial_name,
+                performer_names=performer_names,
+                jobs=jobs,
+                cache=cache,
+                cache_dir=cache_dir,
+                output_format=output_format,
+                compression=compression,
+                encoder=encoder,
+                preview_scale=preview_scale,
+                preview_every=preview_every,
+                crop_mode=crop_mode,
+                openpose_segments=openpose_segments,
+                start_frame=start_frame,
+                end_frame=end_frame,
+                start_time=start_time,
+                end_time=end_time,
+            )
+            trials.append((multi_trial_name, kwargs))
+
+        results = run_batch(
+            trials,
+            f"{multi_output_dir}_logs",
+            batch_jobs,
+            f"{multi_output_dir}_manifest.json",
+            resume,
+        )
+        print_batch_summary(results)
+        if any(not success for _, success, _ in results):
+            exit(1)
+
+
+def run_batch(trials, log_dir, batch_jobs=1, manifest_path=None, resume=False):
+    """Runs run_pose_estimation for each trial, batch_jobs at a time. A trial
+    which fails (including by calling exit) doesn't stop the others. With
+    more than one job, the trials run in their own processes and the output
+    of each trial is written to a log file; otherwise they run one after
+    the other in this process, printing their output as usual.
+
+    Parameters
+    ----------
+    trials : list of (str, dict)
+        Name of each trial and the keyword arguments to pass to
+        run_pose_estimation for it.
+    log_dir : str
+        Directory in which to write a log file for each trial, if
+        batch_jobs is more than 1.
+    batch_jobs : int
+        Number of trials to run at once, each in its own process if more
+        than 1.
+    manifest_path : str
+        Path of a JSON manifest in which to record the inputs and outputs of
+        each trial (see batch_manifest). If None, no manifest is kept.
+    resume : bool
+        Whether to skip trials which the manifest shows are up to date. Other
+        trials in the manifest have their previous output directory removed
+        before being processed again, if the manifest shows the batch
+        created it. Trials whose output directory already existed (and
+        wasn't empty) before the batch ran them are failed instead.
+
+    Returns
+    -------
+    list of (str, bool, str)
+        Name of each trial, whether it succeeded, and a message (the path
+        of its log file if it has one, or the reason it failed).
+    """
+    manifest = load_manifest(manifest_path) if manifest_path else None
+
+    results = []
+    trials_to_run = []
+    for trial_name, kwargs in trials:
+        if manifest is not None:
+            trial_output_dir = os.path.abspath(
+                kwargs["output_dir"] + str(kwargs["trial_name"])
             )
+            fingerprint = trial_fingerprint(kwargs)
+            entry = manifest["trials"].get(trial_name)
+            if resume and entry:
+                if is_up_to_date(entry, fingerprint, trial_output_dir):
+                    results.append((trial_name, True, UP_TO_DATE))
+                    continue
+                previous_output_dir = entry["output_dir"]
+                if _has_files(previous_output_dir):
+                    if not entry.get("created"):
+                        # The directory was there before the batch ran the
+                        # trial, so may hold someone else's files
+                        message = (
+                            f"output directory {previous_output_dir} "
+                            "wasn't created by this batch, so won't be "
+                            "removed"
+                        )
+                        print(f"{trial_name}: failed ({message})")
+                        results.append((trial_name, False, message))
+                        continue
+                    # The manifest shows this batch created the directory,
+                    # so it's safe to clear it for the trial to run again
+                    print(f"Removing previous output {previous_output_dir}.")
+                    shutil.rmtree(previous_output_dir)
+
+            # Record whether the batch owns the directory, i.e. it was
+            # missing or empty before the trial, or an earlier run of the
+            # batch created it
+            created = not _has_files(trial_output_dir) or bool(
+                entry
+                and entry.get("created")
+                and entry["output_dir"] == trial_output_dir
+            )
+            manifest["trials"][trial_name] = {
+                "created": created,
+                "fingerprint": fingerprint,
+                "output_dir": trial_output_dir,
+                "status": "running",
+            }
+        trials_to_run.append((trial_name, kwargs))
+
+    if manifest is not None:
+        save_manifest(manifest_path, manifest)
+
+    if len(trials_to_run) < len(trials):
+        print(
+            f"Skipping {len(trials) - len(trials_to_run)} trials which "
+            "are up to date."
+        )
+
+    def record_result(trial_name, success, message):
+        print(
+            f"{trial_name}: {'done' if success else 'failed'}"
+            f"{'' if success else f' ({message})'}"
+        )
+        results.append((trial_name, success, message))
+
+        if manifest is not None:
+            entry = manifest["trials"][trial_name]
+            entry["status"] = "done" if success else "failed"
+            entry["message"] = message
+            entry["outputs"] = list_outputs(entry["output_dir"])
+            save_manifest(manifest_path, manifest)
+
+    if batch_jobs == 1:
+        print(f"Processing {len(trials_to_run)} trials.")
+        for trial_name, kwargs in trials_to_run:
+            record_result(trial_name, *run_trial(kwargs))
+    else:
+        os.makedirs(log_dir, exist_ok=True)
+        print(
+            f"Processing {len(trials_to_run)} trials, {batch_jobs} at a "
+            f"time. Logs are in {os.path.abspath(log_dir)}."
+        )
+        with ProcessPoolExecutor(max_workers=batch_jobs) as executor:
+            futures = {
+                executor.submit(
+                    run_trial,
+                    kwargs,
+                    os.path.join(log_dir, f"{trial_name}.log"),
+                ): trial_name
+                for trial_name, kwargs in trials_to_run
+            }
+            for future in as_completed(futures):
+                try:
+                    success, message = future.result()
+                except Exception as e:
+                    # e.g. the worker process died
+                    success, message = False, repr(e)
+                record_result(futures[future], success, message)
+
+    # Report in the order the trials were given
+    order = {trial_name: i for i, (trial_name, _) in enumerate(trials)}
+    return sorted(results, key=lambda result: order[result[0]])
+
+
+def _has_files(directory):
+    """Whether directory exists and isn't empty."""
+    return os.path.isdir(directory) and bool(os.listdir(directory))
+
+
+def run_trial(kwargs, log_path=None):
+    """Runs run_pose_estimation with the given keyword arguments, writing
+    everything it (and any programs it runs) outputs to log_path, if given.
+
+    Returns
+    -------
+    (bool, str)
+        Whether it succeeded, and the path of the log file (or None if there
+        isn't one) or the reason it failed.
+    """
+    if log_path is None:
+        return _run_trial(kwargs)
+
+    with open(log_path, "w", buffering=1) as log, capture_output(log):
+        success, reason = _run_trial(kwargs)
+    if success:
+        return True, log_path
+
+    with open(log_path) as log:
+        lines = [line.strip() for line in log if line.strip()]
+    if lines:
+        reason = f"{reason}: {lines[-1]}"
+    return False, reason
+
+
+def _run_trial(kwargs):
+    """Runs run_pose_estimation, catching the ways it can fail.
+
+    Returns
+    -------
+    (bool, str)
+        Whether it succeeded, and None or the reason it failed.
+    """
+    try:
+        run_pose_estimation(**kwargs)
+        return True, None
+    except SystemExit as e:
+        # run_pose_estimation prints the reason before exiting
+        return False, f"exited with status {e.code}"
+    except Exception:
+        traceback.print_exc()
+        return False, "raised an exception"
+
+
+@contextmanager
+def capture_output(log):
+    """Redirects stdout and stderr, at both the Python and file descriptor
+    level (so including programs run with os.system) to the file log."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = [os.dup(1), os.dup(2)]
+    try:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        with redirect_stdout(log), redirect_stderr(log):
+            yield
+    finally:
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        for fd in saved_fds:
+            os.close(fd)
+
+
+def print_batch_summary(results):
+    """Prints the number of trials which succeeded, failed or were skipped,
+    and why any failed."""
+    failures = [
+        (trial_name, message)
+        for trial_name, success, message in results
+        if not success
+    ]
+    n_skipped = sum(message == UP_TO_DATE for _, _, message in results)
+    print(
+        f"Batch finished: {len(results) - len(failures) - n_skipped} "
+        f"succeeded, {len(failures)} failed"
+        f"{f', {n_skipped} up to date' if n_skipped else ''}."
+    )
+    for trial_name, message in failures:
+        print(f"  {trial_name}: {message}")
+
 
 def multi_name(output_dir,
                 confidence_threshold,
@@ -566,6 +2096,18 @@ def multi_name(output_dir,
     smo = str(smoothing_parameters)[1:-1].replace(', ', '_')
     return f'{output_dir}_c{con}_s{smo}'
 
+def find_input_json(batch_folder, input_folder):
+    """Finds a trial's output_json directory, or else an archive of it
+    (output_json.tar, .tar.gz, .tgz or .zip) or a keypoint store packed from
+    it (output_json.kps)."""
+    json_path = batch_folder + input_folder + "/output_json"
+    if not os.path.isdir(json_path):
+        for extension in [".tar", ".tar.gz", ".tgz", ".zip", ".kps"]:
+            if os.path.isfile(json_path + extension):
+                return json_path + extension
+    return json_path + "/"
+
+
 def find_input_video(batch_folder, input_folder):
     print(batch_folder)
     video_path = batch_folder + input_folder + '/*.mp4'
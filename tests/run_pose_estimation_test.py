@@ -1,7 +1,10 @@
+import json
 import os
 import shutil
 import sys
+import threading
 
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -362,3 +365,357 @@ def test_openpose_cli_invalid_parts(output_path):
         f"--output-dir {output_path} --body-parts=Forehead,Chin"
     )
     assert result > 0
+
+
+def test_multiple_videos_batch_jobs(tmp_path, capsys):
+    batch_folder = tmp_path / "batch"
+    for trial in ["trial_a", "trial_b"]:
+        shutil.copytree(
+            "tests/test_json", batch_folder / trial / "output_json"
+        )
+    # No JSON, so this trial fails
+    os.makedirs(batch_folder / "trial_bad")
+
+    output_dir = str(tmp_path / "output")
+    with pytest.raises(SystemExit):
+        run_pose_estimation.multiple_videos(
+            output_dir,
+            None,
+            None,
+            f"{batch_folder}/",
+            None,
+            2,
+            False,
+            False,
+            0,
+            0,
+            0.5,
+            (5, 2),
+            None,
+            False,
+            None,
+            batch_jobs=2,
+        )
+
+    # The good trials are processed despite the bad one
+    multi_output_dir = run_pose_estimation.multi_name(output_dir, 0.5, (5, 2))
+    for trial in ["trial_a", "trial_b"]:
+        assert os.path.isfile(
+            f"{multi_output_dir}{trial}/smoothed_{trial}_person_0.csv"
+        )
+
+    # Each trial's output is captured in its log
+    log_dir = f"{multi_output_dir}_logs"
+    assert sorted(os.listdir(log_dir)) == [
+        "trial_a.log",
+        "trial_b.log",
+        "trial_bad.log",
+    ]
+    with open(os.path.join(log_dir, "trial_bad.log")) as f:
+        assert "Invalid input_json path" in f.read()
+
+    captured = capsys.readouterr()
+    assert "Batch finished: 2 succeeded, 1 failed." in captured.out
+    assert "trial_bad: exited with status 1: Invalid input_json path" in (
+        captured.out
+    )
+
+
+def test_multiple_videos_resume(tmp_path, capsys):
+    batch_folder = tmp_path / "batch"
+    for trial in ["trial_a", "trial_b", "trial_c"]:
+        shutil.copytree(
+            "tests/test_json", batch_folder / trial / "output_json"
+        )
+    output_dir = str(tmp_path / "output")
+    multi_output_dir = run_pose_estimation.multi_name(output_dir, 0, None)
+    manifest_path = f"{multi_output_dir}_manifest.json"
+
+    def run_batch():
+        run_pose_estimation.multiple_videos(
+            output_dir,
+            None,
+            None,
+            f"{batch_folder}/",
+            None,
+            2,
+            False,
+            False,
+            0,
+            0,
+            0,
+            None,
+            None,
+            False,
+            None,
+            resume=True,
+        )
+        return capsys.readouterr().out
+
+    out = run_batch()
+    assert "3 succeeded, 0 failed" in out
+    # With one job the trials run in this process, printing their output
+    # rather than writing logs
+    assert "Saving CSVs to" in out
+    assert not os.path.exists(f"{multi_output_dir}_logs")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    assert manifest["trials"]["trial_a"]["status"] == "done"
+    assert "trial_a_person_0.csv" in manifest["trials"]["trial_a"]["outputs"]
+
+    # Nothing has changed, so nothing is processed
+    out = run_batch()
+    assert "Skipping 3 trials which are up to date." in out
+    assert "Processing 0 trials" in out
+    assert "0 succeeded, 0 failed, 3 up to date." in out
+
+    # Change trial_b's input, and pretend the batch died while processing
+    # trial_c, leaving partial output
+    json_file = (
+        batch_folder
+        / "trial_b"
+        / "output_json"
+        / os.listdir(batch_folder / "trial_b" / "output_json")[0]
+    )
+    json_file.write_text(json_file.read_text() + " ")
+    manifest["trials"]["trial_c"]["status"] = "running"
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    os.remove(f"{multi_output_dir}trial_c/trial_c_person_1.csv")
+
+    out = run_batch()
+    assert "Skipping 1 trials which are up to date." in out
+    assert "Processing 2 trials" in out
+    assert "2 succeeded, 0 failed, 1 up to date." in out
+    assert os.path.isfile(f"{multi_output_dir}trial_c/trial_c_person_1.csv")
+
+
+def test_openpose_cli_sweep(tmp_path):
+    output_dir = str(tmp_path / "sweep")
+    result = os.system(
+        f"python run_pose_estimation.py --input-json tests/test_json "
+        f"--output-dir {output_dir} -n 2 -tn trial -c 0 -c 0.5 "
+        f"-s 5 2 -s 7 2 --batch-jobs 2"
+    )
+    assert result == 0
+
+    # Each combination gives the same files as a separate run
+    for confidence_threshold in [0, 0.5]:
+        for smoothing_parameters in [(5, 2), (7, 2)]:
+            variant_dir = (
+                run_pose_estimation.multi_name(
+                    output_dir,
+                    float(confidence_threshold),
+                    smoothing_parameters,
+                )
+                + "trial"
+            )
+            single_output_dir = str(tmp_path / "single")
+            run_pose_estimation.run_pose_estimation(
+                single_output_dir,
+                input_json="tests/test_json",
+                number_of_people=2,
+                confidence_threshold=confidence_threshold,
+                smoothing_parameters=smoothing_parameters,
+                trial_name="trial",
+                performer_names=["1", "2"],
+            )
+
+            single_output_dir += "trial"
+            assert sorted(os.listdir(variant_dir)) == sorted(
+                os.listdir(single_output_dir)
+            )
+            for f in os.listdir(variant_dir):
+                with open(os.path.join(variant_dir, f)) as variant_file:
+                    with open(
+                        os.path.join(single_output_dir, f)
+                    ) as single_file:
+                        assert variant_file.read() == single_file.read()
+            shutil.rmtree(single_output_dir)
+
+
+def test_follow_keypoints(tmp_path):
+    # Copy the json files a few at a time, as openpose would write them
+    path_to_json = str(tmp_path / "json")
+    os.makedirs(path_to_json)
+    json_files = sorted(os.listdir("tests/test_json"))
+    finished = threading.Event()
+
+    def write_json():
+        for i, json_file in enumerate(json_files):
+            shutil.copy(
+                os.path.join("tests/test_json", json_file), path_to_json
+            )
+            if i % 7 == 0:
+                finished.wait(0.02)
+        finished.set()
+
+    follow_output_dir = str(tmp_path / "follow")
+    os.makedirs(follow_output_dir)
+    writer = threading.Thread(target=write_json)
+    writer.start()
+    n_frames = run_pose_estimation.follow_keypoints(
+        path_to_json,
+        follow_output_dir,
+        number_of_people=2,
+        body_parts=None,
+        confidence_threshold=0.5,
+        smoothing_parameters=(5, 2),
+        trial_name="trial",
+        is_finished=finished.is_set,
+        poll_interval=0.01,
+    )
+    writer.join()
+    assert n_frames == len(json_files)
+
+    # The CSVs are the same as when processing all the files at once
+    output_dir = str(tmp_path / "all")
+    run_pose_estimation.run_pose_estimation(
+        output_dir,
+        input_json="tests/test_json",
+        number_of_people=2,
+        confidence_threshold=0.5,
+        smoothing_parameters=(5, 2),
+        trial_name="trial",
+    )
+    output_dir += "trial"
+    assert sorted(os.listdir(follow_output_dir)) == sorted(
+        os.listdir(output_dir)
+    )
+    for f in os.listdir(output_dir):
+        with open(os.path.join(output_dir, f)) as all_file:
+            with open(os.path.join(follow_output_dir, f)) as follow_file:
+                assert follow_file.read() == all_file.read()
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_run_pose_estimation_frame_range(tmp_path, cache):
+    path_to_json = str(tmp_path / "json")
+    shutil.copytree("tests/test_json", path_to_json)
+
+    def run(name, **kwargs):
+        output_dir = str(tmp_path / name)
+        run_pose_estimation.run_pose_estimation(
+            output_dir,
+            input_json=path_to_json,
+            number_of_people=2,
+            confidence_threshold=0.5,
+            smoothing_parameters=(5, 2),
+            trial_name="trial",
+            cache=cache,
+            **kwargs,
+        )
+        output_dir += "trial"
+        return {
+            f: pd.read_csv(
+                os.path.join(output_dir, f), header=[0, 1], index_col=0
+            )
+            for f in os.listdir(output_dir)
+            if f.endswith(".csv")
+        }
+
+    all_dfs = run("all")
+    for start_frame, end_frame in [(8, 20), (0, 3), (20, None)]:
+        range_dfs = run(
+            f"range_{start_frame}_{end_frame}",
+            start_frame=start_frame,
+            end_frame=end_frame,
+        )
+        # The rows in the range are the same as when processing every frame
+        assert sorted(range_dfs) == sorted(all_dfs)
+        for f, all_df in all_dfs.items():
+            last_frame = len(os.listdir("tests/test_json")) - 1
+            if end_frame is not None:
+                last_frame = end_frame - 1
+            pd.testing.assert_frame_equal(
+                range_dfs[f], all_df.loc[start_frame:last_frame]
+            )
+
+
+def test_frame_window_is_exact_with_reordering():
+    # One part of two people, kept by each person in a different frame
+    keypoints = np.array(
+        [
+            [[[10, 0, 0.9]], [[20, 0, 0.1]]],
+            [[[11, 0, 0.1]], [[21, 0, 0.9]]],
+            [[[12, 0, 0.1]], [[22, 0, 0.1]]],
+        ]
+    )
+    person_counts = np.array([2, 2, 2])
+
+    def is_exact(keypoints):
+        return run_pose_estimation._frame_window_is_exact(
+            keypoints, person_counts, [], slice(10, 13), 12, 13, 13, 2, 0.5, 0
+        )
+
+    # The people may have been re-sorted after the first frame, so the
+    # second person's part could still be carried from before the window
+    assert not is_exact(keypoints)
+    keypoints[1, 0, 0, 2] = 0.9
+    assert is_exact(keypoints)
+
+
+def test_get_frame_window(capsys):
+    assert run_pose_estimation.get_frame_window(100, 10, 20, 4) == (
+        slice(6, 24),
+        10,
+        20,
+    )
+    assert run_pose_estimation.get_frame_window(100, None, 200, 4) == (
+        slice(0, 100),
+        0,
+        100,
+    )
+    with pytest.raises(SystemExit):
+        run_pose_estimation.get_frame_window(100, 100)
+    assert "There are no frames from 100 to 100" in capsys.readouterr().out
+
+
+def test_multiple_videos_resume_keeps_existing_output(tmp_path, capsys):
+    batch_folder = tmp_path / "batch"
+    for trial in ["trial_a", "trial_b"]:
+        shutil.copytree(
+            "tests/test_json", batch_folder / trial / "output_json"
+        )
+    output_dir = str(tmp_path / "output")
+    multi_output_dir = run_pose_estimation.multi_name(output_dir, 0, None)
+
+    # trial_a's output directory already holds someone else's file
+    notes_path = f"{multi_output_dir}trial_a/my_notes.txt"
+    os.makedirs(os.path.dirname(notes_path))
+    with open(notes_path, "w") as f:
+        f.write("notes")
+
+    def run_batch():
+        with pytest.raises(SystemExit):
+            run_pose_estimation.multiple_videos(
+                output_dir,
+                None,
+                None,
+                f"{batch_folder}/",
+                None,
+                2,
+                False,
+                False,
+                0,
+                0,
+                0,
+                None,
+                None,
+                False,
+                None,
+                resume=True,
+            )
+        return capsys.readouterr().out
+
+    out = run_batch()
+    assert "1 succeeded, 1 failed" in out
+    assert "exists and is not empty" in out
+
+    # Resuming fails the trial again rather than removing the directory
+    out = run_batch()
+    assert "Removing previous output" not in out
+    assert "wasn't created by this batch" in out
+    assert "0 succeeded, 1 failed, 1 up to date." in out
+    with open(notes_path) as f:
+        assert f.read() == "notes"
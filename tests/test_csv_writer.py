@@ -0,0 +1,74 @@
+import os
+
+import pandas as pd
+import pytest
+
+from raga_pose_estimation.csv_writer import write_csv
+
+from . import three_frame_person_dfs
+
+
+@pytest.mark.parametrize(
+    "output_format,compression,module",
+    [
+        ("parquet", None, "pyarrow"),
+        ("parquet", "zstd", "pyarrow"),
+        ("feather", "zstd", "pyarrow"),
+        ("hdf5", None, "tables"),
+        ("hdf5", "zlib", "tables"),
+    ],
+)
+def test_write_columnar(
+    three_frame_person_dfs, tmp_path, output_format, compression, module
+):
+    pytest.importorskip(module)
+    person_df = three_frame_person_dfs[0].drop(index=1)
+    write_csv(
+        [person_df],
+        str(tmp_path),
+        "trial",
+        ["Performer"],
+        smoothed=True,
+        output_format=output_format,
+        compression=compression,
+    )
+
+    output_files = os.listdir(tmp_path)
+    assert len(output_files) == 1
+    assert output_files[0].startswith("smoothed_trial_Performer.")
+
+    # Columns, index and values are kept exactly
+    output_path = os.path.join(tmp_path, output_files[0])
+    read = {
+        "parquet": pd.read_parquet,
+        "feather": pd.read_feather,
+        "hdf5": pd.read_hdf,
+    }[output_format]
+    pd.testing.assert_frame_equal(read(output_path), person_df)
+
+
+def test_write_compressed_csv(three_frame_person_dfs, tmp_path):
+    write_csv(three_frame_person_dfs, str(tmp_path), compression="gzip")
+    assert os.listdir(tmp_path) == ["_person_0.csv.gz"]
+
+    person_df = pd.read_csv(
+        os.path.join(tmp_path, "_person_0.csv.gz"), header=[0, 1], index_col=0
+    )
+    assert list(person_df.columns) == list(three_frame_person_dfs[0].columns)
+
+
+def test_append_csv(three_frame_person_dfs, tmp_path):
+    person_df = three_frame_person_dfs[0]
+    write_csv([person_df], str(tmp_path))
+    with open(os.path.join(tmp_path, "_person_0.csv")) as f:
+        expected = f.read()
+    os.remove(os.path.join(tmp_path, "_person_0.csv"))
+
+    # Appending the frames one at a time gives the same file
+    for i in range(len(person_df)):
+        write_csv([person_df.iloc[i : i + 1]], str(tmp_path), append=True)
+    with open(os.path.join(tmp_path, "_person_0.csv")) as f:
+        assert f.read() == expected
+
+    with pytest.raises(ValueError):
+        write_csv([person_df], str(tmp_path), compression="gzip", append=True)
@@ -0,0 +1,46 @@
+import random
+import time
+
+import pytest
+
+from raga_pose_estimation.frame_pipeline import run_frame_pipeline
+
+
+def test_run_frame_pipeline():
+    def draw_frame(i, frame):
+        # Frames take different times to draw, so finish out of order
+        time.sleep(random.random() / 1000)
+        return (i, frame * 2)
+
+    written = []
+    run_frame_pipeline(range(200), draw_frame, written.append, 8)
+
+    # Frames are written in order
+    assert written == [(i, i * 2) for i in range(200)]
+
+
+def test_run_frame_pipeline_errors():
+    def frames():
+        yield from range(10)
+        raise ValueError("Not enough frames")
+
+    # Errors in any stage are raised by run_frame_pipeline
+    with pytest.raises(ValueError):
+        run_frame_pipeline(frames(), lambda i, frame: frame, [].append, 4)
+
+    def draw_frame(i, frame):
+        if i == 50:
+            raise RuntimeError("Drawing failed")
+        return frame
+
+    written = []
+    with pytest.raises(RuntimeError):
+        run_frame_pipeline(range(1000), draw_frame, written.append, 4)
+    assert written == list(range(len(written)))
+    assert len(written) <= 50
+
+    def write_frame(frame):
+        raise OSError("Disk full")
+
+    with pytest.raises(OSError):
+        run_frame_pipeline(range(1000), lambda i, frame: frame, write_frame)
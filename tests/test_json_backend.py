@@ -0,0 +1,70 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from raga_pose_estimation import json_backend
+from raga_pose_estimation.openpose_json_loader import (
+    list_json_files,
+    load_keypoints,
+)
+
+JSON_DIR = "example_files/example_3people/output_json"
+
+
+@pytest.fixture
+def restore_backend():
+    backend = json_backend.get_backend()
+    yield
+    json_backend.set_backend(backend)
+
+
+@pytest.mark.parametrize("backend", json_backend.available_backends())
+def test_json_backends(backend, restore_backend):
+    json_backend.set_backend(backend)
+    assert json_backend.get_backend() == backend
+
+    json_files = list_json_files(JSON_DIR)
+    for json_file in json_files[:5]:
+        filepath = os.path.join(JSON_DIR, json_file)
+        with open(filepath) as f:
+            expected = json.load(f)
+        assert json_backend.load(filepath) == expected
+
+        # The blocks asked for are the same whether read from a path or
+        # bytes
+        with open(filepath, "rb") as f:
+            data = f.read()
+        for people in [
+            json_backend.load_people(filepath),
+            json_backend.load_people(data),
+        ]:
+            assert [p["pose_keypoints_2d"] for p in people] == [
+                p["pose_keypoints_2d"] for p in expected["people"]
+            ]
+
+    # The keypoints are the same as with the json module
+    keypoints, person_counts = load_keypoints(JSON_DIR, dtype=np.float64)
+    json_backend.set_backend("json")
+    expected_keypoints, expected_counts = load_keypoints(
+        JSON_DIR, dtype=np.float64
+    )
+    np.testing.assert_array_equal(keypoints, expected_keypoints)
+    np.testing.assert_array_equal(person_counts, expected_counts)
+
+
+def test_set_backend_invalid(restore_backend):
+    assert json_backend.available_backends()[-1] == "json"
+    assert json_backend.set_backend() == json_backend.available_backends()[0]
+    with pytest.raises(ValueError, match="Unknown JSON backend"):
+        json_backend.set_backend("yaml")
+
+    missing = [
+        name
+        for name in json_backend.BACKENDS
+        if name not in json_backend.available_backends()
+    ]
+    if missing:
+        with pytest.raises(ValueError, match="not installed"):
+            json_backend.set_backend(missing[0])
@@ -0,0 +1,54 @@
+import os
+import threading
+
+import pytest
+
+from raga_pose_estimation.json_follower import follow_json_files
+
+
+def test_follow_json_files(tmp_path):
+    path_to_json = str(tmp_path / "json")
+    finished = threading.Event()
+    follower = follow_json_files(
+        path_to_json, finished.is_set, poll_interval=0.01
+    )
+
+    # The directory doesn't need to exist yet
+    os.makedirs(path_to_json)
+    for i in range(3):
+        with open(os.path.join(path_to_json, f"{i:012d}.json"), "w") as f:
+            f.write("{}")
+    assert next(follower) == [f"{i:012d}.json" for i in range(3)]
+
+    # Files which are still being written aren't yielded, and nor are any
+    # after them
+    with open(os.path.join(path_to_json, f"{3:012d}.json"), "w") as partial:
+        with open(os.path.join(path_to_json, f"{4:012d}.json"), "w") as f:
+            f.write("{}")
+        yielded = []
+        thread = threading.Thread(
+            target=lambda: yielded.append(next(follower))
+        )
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+        partial.write("{}")
+    thread.join()
+    assert yielded == [[f"{i:012d}.json" for i in (3, 4)]]
+
+    # Once finished, the remaining files are yielded straight away
+    with open(os.path.join(path_to_json, f"{5:012d}.json"), "w") as f:
+        f.write("{}")
+    finished.set()
+    assert list(follower) == [[f"{5:012d}.json"]]
+
+
+def test_follow_json_files_idle_timeout(tmp_path):
+    for i in range(3):
+        (tmp_path / f"{i:012d}.json").write_text("{}")
+    assert list(
+        follow_json_files(str(tmp_path), idle_timeout=0.05, poll_interval=0.01)
+    ) == [[f"{i:012d}.json" for i in range(3)]]
+
+    with pytest.raises(ValueError):
+        next(follow_json_files(str(tmp_path)))
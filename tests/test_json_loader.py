@@ -0,0 +1,203 @@
+import json
+import os
+import random
+import shutil
+import tarfile
+import zipfile
+
+import numpy as np
+import pytest
+
+from raga_pose_estimation.openpose_json_loader import (
+    crop_keypoints,
+    get_cache_path,
+    is_archive,
+    list_json_files,
+    load_keypoints,
+    pack_keypoints,
+)
+from raga_pose_estimation.openpose_json_parser import OpenPoseJsonParser
+from raga_pose_estimation.openpose_parts import OpenPoseParts
+
+JSON_DIR = "example_files/example_3people/output_json"
+
+
+def test_load_keypoints():
+    json_files = list_json_files(JSON_DIR)
+    assert json_files == sorted(json_files)
+
+    keypoints, person_counts = load_keypoints(JSON_DIR)
+    assert keypoints.dtype == np.float32
+    assert keypoints.shape == (len(json_files), 3, len(OpenPoseParts), 3)
+    assert person_counts.shape == (len(json_files),)
+
+    # Each frame should match the parser's DataFrame for that file
+    for i in [0, 93]:
+        parser = OpenPoseJsonParser(os.path.join(JSON_DIR, json_files[i]))
+        person_count = parser.get_person_count()
+        assert person_counts[i] == person_count
+
+        expected = parser.get_multiple_keypoints(list(range(person_count)))
+        actual = OpenPoseJsonParser.dataframe_from_keypoints(
+            keypoints[i, :person_count].astype(np.float64)
+        )
+        assert list(actual.columns) == list(expected.columns)
+        np.testing.assert_allclose(actual, expected, rtol=1e-6)
+
+
+def test_load_keypoints_number_of_people():
+    keypoints, person_counts = load_keypoints(
+        JSON_DIR, number_of_people=2, dtype=np.float64
+    )
+    assert keypoints.dtype == np.float64
+    assert keypoints.shape[1] == 2
+    assert person_counts.max() == 2
+
+    # Undetected parts are NaN rather than 0
+    assert not (keypoints == 0).all(axis=-1).any()
+    assert np.isnan(keypoints).any()
+
+
+def test_load_keypoints_parallel():
+    serial_keypoints, serial_counts = load_keypoints(JSON_DIR)
+
+    # Results are joined back in frame order however the files are split
+    for jobs in [2, 3]:
+        keypoints, person_counts = load_keypoints(JSON_DIR, jobs=jobs)
+        np.testing.assert_array_equal(keypoints, serial_keypoints)
+        np.testing.assert_array_equal(person_counts, serial_counts)
+
+
+def test_load_keypoints_cache(tmp_path, capsys):
+    json_dir = tmp_path / "output_json"
+    shutil.copytree("tests/test_json", json_dir)
+    cache_path = get_cache_path(str(json_dir), str(tmp_path / "cache"))
+
+    # Cold run parses the files and writes the cache
+    keypoints, person_counts = load_keypoints(
+        str(json_dir), 2, cache_path=cache_path
+    )
+    assert os.path.isfile(cache_path)
+    assert "Using cached keypoints" not in capsys.readouterr().out
+    expected_keypoints, expected_counts = load_keypoints(str(json_dir), 2)
+    np.testing.assert_array_equal(keypoints, expected_keypoints)
+    np.testing.assert_array_equal(person_counts, expected_counts)
+
+    # Warm run reads the cache, whatever the number of people
+    for number_of_people in [1, 2]:
+        keypoints, person_counts = load_keypoints(
+            str(json_dir), number_of_people, cache_path=cache_path
+        )
+        assert "Using cached keypoints" in capsys.readouterr().out
+        expected_keypoints, expected_counts = load_keypoints(
+            str(json_dir), number_of_people
+        )
+        np.testing.assert_array_equal(keypoints, expected_keypoints)
+        np.testing.assert_array_equal(person_counts, expected_counts)
+
+    # Rewriting a file invalidates the cache
+    first_file = json_dir / list_json_files(str(json_dir))[0]
+    with open(first_file) as f:
+        data = json.load(f)
+    data["people"] = data["people"][:1]
+    with open(first_file, "w") as f:
+        json.dump(data, f)
+
+    keypoints, person_counts = load_keypoints(
+        str(json_dir), 2, cache_path=cache_path
+    )
+    assert "Using cached keypoints" not in capsys.readouterr().out
+    assert person_counts[0] == 1
+
+
+@pytest.mark.parametrize("extension", [".tar", ".tar.gz", ".zip"])
+def test_load_keypoints_archive(tmp_path, capsys, extension):
+    # Archive the files in a random order, inside a directory
+    json_files = list_json_files(JSON_DIR)
+    archive_path = str(tmp_path / f"output_json{extension}")
+    names = [f"output_json/{f}" for f in json_files]
+    shuffled = random.Random(0).sample(range(len(json_files)), len(names))
+    if extension == ".zip":
+        with zipfile.ZipFile(archive_path, "w") as archive:
+            for i in shuffled:
+                archive.write(os.path.join(JSON_DIR, json_files[i]), names[i])
+    else:
+        mode = "w:gz" if extension == ".tar.gz" else "w"
+        with tarfile.open(archive_path, mode) as archive:
+            for i in shuffled:
+                archive.add(os.path.join(JSON_DIR, json_files[i]), names[i])
+
+    assert is_archive(archive_path)
+    assert not is_archive(JSON_DIR)
+    assert list_json_files(archive_path) == names
+
+    # The frames are loaded in order, as from the directory
+    expected = load_keypoints(JSON_DIR)
+    for jobs in [1, 3]:
+        keypoints, person_counts = load_keypoints(archive_path, jobs=jobs)
+        np.testing.assert_array_equal(keypoints, expected[0])
+        np.testing.assert_array_equal(person_counts, expected[1])
+
+    # Packing the archive gives the same keypoints too
+    store_path = str(tmp_path / "output_json.kps")
+    pack_keypoints(archive_path, store_path, jobs=2)
+    keypoints, person_counts = load_keypoints(store_path)
+    np.testing.assert_array_equal(keypoints, expected[0])
+    np.testing.assert_array_equal(person_counts, expected[1])
+
+    with pytest.raises(KeyError):
+        load_keypoints(archive_path, json_files=names[:2] + ["missing.json"])
+
+    cache_path = get_cache_path(archive_path)
+    load_keypoints(archive_path, cache_path=cache_path)
+    keypoints, _ = load_keypoints(archive_path, cache_path=cache_path)
+    assert "Using cached keypoints" in capsys.readouterr().out
+    np.testing.assert_array_equal(keypoints, expected[0])
+
+
+def test_get_cache_path():
+    path_to_json = os.path.abspath("tests/test_json")
+    assert get_cache_path(path_to_json) == os.path.abspath(
+        "tests/.test_json_keypoints.npz"
+    )
+
+    cache_path = get_cache_path(path_to_json, "cache")
+    assert os.path.dirname(cache_path) == "cache"
+    assert cache_path != get_cache_path("other/test_json", "cache")
+
+
+def test_crop_keypoints():
+    keypoints = np.full((2, 3, 2, 3), np.nan)
+    # Frame 0: person 0 is outside the rectangle, person 1 is half inside
+    # and person 2 is inside
+    keypoints[0, 0] = [[10, 10, 0.5], [20, 20, 0.5]]
+    keypoints[0, 1] = [[110, 60, 0.6], [300, 60, 0.6]]
+    keypoints[0, 2] = [[150, 100, 0.7], [199, 149, 0.7]]
+    # Frame 1: a single person, inside the rectangle
+    keypoints[1, 0] = [[100, 50, 0.8], [120, 70, 0.8]]
+    person_counts = np.array([3, 1])
+
+    cropped, cropped_counts = crop_keypoints(
+        keypoints, person_counts, (100, 100, 100, 50)
+    )
+
+    # Positions are relative to the rectangle, the parts outside it are NaN
+    # and people outside it are removed
+    assert cropped_counts.tolist() == [2, 1]
+    assert cropped.shape == (2, 2, 2, 3)
+    np.testing.assert_array_equal(
+        cropped[0, 0], [[10, 10, 0.6], [np.nan, np.nan, np.nan]]
+    )
+    np.testing.assert_array_equal(
+        cropped[0, 1], [[50, 50, 0.7], [99, 99, 0.7]]
+    )
+    np.testing.assert_array_equal(cropped[1, 0], [[0, 0, 0.8], [20, 20, 0.8]])
+    assert np.isnan(cropped[1, 1]).all()
+
+    # The keypoints passed in aren't changed
+    assert keypoints[0, 1, 0, 0] == 110
+
+    with pytest.raises(ValueError):
+        crop_keypoints(keypoints, person_counts, (0, 100, 100, 50))
+    with pytest.raises(ValueError):
+        crop_keypoints(keypoints, person_counts, (100, 100, -1, 50))
@@ -0,0 +1,54 @@
+import numpy as np
+
+from raga_pose_estimation.keypoint_sorter import (
+    get_x_position_order,
+    sort_dataframe_by_x_position,
+    sort_keypoints_by_x_position,
+)
+from raga_pose_estimation.openpose_json_loader import load_keypoints
+from raga_pose_estimation.openpose_json_parser import OpenPoseJsonParser
+
+
+def test_sort_keypoints_by_x_position():
+    keypoints, person_counts = load_keypoints(
+        "example_files/example_3people/output_json", dtype=np.float64
+    )
+    sorted_keypoints = sort_keypoints_by_x_position(keypoints)
+    assert sorted_keypoints.shape == keypoints.shape
+
+    # Sorting the whole recording gives the same result as sorting each frame
+    for i in [0, 93]:
+        np.testing.assert_array_equal(
+            sorted_keypoints[i], sort_keypoints_by_x_position(keypoints[i])
+        )
+
+        # and as sorting the frame's DataFrame
+        person_count = person_counts[i]
+        df = OpenPoseJsonParser.dataframe_from_keypoints(
+            keypoints[i, :person_count]
+        )
+        sorted_df = sort_dataframe_by_x_position(df)
+        assert list(sorted_df.columns) == list(df.columns)
+        np.testing.assert_array_equal(
+            sorted_df,
+            OpenPoseJsonParser.dataframe_from_keypoints(
+                sorted_keypoints[i, :person_count]
+            ),
+        )
+
+    # Mean x positions are in ascending order in every frame
+    mean_x = np.nanmean(sorted_keypoints[:, :, :, 0], axis=-1)
+    for frame_mean_x, person_count in zip(mean_x, person_counts):
+        assert (np.diff(frame_mean_x[:person_count]) >= 0).all()
+
+
+def test_get_x_position_order():
+    keypoints = np.full((4, 2, 3), np.nan)
+    keypoints[0, :, 0] = [5, 7]
+    keypoints[1, 0, 0] = 1  # only one part found
+    keypoints[3, :, 0] = [2, 3]
+
+    # People with no keypoints go last, in their original order
+    np.testing.assert_array_equal(
+        get_x_position_order(keypoints), [1, 3, 0, 2]
+    )
@@ -0,0 +1,108 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from raga_pose_estimation.keypoint_store import (
+    KeypointStore,
+    is_keypoint_store,
+)
+from raga_pose_estimation.openpose_json_loader import (
+    list_json_files,
+    load_keypoints,
+    pack_keypoints,
+)
+
+JSON_DIR = "example_files/example_3people/output_json"
+
+
+def test_pack_keypoints(tmp_path):
+    store_path = str(tmp_path / "output_json.kps")
+    store = pack_keypoints(
+        JSON_DIR,
+        store_path,
+        ["pose_keypoints_2d", "hand_left_keypoints_2d"],
+        dtype=np.float64,
+        jobs=2,
+    )
+    assert is_keypoint_store(store_path)
+    assert not is_keypoint_store(JSON_DIR)
+
+    json_files = list_json_files(JSON_DIR)
+    assert list_json_files(store_path) == json_files
+    assert len(store) == len(json_files)
+    np.testing.assert_array_equal(store.frame_numbers, range(len(store)))
+    assert store.blocks == ["pose_keypoints_2d", "hand_left_keypoints_2d"]
+
+    # Loading the store gives the same keypoints as loading the json files
+    for number_of_people in [None, 2]:
+        expected = load_keypoints(JSON_DIR, number_of_people)
+        keypoints, person_counts = load_keypoints(store_path, number_of_people)
+        assert keypoints.dtype == np.float32
+        np.testing.assert_array_equal(keypoints, expected[0])
+        np.testing.assert_array_equal(person_counts, expected[1])
+
+    expected, _ = load_keypoints(
+        JSON_DIR, None, json_files[40:50], dtype=np.float64
+    )
+    keypoints, _ = load_keypoints(
+        store_path, None, json_files[40:50], dtype=np.float64
+    )
+    np.testing.assert_array_equal(keypoints, expected)
+
+    # A range of frames is read straight from the file
+    keypoints = store.keypoints(start=40, stop=50)
+    assert keypoints.shape == (10, store.records.shape[1], 25, 3)
+    assert np.shares_memory(keypoints, store.records)
+    np.testing.assert_array_equal(keypoints, expected)
+
+    # OpenPose didn't detect hands, so they are all NaN
+    assert np.isnan(store.keypoints("hand_left_keypoints_2d")).all()
+    with pytest.raises(KeyError):
+        store.keypoints("face_keypoints_2d")
+
+
+def test_pack_keypoints_blocks(tmp_path):
+    json_dir = tmp_path / "json"
+    json_dir.mkdir()
+    face = np.arange(1, 211, dtype=float)
+    face[3:6] = 0
+    people = [
+        {
+            "pose_keypoints_2d": [1.0] * 75,
+            "pose_keypoints_3d": [2.0] * 100,
+            "face_keypoints_2d": list(face),
+        },
+        {"pose_keypoints_2d": [3.0] * 75},
+    ]
+    for frame, n_people in [(5, 2), (6, 0), (8, 1)]:
+        with open(json_dir / f"video_{frame:012d}_keypoints.json", "w") as f:
+            json.dump({"people": people[:n_people]}, f)
+
+    store = pack_keypoints(
+        str(json_dir),
+        str(tmp_path / "store.kps"),
+        ["pose_keypoints_3d", "face_keypoints_2d"],
+    )
+    store = KeypointStore(str(tmp_path / "store.kps"))
+    np.testing.assert_array_equal(store.frame_numbers, [5, 6, 8])
+    np.testing.assert_array_equal(store.person_counts, [2, 0, 1])
+    assert store.records.shape == (3, 2, 100 + 210)
+    assert store.records.dtype == np.float32
+
+    pose_3d = store.keypoints("pose_keypoints_3d")
+    assert pose_3d.shape == (3, 2, 25, 4)
+    assert (pose_3d[[0, 2], 0] == 2).all()
+    assert np.isnan(pose_3d[0, 1]).all()
+    assert np.isnan(pose_3d[1]).all()
+
+    # Parts which weren't detected are NaN
+    face_keypoints = store.keypoints("face_keypoints_2d")
+    assert np.isnan(face_keypoints[0, 0, 1]).all()
+    face[3:6] = np.nan
+    np.testing.assert_array_equal(face_keypoints[0, 0], face.reshape(70, 3))
+
+    with pytest.raises(ValueError):
+        pack_keypoints(str(json_dir), str(tmp_path / "x.kps"), ["hands"])
+    assert not os.path.exists(tmp_path / "x.kps")
@@ -0,0 +1,79 @@
+import json
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from raga_pose_estimation.openpose_json_loader import list_json_files
+from raga_pose_estimation.openpose_segments import (
+    get_segments,
+    merge_json_segments,
+    run_openpose_segments,
+)
+
+FAKE_OPENPOSE_DIR = os.path.join(os.path.dirname(__file__), "fake_openpose")
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "video.mp4")
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 25, (32, 32))
+    for i in range(23):
+        out.write(np.full((32, 32, 3), i, np.uint8))
+    out.release()
+    return path
+
+
+def test_get_segments():
+    assert get_segments(10, 3) == [(0, 3), (4, 6), (7, None)]
+    assert get_segments(10, 1) == [(0, None)]
+
+    # No empty segments
+    assert get_segments(2, 4) == [(0, 0), (1, None)]
+    assert get_segments(0, 4) == [(0, None)]
+
+
+def test_merge_json_segments(tmp_path):
+    # Segments numbered from their own first frame are renumbered in order
+    segment_dirs = []
+    for segment in range(3):
+        segment_dir = tmp_path / f"segment_{segment}"
+        segment_dir.mkdir()
+        for frame in range(segment + 1):
+            (segment_dir / f"video_{frame:012d}_keypoints.json").write_text(
+                f"{segment}, {frame}"
+            )
+        segment_dirs.append(str(segment_dir))
+
+    path_to_json = str(tmp_path / "json")
+    assert merge_json_segments(segment_dirs, path_to_json, "video") == 6
+    json_files = list_json_files(path_to_json)
+    assert json_files == [f"video_{i:012d}_keypoints.json" for i in range(6)]
+    contents = [open(os.path.join(path_to_json, f)).read() for f in json_files]
+    assert contents == ["0, 0", "1, 0", "1, 1", "2, 0", "2, 1", "2, 2"]
+
+
+def test_run_openpose_segments(tmp_path, video):
+    path_to_json = str(tmp_path / "json")
+    run_openpose_segments(FAKE_OPENPOSE_DIR, video, path_to_json, None, 4)
+
+    # The json files are the same as from a single run over the video
+    json_files = list_json_files(path_to_json)
+    assert json_files == [f"video_{i:012d}_keypoints.json" for i in range(23)]
+    for i, json_file in enumerate(json_files):
+        with open(os.path.join(path_to_json, json_file)) as f:
+            people = json.load(f)["people"]
+        assert people[0]["pose_keypoints_2d"][0] == i
+    assert not os.path.exists(f"{path_to_json}_segments")
+
+
+def test_run_openpose_segments_invalid(tmp_path):
+    with pytest.raises(RuntimeError):
+        run_openpose_segments(
+            FAKE_OPENPOSE_DIR,
+            str(tmp_path / "missing.mp4"),
+            str(tmp_path / "json"),
+            None,
+            2,
+        )
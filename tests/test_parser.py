@@ -1,10 +1,44 @@
+import filecmp
+import os
+
+import numpy as np
 import pandas as pd
+import pytest
 
-from raga_pose_estimation.openpose_json_parser import OpenPoseJsonParser
+from raga_pose_estimation.csv_writer import write_csv
+from raga_pose_estimation.openpose_json_loader import (
+    list_json_files,
+    load_keypoints,
+)
+from raga_pose_estimation.openpose_json_parser import (
+    OpenPoseJsonParser,
+    apply_confidence_threshold,
+)
 from raga_pose_estimation.openpose_parts import (
     OpenPoseParts,
     OpenPosePartGroups,
 )
+from raga_pose_estimation.reshaper import (
+    reshape_dataframes,
+    reshape_keypoints,
+)
+
+# Recording with people who overlap, so that replacing low confidence
+# keypoints often changes their left-to-right order
+OVERLAPPING_JSON_DIR = "tests/test_json_overlapping"
+
+# CSVs written from OVERLAPPING_JSON_DIR by run_pose_estimation.py before
+# apply_confidence_threshold was added, when each frame was parsed with
+# OpenPoseJsonParser, with the options in the directory name
+OVERLAPPING_CSV_DIR = "tests/test_csv_overlapping"
+
+THRESHOLD_OPTIONS = [
+    (3, 1.0, None),
+    (4, 0.9, None),
+    (3, 0.8, ["RWrist", "LWrist", "Nose"]),
+    (2, 0.7, ["LEye", "REye"]),
+    (1, 0.3, ["LEye", "Nose", "REye"]),
+]
 
 
 def test_parser():
@@ -61,3 +95,153 @@ def test_parser():
         [0, 1], None, 0.7, sorted_person_keypoints
     )
     assert sorted_person_keypoints.equals(sorted_person_keypoints2)
+
+
+def assert_csvs_match(
+    person_dfs, output_dir, number_of_people, threshold, body_parts
+):
+    """Writes person_dfs to CSVs in output_dir and checks that they are the
+    same as those in OVERLAPPING_CSV_DIR for the given options."""
+    name = "_".join(
+        [f"n{number_of_people}", f"c{threshold}"] + (body_parts or [])
+    )
+    expected_dir = os.path.join(OVERLAPPING_CSV_DIR, name)
+    write_csv(person_dfs, str(output_dir))
+    filenames = sorted(os.listdir(expected_dir))
+    assert sorted(os.listdir(output_dir)) == filenames
+    for filename in filenames:
+        assert filecmp.cmp(
+            os.path.join(output_dir, filename),
+            os.path.join(expected_dir, filename),
+            shallow=False,
+        ), filename
+
+
+@pytest.mark.parametrize(
+    "number_of_people, threshold, body_parts", THRESHOLD_OPTIONS
+)
+def test_get_multiple_keypoints_confidence_threshold(
+    tmp_path, number_of_people, threshold, body_parts
+):
+    parts = [OpenPoseParts(part) for part in body_parts or []] or None
+    frame_dfs = []
+    previous_df = None
+    for filename in list_json_files(OVERLAPPING_JSON_DIR):
+        parser = OpenPoseJsonParser(
+            os.path.join(OVERLAPPING_JSON_DIR, filename)
+        )
+        df = parser.get_multiple_keypoints(
+            list(range(number_of_people)), parts, threshold, previous_df
+        )
+        df = parser.sort_persons_by_x_position(df)
+        frame_dfs.append(df)
+        if df.shape[1] // 3 == number_of_people:
+            previous_df = df
+
+    assert_csvs_match(
+        reshape_dataframes(frame_dfs),
+        tmp_path,
+        number_of_people,
+        threshold,
+        body_parts,
+    )
+
+
+@pytest.mark.parametrize(
+    "number_of_people, threshold, body_parts", THRESHOLD_OPTIONS
+)
+def test_apply_confidence_threshold(
+    tmp_path, number_of_people, threshold, body_parts
+):
+    parts = [OpenPoseParts(part) for part in body_parts or []] or None
+    part_indices = None
+    if parts:
+        part_indices = [list(OpenPoseParts).index(part) for part in parts]
+    keypoints, person_counts = load_keypoints(
+        OVERLAPPING_JSON_DIR, number_of_people, dtype=np.float64
+    )
+
+    result = apply_confidence_threshold(
+        keypoints, person_counts, number_of_people, threshold, part_indices
+    )
+
+    assert_csvs_match(
+        reshape_keypoints(result[:, : person_counts[0]], parts),
+        tmp_path,
+        number_of_people,
+        threshold,
+        body_parts,
+    )
+    np.testing.assert_array_equal(
+        keypoints,
+        load_keypoints(
+            OVERLAPPING_JSON_DIR, number_of_people, dtype=np.float64
+        )[0],
+    )
+
+
+def pad_parts(keypoints):
+    """Pads keypoints of the first few parts with NaN for the other parts."""
+    padded = np.full(keypoints.shape[:2] + (len(OpenPoseParts), 3), np.nan)
+    padded[:, :, : keypoints.shape[2]] = keypoints
+    return padded
+
+
+def test_apply_confidence_threshold_reorders_people():
+    # x, y, confidence of two parts of two people in three frames
+    keypoints = np.array(
+        [
+            [[[0, 0, 0.9], [30, 0, 0.9]], [[20, 0, 0.9], [20, 0, 0.9]]],
+            # Carrying the right part of the first person forward moves them
+            # to the right of the second person
+            [[[10, 0, 0.9], [5, 0, 0.1]], [[12, 0, 0.9], [12, 0, 0.9]]],
+            # So these low confidence parts are replaced by the other person
+            [[[11, 0, 0.2], [11, 0, 0.9]], [[13, 0, 0.2], [31, 0, 0.9]]],
+        ]
+    )
+    person_counts = np.array([2, 2, 2])
+
+    result = apply_confidence_threshold(
+        pad_parts(keypoints), person_counts, 2, 0.5, [0, 1]
+    )
+
+    assert result.shape == (3, 2, 2, 3)
+    np.testing.assert_array_equal(result[0, :, :, 0], [[0, 30], [20, 20]])
+    np.testing.assert_array_equal(result[1, :, :, 0], [[12, 12], [10, 30]])
+    np.testing.assert_array_equal(result[2, :, :, 0], [[12, 11], [10, 31]])
+
+
+def test_apply_confidence_threshold_reorders_people_within_frame():
+    keypoints = np.array(
+        [
+            [[[100, 0, 0.9], [0, 0, 0.9]], [[60, 0, 0.9], [60, 0, 0.9]]],
+            # Carrying the first part of the first person forward moves them
+            # to the right of the second person, so their second part is
+            # compared with the second person's in the first frame
+            [[[0, 0, 0.1], [40, 0, 0.1]], [[45, 0, 0.9], [45, 0, 0.9]]],
+        ]
+    )
+
+    result = apply_confidence_threshold(
+        pad_parts(keypoints), np.array([2, 2]), 2, 0.5, [0, 1]
+    )
+
+    np.testing.assert_array_equal(result[1, :, :, 0], [[45, 45], [100, 60]])
+
+
+def test_apply_confidence_threshold_sorts_on_all_parts():
+    # Two people who are the other way round if only the nose is counted
+    keypoints = np.full((2, 2, len(OpenPoseParts), 3), 0.9)
+    keypoints[:, 0, :, 0] = 100
+    keypoints[:, 1, :, 0] = 50
+    keypoints[:, :, 0, 0] = [[10, 20], [11, 21]]
+    keypoints[1, 0, 0, 2] = 0.1
+
+    result = apply_confidence_threshold(
+        keypoints, np.array([2, 2]), 2, 0.5, [0]
+    )
+
+    # The low confidence nose is replaced by that of the person on the
+    # right in the first frame, who was on the left by nose
+    assert result.shape == (2, 2, 1, 3)
+    np.testing.assert_array_equal(result[..., 0], [[[10], [20]], [[20], [21]]])
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from raga_pose_estimation import reshaper, reshaper_3d
+from raga_pose_estimation.openpose_json_parser import OpenPoseJsonParser
+from raga_pose_estimation.openpose_parts import OpenPosePartGroups
+
+
+def _get_dummy_keypoints(n_values):
+    rng = np.random.default_rng(0)
+    parts = OpenPosePartGroups.UPPER_BODY_PARTS
+    keypoints = rng.random((20, 2, len(parts), n_values))
+    keypoints[3, 0, 1] = np.nan  # missing part
+    keypoints[5, 1] = np.nan  # missing person
+    return keypoints, parts
+
+
+def _get_frame_dataframes(keypoints, parts, column_names):
+    return [
+        pd.DataFrame(
+            np.transpose(frame_keypoints, (1, 0, 2)).reshape(len(parts), -1),
+            index=[p.value for p in parts],
+            columns=[
+                c + str(i)
+                for i in range(keypoints.shape[1])
+                for c in column_names
+            ],
+        )
+        for frame_keypoints in keypoints
+    ]
+
+
+def test_reshape_keypoints():
+    keypoints, parts = _get_dummy_keypoints(3)
+    person_dfs = reshaper.reshape_keypoints(keypoints, parts)
+    expected_person_dfs = reshaper.reshape_dataframes(
+        _get_frame_dataframes(
+            keypoints, parts, OpenPoseJsonParser.COLUMN_NAMES
+        )
+    )
+
+    assert len(person_dfs) == 2
+    for person_df, expected_person_df in zip(person_dfs, expected_person_dfs):
+        pd.testing.assert_frame_equal(person_df, expected_person_df)
+
+    # Frames without the person are left out
+    assert 5 in person_dfs[0].index
+    assert 5 not in person_dfs[1].index
+
+
+def test_reshape_keypoints_3d():
+    keypoints, parts = _get_dummy_keypoints(4)
+    person_dfs = reshaper_3d.reshape_keypoints(keypoints, parts)
+    expected_person_dfs = reshaper_3d.reshape_dataframes(
+        _get_frame_dataframes(keypoints, parts, ["x", "y", "z", "confidence"])
+    )
+
+    for person_df, expected_person_df in zip(person_dfs, expected_person_dfs):
+        pd.testing.assert_frame_equal(person_df, expected_person_df)
+    variables = person_dfs[0].columns.get_level_values("Variable")
+    assert list(variables[:4]) == ["x", "y", "z", "c"]
@@ -1,8 +1,11 @@
 import numpy as np
 import pandas as pd
 
-from raga_pose_estimation.reshaper import reshape_dataframes
-from raga_pose_estimation.smoother import Smoother
+from raga_pose_estimation.reshaper import (
+    reshape_dataframes,
+    reshape_keypoints,
+)
+from raga_pose_estimation.smoother import Smoother, StreamingSmoother
 from raga_pose_estimation.openpose_json_parser import OpenPoseJsonParser
 from raga_pose_estimation.openpose_parts import OpenPoseParts
 
@@ -110,3 +113,99 @@ def test_chunk_and_smooth(dummy_dataframes):
             assert row["x"] >= 10 and row["x"] <= 15
             assert row["y"] >= 4 and row["y"] <= 5
             assert row["c"] >= 0.8 and row["c"] <= 0.9
+
+
+def test_smooth_matches_chunk_and_smooth_col():
+    rng = np.random.default_rng(0)
+    values = rng.random((500, 6)) * 100
+    # Gaps of various lengths, including some at the start and the end
+    missing = rng.random(500) < 0.1
+    missing[:3] = missing[-2:] = True
+    values[missing, :3] = np.nan
+    values[250:260, 3:] = np.nan
+    person_df = pd.DataFrame(
+        values,
+        columns=pd.MultiIndex.from_product(
+            [["LEar", "Nose"], ["x", "y", "c"]],
+            names=["Body Part", "Variable"],
+        ),
+    )
+
+    smoother = Smoother(11, 2)
+    smoothed_df = smoother.smooth([person_df])[0]
+    for part in ["LEar", "Nose"]:
+        nan_indices = np.where(person_df[part]["x"].isna())[0]
+        for variable in ["x", "y", "c"]:
+            expected = smoother._chunk_and_smooth_col(
+                person_df[part][variable], nan_indices
+            )
+            np.testing.assert_allclose(
+                smoothed_df[part][variable], expected, rtol=1e-12
+            )
+
+
+def test_smooth_with_missing_frames():
+    # Frames 8 and 9 were left out of the index (as reshape_keypoints does
+    # when the person isn't detected), and the ear is missing in frames 3, 4.
+    # The values are quadratic in the row, so smoothing reproduces them.
+    frames = [0, 1, 2, 3, 4, 5, 6, 7, 10, 11, 12, 13, 14, 15, 16, 17]
+    rows = np.arange(len(frames))
+    values = np.column_stack([rows**2 / 10, 3 * rows + 1, np.full(16, 0.5)])
+    ear_values = values.copy()
+    ear_values[3:5] = np.nan
+    person_df = pd.DataFrame(
+        np.hstack([ear_values, values]),
+        index=frames,
+        columns=pd.MultiIndex.from_product(
+            [["LEar", "Nose"], ["x", "y", "c"]],
+            names=["Body Part", "Variable"],
+        ),
+    )
+
+    smoothed_df = Smoother(5, 2).smooth([person_df])[0]
+
+    # Each frame keeps its own values, rather than those of the row with
+    # the same position (which left the last two frames NaN)
+    assert list(smoothed_df.index) == frames
+    np.testing.assert_allclose(
+        smoothed_df.loc[[10, 11, 16, 17], "LEar"],
+        [[6.4, 25, 0.5], [8.1, 28, 0.5], [19.6, 43, 0.5], [22.5, 46, 0.5]],
+    )
+    np.testing.assert_allclose(smoothed_df, person_df, atol=1e-12)
+
+
+def test_streaming_smoother():
+    rng = np.random.default_rng(0)
+    keypoints = rng.random((300, 2, 4, 3)) * 100
+    keypoints[rng.random((300, 2, 4)) < 0.1] = np.nan
+    keypoints[:, 0, 0][100:200:3] = np.nan  # lots of short runs
+    keypoints[-4:, 0, 1] = np.nan
+
+    smoother = StreamingSmoother(11, 2)
+    assert smoother.latency == 10
+
+    # Push the frames in blocks of different sizes
+    smoothed_frames = []
+    n_pushed = 0
+    for block in np.array_split(keypoints, [1, 5, 6, 50, 51, 120]):
+        smoothed_frames.append(smoother.push(block))
+        n_pushed += len(block)
+        # Frames come out after a fixed latency
+        n_smoothed = sum(map(len, smoothed_frames))
+        assert n_smoothed == max(0, n_pushed - smoother.latency)
+
+    # The buffer doesn't grow with the recording
+    assert len(smoother._buffer) == 2 * smoother.smoothing_window - 1
+
+    smoothed_frames.append(smoother.flush())
+    smoothed_keypoints = np.concatenate(smoothed_frames)
+    assert smoothed_keypoints.shape == keypoints.shape
+
+    # Results are the same as smoothing the whole recording
+    parts = list(OpenPoseParts)[:4]
+    expected_person_dfs = Smoother(11, 2).smooth(
+        reshape_keypoints(keypoints, parts)
+    )
+    person_dfs = reshape_keypoints(smoothed_keypoints, parts)
+    for person_df, expected_person_df in zip(person_dfs, expected_person_dfs):
+        np.testing.assert_allclose(person_df, expected_person_df)
@@ -0,0 +1,74 @@
+import os
+import subprocess
+
+import cv2
+import numpy as np
+import pytest
+
+from raga_pose_estimation.audio_combiner import has_audio
+from raga_pose_estimation.video_writer import (
+    FFmpegVideoWriter,
+    ffmpeg_available,
+)
+
+pytestmark = pytest.mark.skipif(
+    not ffmpeg_available(), reason="ffmpeg is not installed"
+)
+
+
+@pytest.fixture
+def video_with_audio(tmp_path):
+    path = str(tmp_path / "input.mp4")
+    subprocess.run(
+        [
+            "ffmpeg",
+            "-loglevel",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=size=64x48:rate=25",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=frequency=440",
+            "-t",
+            "1",
+            path,
+        ],
+        check=True,
+    )
+    return path
+
+
+def test_ffmpeg_video_writer(tmp_path, video_with_audio):
+    filename = str(tmp_path / "output.mp4")
+    out = FFmpegVideoWriter(
+        filename, 25, (64, 48), audio_source=video_with_audio
+    )
+    for i in range(10):
+        out.write(np.full((48, 64, 3), i * 20, np.uint8))
+    out.release()
+
+    # The frames and the audio are written to the same file
+    cap = cv2.VideoCapture(filename)
+    assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 10
+    assert (cap.get(3), cap.get(4)) == (64, 48)
+    cap.release()
+    assert has_audio(filename)
+
+
+def test_ffmpeg_video_writer_invalid(tmp_path):
+    out = FFmpegVideoWriter(str(tmp_path / "output.mp4"), 25, (64, 48))
+    with pytest.raises(ValueError):
+        out.write(np.zeros((64, 48, 3), np.uint8))
+    out.release()
+
+    # ffmpeg can't write to a directory which doesn't exist
+    out = FFmpegVideoWriter(
+        os.path.join(str(tmp_path), "missing", "output.mp4"), 25, (64, 48)
+    )
+    with pytest.raises(RuntimeError):
+        for i in range(100):
+            out.write(np.zeros((48, 64, 3), np.uint8))
+        out.release()
@@ -1,12 +1,17 @@
 import math
 import os
 
+import cv2
 import numpy as np
 import pandas as pd
 import pytest
 
 from raga_pose_estimation.openpose_parts import OpenPoseParts
-from raga_pose_estimation.visualizer import Visualizer
+from raga_pose_estimation.visualizer import (
+    CanvasPool,
+    SkeletonArrays,
+    Visualizer,
+)
 from . import single_frame_person_df, three_frame_person_dfs
 
 
@@ -112,3 +117,138 @@ def test_draw_lines(single_frame_person_df):
     # Random pixels away from the points should be black
     for (x, y) in [(0, 0), (9, 0), (19, 0), (0, 3), (9, 3), (19, 9)]:
         assert img[y, x].tolist() == [1, 1, 1]
+
+
+def test_skeleton_arrays(three_frame_person_dfs):
+    skeletons = SkeletonArrays(three_frame_person_dfs, Visualizer.LINE_PATHS)
+
+    assert skeletons.parts == ["REar", "REye"]
+    assert skeletons.points.shape == (3, 1, 2, 2)
+    assert skeletons.points[:, 0].tolist() == [
+        [[2, 8], [15, 5]],
+        [[3, 5], [10, 4]],
+        [[4, 4], [0, 0]],
+    ]
+    assert skeletons.valid[:, 0].tolist() == [
+        [True, True],
+        [True, True],
+        [True, False],
+    ]
+    assert skeletons.colors == [Visualizer.R_COLOR, Visualizer.R_COLOR]
+    assert [indices.tolist() for indices in skeletons.path_indices] == [
+        [],
+        [1, 0],
+        [],
+        [],
+        [],
+        [],
+        [],
+        [],
+        [],
+    ]
+
+    # Drawing a frame gives the same image as drawing from the DataFrames
+    viz = Visualizer("output")
+    for i in range(3):
+        img = np.ones((10, 20, 3), np.uint8)
+        skeletons.draw_lines(img, i)
+        skeletons.draw_points(img, i)
+
+        expected_img = np.ones((10, 20, 3), np.uint8)
+        viz.draw_lines(
+            expected_img, three_frame_person_dfs, i, viz.LINE_PATHS
+        )
+        viz.draw_points(expected_img, three_frame_person_dfs, i)
+        assert (img == expected_img).all()
+
+
+def test_create_videos(tmp_path, three_frame_person_dfs):
+    # Create a video to overlay
+    video_path = str(tmp_path / "input.mp4")
+    fourcc = cv2.VideoWriter_fourcc("m", "p", "4", "v")
+    out = cv2.VideoWriter(video_path, fourcc, 25, (20, 10))
+    for i in range(3):
+        out.write(np.full((10, 20, 3), i * 50, np.uint8))
+    out.release()
+
+    viz = Visualizer(str(tmp_path / "separate"))
+    expected_filenames = [
+        viz.create_video_from_dataframes(
+            "test",
+            three_frame_person_dfs,
+            20,
+            10,
+            video_path,
+            create_overlay=create_overlay,
+            video_to_overlay=video_path,
+        )
+        for create_overlay in (False, True)
+    ]
+
+    # Creating both videos in one pass gives the same videos
+    viz = Visualizer(str(tmp_path / "together"))
+    filenames = viz.create_videos_from_dataframes(
+        "test",
+        three_frame_person_dfs,
+        20,
+        10,
+        video_path,
+        create_blank=True,
+        create_overlay=True,
+        video_to_overlay=video_path,
+    )
+    assert [os.path.basename(f) for f in filenames] == [
+        "test_blank.mp4",
+        "test_overlay.mp4",
+    ]
+    for filename, expected_filename in zip(filenames, expected_filenames):
+        with open(filename, "rb") as f, open(expected_filename, "rb") as g:
+            assert f.read() == g.read()
+
+
+def test_create_preview_videos(tmp_path, three_frame_person_dfs):
+    video_path = str(tmp_path / "input.mp4")
+    fourcc = cv2.VideoWriter_fourcc("m", "p", "4", "v")
+    out = cv2.VideoWriter(video_path, fourcc, 25, (40, 20))
+    for i in range(3):
+        out.write(np.full((20, 40, 3), i * 50, np.uint8))
+    out.release()
+
+    viz = Visualizer(str(tmp_path / "preview"))
+    filenames = viz.create_videos_from_dataframes(
+        "test",
+        three_frame_person_dfs,
+        40,
+        20,
+        video_path,
+        create_blank=True,
+        create_overlay=True,
+        video_to_overlay=video_path,
+        scale=0.5,
+        every=2,
+    )
+
+    # Every other frame at half the size and half the frame rate
+    for filename in filenames:
+        cap = cv2.VideoCapture(filename)
+        assert (cap.get(3), cap.get(4), cap.get(5)) == (20, 10, 12.5)
+        assert int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) == 2
+        cap.release()
+
+
+def test_canvas_pool(three_frame_person_dfs):
+    canvases = CanvasPool((10, 20, 3), 1)
+    skeletons = SkeletonArrays(three_frame_person_dfs, Visualizer.LINE_PATHS)
+
+    img = canvases.get()
+    box = skeletons.draw_points(img, 0)
+    assert box == (0, 2, 19, 10)
+    canvases.put(img, box)
+
+    # The image is reused, with the area drawn on cleared
+    reused_img = canvases.get()
+    assert reused_img is img
+    assert (reused_img == 1).all()
+
+    # A new image is created if none are free
+    assert canvases.get() is not img
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+import click
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+from raga_pose_estimation import json_backend
+from raga_pose_estimation.openpose_json_loader import (
+    list_json_files,
+    load_keypoints,
+)
+
+###############################################################
+##                                                           ##
+##    time how long each JSON backend takes to parse the     ##
+##    OpenPose json files, per frame                         ##
+##                                                           ##
+###############################################################
+
+
+def time_per_frame(function, filepaths, repeat):
+    """Best time over repeat runs of function(filepaths), in microseconds
+    per file."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(filepaths)
+        best = min(best, time.perf_counter() - start)
+    return best / len(filepaths) * 1e6
+
+
+def stdlib_load(filepaths):
+    """Parses the files as the loader did before the backends were added."""
+    for filepath in filepaths:
+        with open(filepath) as f:
+            json.load(f)["people"]
+
+
+def backend_load(filepaths):
+    for filepath in filepaths:
+        json_backend.load(filepath)["people"]
+
+
+def backend_load_people(filepaths):
+    for filepath in filepaths:
+        json_backend.load_people(filepath)
+
+
+def add_face_and_hands(path_to_json, output_dir):
+    """Copies the json files, filling in the face and hand keypoints, as
+    when OpenPose is run with --face --hand."""
+    rng = np.random.default_rng(0)
+    for json_file in list_json_files(path_to_json):
+        with open(os.path.join(path_to_json, json_file)) as f:
+            data = json.load(f)
+        for person in data["people"]:
+            for block, n_points in [
+                ("face_keypoints_2d", 70),
+                ("hand_left_keypoints_2d", 21),
+                ("hand_right_keypoints_2d", 21),
+            ]:
+                person[block] = [
+                    round(float(v), 4)
+                    for v in rng.uniform(0, 1000, n_points * 3)
+                ]
+        with open(os.path.join(output_dir, json_file), "w") as f:
+            json.dump(data, f)
+
+
+@click.command()
+@click.option(
+    "-j",
+    "--input-json",
+    default="example_files/example_3people/output_json",
+    help="Directory of openpose json files to parse.",
+)
+@click.option(
+    "-r",
+    "--repeat",
+    default=5,
+    type=click.IntRange(min=1),
+    help="Number of times to parse the files, keeping the best time.",
+)
+@click.option(
+    "--face-hands",
+    is_flag=True,
+    default=False,
+    help="Fill in the face and hand keypoints of copies of the files first.",
+)
+def benchmark(input_json, repeat, face_hands):
+    """Prints the time each JSON backend takes to parse a frame."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if face_hands:
+            add_face_and_hands(input_json, tmp_dir)
+            input_json = tmp_dir
+        filepaths = [
+            os.path.join(input_json, json_file)
+            for json_file in list_json_files(input_json)
+        ]
+        print(f"{len(filepaths)} files in {input_json}")
+        print(f"{'backend':<10}{'parse':>12}{'people':>12}{'load':>12}")
+        print(
+            f"{'before':<10}"
+            f"{time_per_frame(stdlib_load, filepaths, repeat):>10.1f}us"
+        )
+        for backend in json_backend.available_backends():
+            json_backend.set_backend(backend)
+            times = [
+                time_per_frame(function, filepaths, repeat)
+                for function in [
+                    backend_load,
+                    backend_load_people,
+                    lambda _: load_keypoints(input_json, dtype=np.float64),
+                ]
+            ]
+            print(f"{backend:<10}" + "".join(f"{t:>10.1f}us" for t in times))
+
+
+if __name__ == "__main__":
+    benchmark()